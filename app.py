@@ -1,13 +1,26 @@
-
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import re
 import io
+import os
+import time
+import contextlib
+
+from backends import default_backend
+from charts import FigureCache, build_correlation_figure, build_overview_figure, build_pair_figure, figure_key
+from core import Analysis, excel_source, paste_source, sheet_export_url, sheet_source
+from correlation import METRIC_COLS
+from diagnostics import NULL_TRACE, TRACE_LOG_ENV, RerunTrace
+from excel_reader import list_sheets
+from incremental import AppendLog, merged_key
+from ingest_cache import IngestCache
+from normalize import MissingColumnsError, normalize_frame
+from report import default_summary, markdown_report, write_html_report
+from report_cache import ReportCache, report_key
+from rollups import GRANULARITIES
+from sketches import round_significant, slider_bounds
+from sheets_fetch import SheetFetcher
+from snapshots import SnapshotCatalog
 
-# --- Page Config ---
 # --- Page Config ---
 st.set_page_config(
     page_title="Bitget Wallet Analytics",
@@ -113,113 +126,12 @@ st.markdown("""
 # Cyan -> Blue -> Purple palette to match the card
 COLOR_PALETTE = ['#00f2fe', '#4facfe', '#a18cd1', '#fbc2eb', '#43e97b', '#38f9d7']
 
-# --- Helper Function: Generate HTML Report ---
-def create_html_report(df_filtered, summary_text, figs):
-    """Generates a standalone HTML file with the dashboard content."""
-    
-    # Calculate metrics for the report
-    avg_exp = df_filtered['卡片曝光uv'].mean()
-    avg_visit = df_filtered['頁面訪問uv'].mean()
-    avg_article_rate = df_filtered['文章訪問率'].mean()
-    avg_conv_rate = df_filtered['功能轉化率'].mean()
-    
-    # Convert plots to HTML divs
-    fig_htmls = [fig.to_html(full_html=False, include_plotlyjs='cdn') for fig in figs]
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Bitget Wallet Analysis Report</title>
-        <meta charset="utf-8">
-        <style>
-            body {{
-                background-color: #050505;
-                color: #e2e8f0;
-                font-family: 'Inter', sans-serif;
-                padding: 40px;
-                max-width: 1200px;
-                margin: 0 auto;
-            }}
-            h1 {{
-                background: linear-gradient(90deg, #00f2fe 0%, #4facfe 100%);
-                -webkit-background-clip: text;
-                -webkit-text-fill-color: transparent;
-                margin-bottom: 40px;
-                font-size: 2.5rem;
-            }}
-            h2 {{ border-bottom: 1px solid #333; padding-bottom: 10px; margin-top: 40px; color: #fff; }}
-            .metrics-grid {{
-                display: grid;
-                grid-template-columns: repeat(4, 1fr);
-                gap: 20px;
-                margin-bottom: 40px;
-            }}
-            .metric-card {{
-                background: rgba(255, 255, 255, 0.05);
-                padding: 20px;
-                border-radius: 12px;
-                border: 1px solid rgba(255,255,255,0.1);
-                text-align: center;
-            }}
-            .metric-value {{
-                font-size: 2rem;
-                font-weight: bold;
-                color: #4facfe;
-            }}
-            .metric-label {{ color: #94a3b8; font-size: 0.9rem; text-transform: uppercase; }}
-            .summary-box {{
-                background: #0f1115;
-                padding: 25px;
-                border-radius: 12px;
-                border-left: 4px solid #4facfe;
-                margin-bottom: 40px;
-                white-space: pre-wrap;
-                line-height: 1.6;
-            }}
-            .chart-container {{
-                margin-bottom: 50px;
-                background: #0f1115;
-                padding: 20px;
-                border-radius: 12px;
-            }}
-        </style>
-    </head>
-    <body>
-        <h1>Bitget Wallet Content Analysis</h1>
-        
-        <div class="metrics-grid">
-            <div class="metric-card">
-                <div class="metric-label">平均卡片曝光</div>
-                <div class="metric-value">{avg_exp:,.0f}</div>
-            </div>
-            <div class="metric-card">
-                <div class="metric-label">平均頁面訪問</div>
-                <div class="metric-value">{avg_visit:,.0f}</div>
-            </div>
-            <div class="metric-card">
-                <div class="metric-label">平均文章訪問率 (CTR)</div>
-                <div class="metric-value">{avg_article_rate:.2%}</div>
-            </div>
-            <div class="metric-card">
-                <div class="metric-label">平均功能轉化率 (CVR)</div>
-                <div class="metric-value">{avg_conv_rate:.2%}</div>
-            </div>
-        </div>
-
-        <h2>📝 題材分析小結 (Theme Analysis)</h2>
-        <div class="summary-box">{summary_text}</div>
-
-        <h2>📊 數據視覺化 (Visualizations)</h2>
-        {''.join([f'<div class="chart-container">{html}</div>' for html in fig_htmls])}
-        
-        <div style="text-align: center; margin-top: 50px; color: #666; font-size: 0.8rem;">
-            Generated by Bitget Wallet Data Analyzer
-        </div>
-    </body>
-    </html>
-    """
-    return html_content
+@st.cache_resource
+def get_snapshot_catalog():
+    """Local catalog of saved, already-normalized datasets."""
+    return SnapshotCatalog()
+
+snapshot_catalog = get_snapshot_catalog()
 
 # --- Sidebar ---
 with st.sidebar:
@@ -229,118 +141,636 @@ with st.sidebar:
     st.markdown("---")
     
     # Data Source Selection
-    source_type = st.radio("資料來源 (Data Source)", ["Excel Upload", "Google Sheets URL", "Paste Data (直接貼上)"])
+    source_type = st.radio("資料來源 (Data Source)", ["Excel Upload", "Google Sheets URL", "Paste Data (直接貼上)", "Saved Datasets (已儲存)"])
     
     uploaded_file = None
+    selected_sheets = []
     sheet_url = None
     paste_buffer = None
+    reload_sheet = False
+    snapshot_entry = None
     
     if source_type == "Excel Upload":
         uploaded_file = st.file_uploader("📂 Upload Data (.xlsx)", type=["xlsx", "xls"])
+        if uploaded_file is not None:
+            try:
+                sheet_names = list_sheets(uploaded_file)
+            except Exception:
+                sheet_names = []  # Unreadable files are reported by the loader
+            if len(sheet_names) > 1:
+                selected_sheets = st.multiselect(
+                    "📑 工作表 (Sheets，多選即合併)", sheet_names, default=sheet_names[:1],
+                    help="選取多個工作表時，會依序合併成同一份資料。"
+                )
     elif source_type == "Google Sheets URL":
         sheet_url = st.text_input("🔗 Google Sheets Link", help="請確保連結權限已開啟為 '知道連結者皆可檢視' (Anyone with the link can view)")
         st.caption("Auto-converts /edit to /export")
+        reload_sheet = st.button("🔄 重新載入 (Reload Sheet)")
     elif source_type == "Paste Data (直接貼上)":
-        paste_buffer = st.text_area("📋 貼上 Excel 資料 (Tab 分隔)", height=200, help="請從 Excel 或 Google Sheet 複製表格內容 (含標題列) 並在此貼上。")
+        paste_buffer = st.text_area("📋 貼上 Excel 資料 (Tab / 逗號分隔)", height=200, help="請從 Excel 或 Google Sheet 複製表格內容 (含標題列) 並在此貼上；分隔符號會自動判斷。")
+    elif source_type == "Saved Datasets (已儲存)":
+        snapshot_entries = snapshot_catalog.entries()
+        if snapshot_entries:
+            snapshot_entry = st.selectbox(
+                "💾 已儲存資料集", snapshot_entries,
+                format_func=lambda e: f"{e['name']} · {e['rows']:,} 列"
+                    + (f" · {e['dt_min'][:10]} ~ {e['dt_max'][:10]}" if e['dt_min'] else "")
+            )
+            st.caption(
+                f"來源: {snapshot_entry['source']} · {snapshot_entry['bytes'] / 1e6:,.1f} MB · "
+                f"儲存於 {pd.Timestamp(snapshot_entry['created_at'], unit='s'):%Y-%m-%d %H:%M}"
+            )
+            if st.button("🗑️ 刪除此資料集"):
+                snapshot_catalog.delete(snapshot_entry['id'])
+                st.rerun()
+        else:
+            st.caption("尚無已儲存的資料集，載入資料後可於側欄「儲存為快照」。")
+
+    incremental = False
+    if source_type != "Saved Datasets (已儲存)":
+        incremental = st.toggle(
+            "➕ 增量更新 (Append mode)", value=False, key="incremental",
+            help="重新載入同一來源時，只清理新增或修改的列，並依 (dt, title) 覆寫重複資料。"
+        )
 
     st.info("支援模糊欄位匹配：\n- dt, title\n- 曝光, 訪問, 點擊, 轉化")
 
+    # Diagnostics: results are written into this panel at the end of the rerun
+    diag_panel = st.expander("🩺 診斷 (Diagnostics)")
+    with diag_panel:
+        diag_enabled = st.toggle("記錄各階段耗時", value=False, key="diag_enabled")
+        diag_memory = st.toggle(
+            "追蹤記憶體峰值 (較慢)", value=False, key="diag_memory", disabled=not diag_enabled,
+            help="以 tracemalloc 記錄每個階段的記憶體峰值，會拖慢運算，僅供除錯。"
+        )
+
+# Stage timers are no-ops unless diagnostics are on
+if diag_enabled:
+    st.session_state['rerun_count'] = st.session_state.get('rerun_count', 0) + 1
+    trace = RerunTrace(
+        st.session_state['rerun_count'], track_memory=diag_memory, source=source_type, backend=default_backend()
+    )
+else:
+    trace = NULL_TRACE
+
 # --- Main App Logic ---
 st.title("Bitget Wallet Analytics")
 
-df = None
+@st.cache_resource
+def get_ingest_cache():
+    """Process-wide store of cleaned frames, shared by every session (budget: DATA_ANALYZER_CACHE_MB)."""
+    return IngestCache()
+
+@st.cache_resource
+def get_sheet_fetcher():
+    """Process-wide Google Sheets fetcher with an on-disk, revalidating HTTP cache."""
+    return SheetFetcher()
+
+@st.cache_resource
+def get_report_cache():
+    """Process-wide report builder: background workers and finished reports keyed by content."""
+    return ReportCache()
+
+def show_missing_columns(e):
+    st.error("❌ 欄位缺失")
+    st.write(e.missing)
+    st.write("偵測到的欄位:", e.detected)
+    st.stop()
+
+def record_trace(trace):
+    """Keeps the last 50 traced reruns of this session and appends them to the trace log."""
+    trace_lines = trace.to_json_lines()
+    history = st.session_state.setdefault('trace_history', [])
+    history.append(trace_lines)
+    del history[:-50]
+    log_path = os.environ.get(TRACE_LOG_ENV)
+    if log_path:
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(trace_lines)
+    return history
+
+@contextlib.contextmanager
+def unit_trace(trace, name):
+    """The rerun's trace during a full rerun; a rerun of only this unit is traced on its own."""
+    # The full rerun's trace is finished by the time a fragment reruns alone
+    if not trace.enabled or trace.total_seconds is None:
+        yield trace
+        return
+    own = RerunTrace(f"{trace.rerun_id}/{name}", track_memory=trace.track_memory, **trace.context, fragment=name)
+    try:
+        yield own
+    finally:
+        record_trace(own.finish())
+        st.caption(f"⏱️ 局部重跑 (partial rerun): {own.total_seconds * 1000:,.0f} ms")
+
+def metric_format(col):
+    return '{:.2%}' if '率' in col else '{:,.0f}'
+
+def percentile_caption(col, sketch, qs=(0.25, 0.5, 0.75, 0.9, 0.99)):
+    """``P25 … · P50 …`` markers of a column from its quantile sketch."""
+    fmt = metric_format(col)
+    return " · ".join(f"P{q * 100:g} {fmt.format(v)}" for q, v in zip(qs, sketch.quantiles(qs)))
+
+def filter_default(sketch):
+    """Data-aware default for a "column >" filter: the first quartile, two significant digits."""
+    return float(round_significant(sketch.quantile(0.25))) if sketch is not None and sketch.count else 0.0
+
+# --- Dashboard Units ---
+# Each unit is a fragment: its own widgets rerun only that unit. Its arguments are
+# what it depends on from the rest of the page; when those change (data, global
+# filter, time rollup) the whole script reruns and every unit with it.
+
+def slot_settings(i, slot_masks, slot_sketches):
+    """Widgets of generic chart slot ``i``; its config, or ``None`` when the slot is off."""
+    enable = st.toggle(f"啟用圖表 {i}", value=(i<=2), key=f"enable_{i}") # Default enable 1 & 2
+    if not enable:
+        return None
+
+    metric_col = st.selectbox(
+        f"指標 {i}",
+        ['功能轉化率', '文章訪問率', '卡片曝光uv', '頁面訪問uv', '行動點點擊uv (入口+詳情)'],
+        index=(i-1) % 5,
+        key=f"metric_{i}"
+    )
+    top_n = st.number_input(f"顯示 Top {i}", 3, 50, 6, key=f"top_n_{i}")
+    c_type = st.selectbox(f"圖表類型 {i}", ["Bar (長條)", "Line (折線)"], key=f"type_{i}")
+
+    # Individual Filter
+    with st.popover(f"設定圖表 {i} 篩選條件"):
+        st.markdown("**(AND 邏輯)**")
+        # Filters apply to the per-title table, so only its numeric columns are offered
+        filter_candidates = slot_masks.filter_columns
+        selected_filters = st.multiselect(f"篩選欄位 {i}", filter_candidates, key=f"filters_{i}")
+        current_filters = {}
+        for f_col in selected_filters:
+            sketch = slot_sketches.get(f_col)
+            val = st.number_input(f"{f_col} >", value=filter_default(sketch), key=f"fv_{i}_{f_col}")
+            st.caption(f"符合 {slot_masks.count_above(f_col, val):,} 筆")
+            if sketch is not None and sketch.count:
+                st.caption(f"≈ {percentile_caption(f_col, sketch)}")
+            current_filters[f_col] = val
+
+    return {
+        "id": i,
+        "type": "generic",
+        "metric": metric_col,
+        "top_n": top_n,
+        "chart_type": c_type,
+        "filters": current_filters
+    }
 
-# 1. Load Data Logic
-if source_type == "Excel Upload" and uploaded_file is not None:
+def combo_settings(slot_masks, slot_sketches):
+    """Widgets of the combo chart (slot 4); its config, or ``None`` when the slot is off."""
+    st.info("可自行新增多個指標，並設定類型 (Bar/Line) 與座標軸。")
+    enable_4 = st.toggle(f"啟用圖表 4", value=True, key="enable_4")
+    if not enable_4:
+        return None
+
+    top_n_4 = st.number_input(f"顯示 Top (圖4)", 3, 50, 10, key="top_n_4")
+
+    # 1. Select Metrics
+    metric_options = ['卡片曝光uv', '頁面訪問uv', '行動點點擊uv (入口+詳情)', '文章訪問率', '功能轉化率']
+    selected_metrics_4 = st.multiselect(
+        "選擇要顯示的指標 (多選)",
+        metric_options,
+        default=['卡片曝光uv', '功能轉化率'],
+        key="combo_metrics_4"
+    )
+
+    # 2. Configure each metric
+    combo_config = {}
+    if selected_metrics_4:
+        st.markdown("**指標細項設定:**")
+        for m_idx, m in enumerate(selected_metrics_4):
+            with st.popover(f"⚙️ 設定: {m}"):
+                c1, c2 = st.columns(2)
+                c_type = c1.selectbox(f"類型", ["Bar", "Line"], index=0 if '曝光' in m else 1, key=f"c4_type_{m_idx}")
+                c_axis = c2.selectbox(f"軸向", ["左軸 (主)", "右軸 (副)"], index=0 if '曝光' in m else 1, key=f"c4_axis_{m_idx}")
+                combo_config[m] = {'type': c_type, 'axis': c_axis}
+
+    # 3. Filter
+    with st.popover(f"設定圖表 4 篩選條件"):
+        st.markdown("**(AND 邏輯)**")
+        filter_candidates_4 = slot_masks.filter_columns
+        selected_filters_4 = st.multiselect(f"篩選欄位 (圖4)", filter_candidates_4, default=['卡片曝光uv'], key="filters_4")
+        current_filters_4 = {}
+        for f_col in selected_filters_4:
+            sketch = slot_sketches.get(f_col)
+            val = st.number_input(f"{f_col} >", value=filter_default(sketch), key=f"fv_4_{f_col}")
+            st.caption(f"符合 {slot_masks.count_above(f_col, val):,} 筆")
+            if sketch is not None and sketch.count:
+                st.caption(f"≈ {percentile_caption(f_col, sketch)}")
+            current_filters_4[f_col] = val
+
+    return {
+        "id": 4,
+        "type": "custom_combo",
+        "top_n": top_n_4,
+        "metrics_config": combo_config,
+        "filters": current_filters_4
+    }
+
+@st.fragment
+def overview_unit(analysis, df_global_filtered, cache_key, min_exposure, figure_cache, report_figs, trace):
+    """Overview chart with its settings."""
+    with unit_trace(trace, "overview") as trace:
+        with st.expander("⚙️ 總覽設定 (Overview Settings)"):
+            show_overview = st.toggle("顯示總覽", value=True, key="show_overview")
+            ov_chart_type = st.selectbox("圖表類型", ["Bar (長條)", "Line (折線)"], index=0, key="ov_type")
+            ov_color = st.color_picker("主色調", "#4facfe", key="ov_color")
+            ov_max_points = st.number_input(
+                "最多顯示標題數", 10, 5000, 200, step=10, key="ov_max_points",
+                help="超過的標題合併為一個「其他」平均值，避免瀏覽器與傳輸負擔過大。"
+            )
+            ov_webgl_rows = st.number_input(
+                "WebGL 模式門檻 (列數)", 10, 5000, 150, step=10, key="ov_webgl_rows",
+                help="顯示的列數超過此值時改用 WebGL 繪製並隱藏數值標籤。"
+            )
+        report_figs['overview'] = None
+        if not show_overview:
+            return
+
+        st.markdown("### 📈 Performance Overview (Dual Axis)")
+
+        # One bar per title, already sorted by total exposure
+        # Capped point count: top titles plus an averaged "others" bucket
+        with trace.stage("overview") as stage:
+            if len(df_global_filtered) > ov_max_points:
+                st.caption(f"顯示前 {ov_max_points - 1} 篇，其餘 {len(df_global_filtered) - ov_max_points + 1:,} 篇合併為平均值")
+            overview_key = figure_key(cache_key, "overview", min_exposure, ov_max_points, ov_webgl_rows)
+            fig_overview = figure_cache.get_or_build(
+                overview_key,
+                lambda: analysis.overview_figure(df_global_filtered, ov_max_points, ov_webgl_rows)
+            )
+            stage['rows'] = min(len(df_global_filtered), ov_max_points)
+        st.plotly_chart(fig_overview, use_container_width=True)
+        report_figs['overview'] = (overview_key, fig_overview)
+
+@st.fragment
+def chart_slot(i, analysis, slot_masks, slot_sketches, cache_key, rollup_key, figure_cache, report_figs, trace):
+    """Chart slot ``i`` (1-3 single metric, 4 combo) with its settings."""
+    with unit_trace(trace, f"chart_{i}") as trace:
+        with st.expander(f"⚙️ 圖表 {i} 設定 (Chart {i} Settings)"):
+            if i == 4:
+                config = combo_settings(slot_masks, slot_sketches)
+            else:
+                config = slot_settings(i, slot_masks, slot_sketches)
+        report_figs[f"chart_{i}"] = None
+        if config is None:
+            st.caption(f"圖表 {i} 未啟用")
+            return
+
+        with trace.stage(f"chart_{i}"):
+            # --- Apply Specific Filters (cached masks, AND logic) ---
+            chart_filters = config['filters']
+            filter_txt = [f"{f_col}>{f_val}" for f_col, f_val in chart_filters.items()]
+            empty = analysis.empty_slot(config, slot_masks)
+
+            # --- Render ---
+            if empty == 'no_rows':
+                st.warning(f"圖表 {i}: 無符合數據")
+                return
+
+            if config['type'] == 'generic':
+                st.markdown(f"### 📊 Chart {i}: {config['metric']}")
+            else:
+                st.markdown(f"### 🔸 Chart {i}: Multi-Metric Combo")
+            if filter_txt: st.caption(f"Filter: {', '.join(filter_txt)}")
+
+            # Sorted by the first Bar chart metric found, else the first metric
+            if empty == 'no_metrics':
+                st.warning("請至少選擇一個指標")
+                return
+
+            # Sort Descending (only rebuilt when the config or data changed);
+            # single-metric slots alternate their color with the column
+            fig_key = figure_key(cache_key, rollup_key, config, i)
+            fig = figure_cache.get_or_build(
+                fig_key,
+                lambda: analysis.slot_figure(config, slot_masks, position=i - 1)
+            )
+        st.plotly_chart(fig, use_container_width=True)
+        report_figs[f"chart_{i}"] = (fig_key, fig)
+
+@st.fragment
+def correlation_unit(analysis, df_global_filtered, cache_key, min_exposure, figure_cache, report_figs, trace):
+    """Correlation matrix of the metrics and a scatter (or binned density) of one metric pair."""
+    with unit_trace(trace, "correlation") as trace:
+        with st.expander("⚙️ 關聯分析設定 (Correlation Settings)"):
+            show_correlation = st.toggle("顯示關聯分析", value=True, key="show_correlation")
+            corr_method = st.radio("相關係數", ["Pearson", "Spearman (排名)"], horizontal=True, key="corr_method")
+            c1, c2 = st.columns(2)
+            corr_color_exp = c1.color_picker("曝光顏色", "#00f2fe", key="corr_c1")
+            corr_color_conv = c2.color_picker("轉化顏色", "#fbc2eb", key="corr_c2")
+            metrics = [c for c in METRIC_COLS if c in df_global_filtered.columns]
+            pair_x = c1.selectbox("X 軸", metrics, index=metrics.index('卡片曝光uv'), key="corr_x")
+            pair_y = c2.selectbox("Y 軸", metrics, index=metrics.index('功能轉化率'), key="corr_y")
+            scatter_max = st.number_input(
+                "散點圖上限 (篇數)", 100, 100_000, 5_000, step=500, key="corr_scatter_max",
+                help="超過此篇數時，改在伺服器端分箱為 2D 密度圖，瀏覽器不會收到逐點資料。"
+            )
+            density_bins = st.slider("密度圖分箱數", 20, 200, 60, step=10, key="corr_bins")
+        report_figs['correlation'] = report_figs['pair'] = None
+        if not show_correlation:
+            return
+
+        st.markdown("### 🔥 Correlation Analysis")
+        with trace.stage("correlation", rows=len(df_global_filtered)) as stage:
+            # Both matrices in one pass, once per dataset and global filter
+            correlations = analysis.correlations(df_global_filtered, min_exposure)
+            matrix = correlations.pearson if corr_method == "Pearson" else correlations.spearman
+            corr_fig_key = figure_key(cache_key, "correlation", min_exposure, corr_method, corr_color_exp, corr_color_conv)
+            fig_corr = figure_cache.get_or_build(
+                corr_fig_key,
+                lambda: build_correlation_figure(matrix, corr_color_conv, corr_color_exp)
+            )
+            # Large samples are binned here: the browser gets a fixed-size grid
+            binned = len(df_global_filtered) > scatter_max
+            pair_key = figure_key(cache_key, "pair", min_exposure, pair_x, pair_y, binned and density_bins,
+                                  scatter_max, corr_color_exp, corr_color_conv)
+            fig_pair = figure_cache.get_or_build(
+                pair_key,
+                lambda: build_pair_figure(
+                    df_global_filtered, pair_x, pair_y, scatter_max, density_bins, corr_color_exp, corr_color_conv
+                )
+            )
+            stage['binned'] = binned
+
+        col_corr, col_pair = st.columns(2)
+        with col_corr:
+            st.caption(f"{corr_method} · {correlations.rows:,} 篇 (指標皆有值)")
+            st.plotly_chart(fig_corr, use_container_width=True)
+        with col_pair:
+            st.caption(
+                f"{pair_y} vs {pair_x} · "
+                + (f"{len(df_global_filtered):,} 篇，已分箱為 {density_bins}×{density_bins} 密度圖" if binned
+                   else f"{len(df_global_filtered):,} 篇")
+            )
+            st.plotly_chart(fig_pair, use_container_width=True)
+        report_figs['correlation'], report_figs['pair'] = (corr_fig_key, fig_corr), (pair_key, fig_pair)
+
+@st.fragment
+def export_unit(df_global_filtered, dataset, report_figs, trace):
+    """Summary text and downloads; the HTML report is built on request, in the background, and cached."""
+    with unit_trace(trace, "export") as trace:
+        st.markdown("---")
+        st.markdown("### 🧠 Insight Generation")
+
+        # Based on df_global_filtered, consistent with the metric cards
+        analysis_input = st.text_area("Analysis Summary", value=default_summary(df_global_filtered), height=250)
+
+        # 4. Export Options
+        st.markdown("---")
+        st.subheader("📤 匯出與分享 (Export & Share)")
+        st.info("💡 **如何分享報告？**\n下載下方的 **HTML 網頁報告**，您可以直接將檔案傳送給同事，或上傳至 Google Drive / 公司內網，即可生成分享連結。")
+
+        col_dl1, col_dl2 = st.columns(2)
+
+        # Option 1: Markdown
+        with col_dl1:
+            st.download_button("📝 下載 Markdown 筆記", markdown_report(analysis_input), "report.md")
+
+        # Option 2: HTML Output (Web Link Equivalent)
+        with col_dl2:
+            offline_report = st.toggle(
+                "📦 離線可用 (內嵌 plotly.js)", value=True,
+                help="內嵌並壓縮 plotly.js，內網或離線環境也能開啟；關閉則從 CDN 載入，檔案較小。"
+            )
+            report_cache = get_report_cache()
+
+            def current_report():
+                """Key and builder of the report from the charts as the units last drew them."""
+                entries = [entry for entry in report_figs.values() if entry is not None]
+                key = report_key(dataset, [fig_key for fig_key, _ in entries], analysis_input, offline=offline_report)
+
+                def build(progress):
+                    # Streamed straight into one UTF-8 buffer instead of a chain of big strings
+                    buffer = io.BytesIO()
+                    writer = io.TextIOWrapper(buffer, encoding='utf-8', write_through=True)
+                    write_html_report(
+                        writer, df_global_filtered, analysis_input, [fig for _, fig in entries],
+                        plotlyjs='inline' if offline_report else 'cdn', compress=offline_report, progress=progress
+                    )
+                    writer.detach()  # Keep the buffer open for getvalue
+                    return buffer.getvalue()
+
+                return key, build
+
+            key, build = current_report()
+            report = report_cache.get(key)
+            job = None if report is not None else report_cache.job(key)
+            if report is None and (job is None or job.error is not None):
+                if st.button("📄 產生 HTML 報告", key="build_report"):
+                    job = report_cache.submit(key, build)
+                    report = report_cache.get(key) if job is None else None
+
+            if job is not None and job.error is None and report is None:
+                # Only the wait is interrupted by a new interaction; the build carries on
+                with trace.stage("export") as stage:
+                    bar = st.progress(job.progress, text="產生報告中...")
+                    while not job.done():
+                        time.sleep(0.1)
+                        bar.progress(job.progress, text=f"產生報告中... {job.progress:.0%}")
+                    bar.empty()
+                    report = job.report
+                    stage['bytes'] = len(report) if report is not None else 0
+            # Failed before this run or while it waited: shown once, next to the retry button
+            if job is not None and job.error is not None:
+                st.error(f"❌ 報告產生失敗: {job.error}")
+
+            if report is not None:
+                st.caption(
+                    f"✅ 報告已就緒 · {len(report) / 1024 ** 2:,.1f} MB · "
+                    + (f"產生耗時 {job.seconds:.1f}s" if job is not None else "已快取，下載不需重新產生")
+                )
+            st.download_button(
+                label="🌐 下載完整分析報告 (HTML 網頁)",
+                # Resolved on click: cached when unchanged, else built (or joined) then
+                data=lambda: report_cache.result(*current_report()),
+                file_name=f"Bitget_Analysis_Report_{pd.Timestamp.now().strftime('%Y%m%d')}.html",
+                mime="text/html",
+                help="下載後可直接用瀏覽器開啟，保留所有互動圖表功能。"
+            )
+
+ingest_cache = get_ingest_cache()
+sheet_fetcher = get_sheet_fetcher()
+
+SOURCE_ERRORS = {'excel': "❌ 無法讀取 Excel", 'gsheet': "❌ 無法讀取 Google Sheet", 'paste': "❌ 無法解析貼上的資料"}
+
+def read_source(source, trace):
+    """Raw frame of ``source``, or ``None`` after reporting why it could not be read."""
+    # Excel streams only the matched columns, chunk by chunk; pasted text is
+    # sniffed for its delimiter and header, then parsed once
+    load_progress = st.progress(0.0, text="讀取 Excel...") if source.kind == 'excel' else None
+    raw = None
     try:
-        df = pd.read_excel(uploaded_file)
+        with trace.stage("parse", input_bytes=source.input_bytes) as stage:
+            raw = source.read(
+                progress=lambda fraction, rows_read: load_progress.progress(
+                    fraction or 0.0, text=f"讀取 Excel... {rows_read:,} 列"
+                )
+            )
+            stage['rows'] = len(raw)
+    except MissingColumnsError as e:
+        show_missing_columns(e)
     except Exception as e:
-        st.error(f"❌ 無法讀取 Excel: {e}")
-        
+        st.error(f"{SOURCE_ERRORS[source.kind]}: {e}")
+    if load_progress is not None:
+        load_progress.empty()
+    return raw
+
+source = None  # Raw source, fingerprinted before it is parsed
+df = None      # Cleaned frame (served from the ingestion cache when possible)
+raw_df = None  # Freshly parsed frame, cleaned below on a cache miss
+cache_key = None
+
+# 1. Load Data Logic
+if source_type == "Excel Upload" and uploaded_file is not None:
+    source = excel_source(uploaded_file.getvalue(), selected_sheets)
+
 elif source_type == "Google Sheets URL" and sheet_url:
-    try:
-        # Regex to extract Spreadsheet ID
-        match_id = re.search(r"/d/([a-zA-Z0-9-_]+)", sheet_url)
-        
-        if match_id:
-            spreadsheet_id = match_id.group(1)
-            
-            # Regex to extract GID (Sheet ID)
-            match_gid = re.search(r"[#&]gid=([0-9]+)", sheet_url)
-            
-            # Construct Export URL
-            base_url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=csv"
-            
-            if match_gid:
-                gid = match_gid.group(1)
-                export_url = f"{base_url}&gid={gid}"
-            else:
-                export_url = base_url
-            
-            df = pd.read_csv(export_url)
-            
-        else:
-             st.error("❌ 無法辨識 Google Sheet 連結格式。請確認連結包含 '/d/' 與 ID。")
-             
-    except Exception as e:
-        st.error(f"❌ 無法讀取 Google Sheet: {e}")
+    if sheet_export_url(sheet_url) is None:
+        st.error("❌ 無法辨識 Google Sheet 連結格式。請確認連結包含 '/d/' 與 ID。")
+    else:
+        try:
+            # Served from the local HTTP cache; unchanged content keeps the same key
+            with trace.stage("fetch") as stage:
+                source = sheet_source(sheet_url, sheet_fetcher, force=reload_sheet)
+                stage.update(input_bytes=source.input_bytes, stale=source.stale)
+            if source.stale:
+                st.caption("⏳ 顯示快取資料，背景更新中... (Showing cached data, refreshing in background)")
+        except Exception as e:
+            st.error(f"{SOURCE_ERRORS['gsheet']}: {e}")
 
 elif source_type == "Paste Data (直接貼上)" and paste_buffer:
-    try:
-        # Try Tab separator first (Excel default)
-        df = pd.read_csv(io.StringIO(paste_buffer), sep='\t')
-        
-        # If only 1 column detected, maybe it's Comma separated?
-        if len(df.columns) <= 1:
-             st.warning("⚠️ 檢測到欄位過少，嘗試使用逗號分隔...")
-             df = pd.read_csv(io.StringIO(paste_buffer), sep=',')
-             
-    except Exception as e:
-        st.error(f"❌ 無法解析貼上的資料: {e}")
+    source = paste_source(paste_buffer)
+
+elif source_type == "Saved Datasets (已儲存)" and snapshot_entry is not None:
+    # Snapshots are already normalized: memory-mapped, no parsing or cleaning
+    cache_key = snapshot_entry['fingerprint']
+    df = ingest_cache.get(cache_key)
+    if df is None:
+        try:
+            with trace.stage("load_snapshot", rows=snapshot_entry['rows'], input_bytes=snapshot_entry['bytes']):
+                df = ingest_cache.put(cache_key, snapshot_catalog.load(snapshot_entry['id']))
+        except Exception as e:
+            st.error(f"❌ 無法開啟資料集: {e}")
+
+# 2. Clean & Cache (only on a cache miss)
+if source is not None and not incremental:
+    cache_key = source.key
+    df = ingest_cache.get(cache_key)
+    if df is None:
+        raw_df = read_source(source, trace)
+    if raw_df is not None:
+        try:
+            with trace.stage("clean") as stage:
+                df = ingest_cache.put(cache_key, normalize_frame(raw_df))
+                stage.update(rows=len(df), bytes=df.attrs['memory']['bytes_after'])
+        except MissingColumnsError as e:
+            show_missing_columns(e)
+        except Exception as e:
+            st.error(f"Error: {e}")
+            st.exception(e)
+
+elif source is not None:
+    # Append mode: each load of the same source cleans only its changed rows and
+    # upserts them into this session's merged history. Merged frames are keyed by
+    # every load they merged (merged_key), so one shared with another session
+    # has exactly the same history
+    lineage = (source_type, uploaded_file.name if uploaded_file is not None else sheet_url, tuple(selected_sheets))
+    append_log = st.session_state.get('append_log')
+    if append_log is not None and append_log.lineage != lineage:
+        append_log = None
+
+    if append_log is not None and append_log.source == source.key:
+        # Same content as this session's last load: nothing to parse or merge
+        cache_key = append_log.key
+        df = ingest_cache.get(cache_key)
+        if df is None:
+            df = ingest_cache.put(cache_key, append_log.df)
+    else:
+        raw_df = read_source(source, trace)
+
+    if raw_df is not None:
+        delta = None
+        try:
+            with trace.stage("clean", mode="append") as stage:
+                if append_log is not None:
+                    previous_df, previous_key = append_log.df, append_log.key
+                    cache_key = merged_key(source.key, previous_key)
+                    delta = append_log.append(raw_df, key=cache_key, source=source.key)
+                if delta is not None:
+                    df = ingest_cache.get(cache_key)
+                    if df is None:
+                        df = ingest_cache.put(cache_key, append_log.df)
+                else:
+                    # First load (or the schema changed): cleaned in full, unless a session
+                    # that started from the same content already did
+                    cache_key = merged_key(source.key)
+                    df = ingest_cache.get(cache_key)
+                    append_log = st.session_state['append_log'] = AppendLog(
+                        raw_df, lineage=lineage, key=cache_key, source=source.key, df=df
+                    )
+                    if df is None:
+                        df = ingest_cache.put(cache_key, append_log.df)
+                stage.update(rows=len(df), bytes=df.attrs['memory']['bytes_after'])
+        except MissingColumnsError as e:
+            show_missing_columns(e)
+        except Exception as e:
+            st.error(f"Error: {e}")
+            st.exception(e)
+
+        if delta is not None:
+            st.caption(f"增量更新: 新增 {delta.appended:,} 列 · 更新 {len(delta.updated):,} 列 · 未變 {delta.unchanged:,} 列")
+            # Derived structures of the previous version are patched, not rebuilt
+            with trace.stage("derive", rows=len(delta.touched)):
+                analysis = st.session_state.get('analysis')
+                if analysis is not None and analysis.key == previous_key:
+                    analysis.apply_delta(df, cache_key, delta, previous_df)
+
+# 3. Save as Snapshot
+if df is not None and source_type != "Saved Datasets (已儲存)":
+    with st.sidebar:
+        with st.expander("💾 儲存為快照 (Save Snapshot)"):
+            default_name = uploaded_file.name if uploaded_file is not None else f"{source_type} {pd.Timestamp.now():%Y-%m-%d}"
+            snapshot_name = st.text_input("名稱", value=default_name, key="snapshot_name")
+            if st.button("儲存", key="save_snapshot"):
+                saved = snapshot_catalog.save(df, snapshot_name, source_type, cache_key)
+                st.success(f"已儲存 {saved['rows']:,} 列")
 
 if df is not None:
+    # This session's claim on the shared frame: it is not evicted while referenced,
+    # and the claim is released when the session switches data or ends
+    dataset_ref = st.session_state.get('dataset_ref')
+    if dataset_ref is None or dataset_ref.key != cache_key or dataset_ref.released:
+        if dataset_ref is not None:
+            dataset_ref.release()
+        st.session_state['dataset_ref'] = ingest_cache.reference(cache_key)
+    
+    # Per-title totals and daily / weekly / monthly aggregates, computed once per dataset.
+    # Titles repeat across dt rows, so filters, cards, charts and insights all read one
+    # row per title (summed counts, rates as ratio of sums). The query engine over it
+    # (DATA_ANALYZER_BACKEND, pandas masks by default) is only rebuilt when the dataset changes
+    analysis = st.session_state.get('analysis')
+    if analysis is None or analysis.key != cache_key:
+        analysis = st.session_state['analysis'] = Analysis(df, key=cache_key)
+    rollups, title_engine = analysis.rollups, analysis.masks
+    # Approximate per-title distributions (built once per dataset) size the sliders and filters
+    title_sketches = analysis.sketches
+    
+    # Built figures are reused across reruns until their data or config changes
+    if 'figure_cache' not in st.session_state:
+        st.session_state['figure_cache'] = FigureCache()
+    figure_cache = st.session_state['figure_cache']
+    
     try:
-        # Data Cleaning: Normalize columns
-        df.columns = df.columns.astype(str).str.strip()
-        
-        # Fuzzy Match Columns
-        col_keyword_map = {
-            'dt': 'dt',
-            'title': 'title',
-            '卡片曝光uv': '卡片曝光',
-            '頁面訪問uv': '頁面訪問',
-            '文章訪問率': '文章訪問',
-            '行動點點擊uv (入口+詳情)': '行動點點擊',
-            '功能轉化率': '功能轉化'
-        }
-        
-        missing_cols = []
-        for standard_col, keyword in col_keyword_map.items():
-            match = next((col for col in df.columns if keyword.lower() in col.lower()), None)
-            if match:
-                df.rename(columns={match: standard_col}, inplace=True)
-            else:
-                missing_cols.append(f"{standard_col} (keyword: {keyword})")
-        
-        if missing_cols:
-            st.error("❌ 欄位缺失")
-            st.write(missing_cols)
-            st.write("偵測到的欄位:", list(df.columns))
-            st.stop()
-            
-        # Type Conversion
-        for col in ['卡片曝光uv', '頁面訪問uv', '行動點點擊uv (入口+詳情)']:
-            # Remove arrows or commas if present
-            df[col] = df[col].astype(str).str.replace(',', '', regex=False)
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-        def convert_pct(val):
-            if isinstance(val, str) and '%' in val:
-                return float(val.replace('%', '')) / 100
-            return float(val)
-
-        df['文章訪問率'] = df['文章訪問率'].apply(convert_pct)
-        df['功能轉化率'] = df['功能轉化率'].apply(convert_pct)
+        # Data Quality: cells that could not be parsed are NaN, not fatal
+        coercion = df.attrs.get('coercion', {})
+        failed_cells = sum(r['failed'] for r in coercion.values())
+        if failed_cells:
+            with st.expander(f"⚠️ {failed_cells} 個儲存格無法解析為數值，已視為空值 (Unparsed cells)"):
+                st.dataframe(pd.DataFrame(list(coercion.values())), hide_index=True)
         
         # --- Layout Split ---
         col_main, col_settings = st.columns([3.5, 1.2], gap="large")
@@ -351,110 +781,72 @@ if df is not None:
             
             # Global Filter
             with st.expander("🌍 全域資料篩選", expanded=True):
-                min_exposure = st.slider("最低卡片曝光", 0, 5000, 400, step=100)
-                df_global_filtered = df[df['卡片曝光uv'] > min_exposure].copy()
-                st.write(f"樣本數: {len(df_global_filtered)}")
-
-            # 1. Overview Chart Settings
-            with st.expander("📊 1. 數據總覽設定"):
-                show_overview = st.toggle("顯示總覽", value=True)
-                ov_chart_type = st.selectbox("圖表類型", ["Bar (長條)", "Line (折線)"], index=0, key="ov_type")
-                ov_color = st.color_picker("主色調", "#4facfe", key="ov_color")
-
-            # 2. Custom Charts Gallery (Slots 1-4)
-            with st.expander("📊 自定義圖表區 (Custom Charts)", expanded=True):
-                st.info("開啟下方圖表槽位，即可在主畫面新增分析圖表。")
-                
-                chart_configs = []
-                
-                # --- Slots 1-3: Generic Single Metric ---
-                for i in range(1, 4):
-                    st.markdown(f"#### 🔹 圖表 {i} (單一指標)")
-                    enable = st.toggle(f"啟用圖表 {i}", value=(i<=2), key=f"enable_{i}") # Default enable 1 & 2
-                    
-                    if enable:
-                        metric_col = st.selectbox(
-                            f"指標 {i}", 
-                            ['功能轉化率', '文章訪問率', '卡片曝光uv', '頁面訪問uv', '行動點點擊uv (入口+詳情)'],
-                            index=(i-1) % 5,
-                            key=f"metric_{i}"
-                        )
-                        top_n = st.number_input(f"顯示 Top {i}", 3, 50, 6, key=f"top_n_{i}")
-                        c_type = st.selectbox(f"圖表類型 {i}", ["Bar (長條)", "Line (折線)"], key=f"type_{i}")
-                        
-                        # Individual Filter
-                        with st.popover(f"設定圖表 {i} 篩選條件"):
-                            st.markdown("**(AND 邏輯)**")
-                            filter_candidates = [c for c in df.columns if c not in ['dt', 'title']]
-                            selected_filters = st.multiselect(f"篩選欄位 {i}", filter_candidates, key=f"filters_{i}")
-                            current_filters = {}
-                            for f_col in selected_filters:
-                                default_val = 400.0 if '曝光' in f_col else 0.0
-                                val = st.number_input(f"{f_col} >", value=default_val, key=f"fv_{i}_{f_col}")
-                                current_filters[f_col] = val
-                        
-                        chart_configs.append({
-                            "id": i,
-                            "type": "generic",
-                            "metric": metric_col,
-                            "top_n": top_n,
-                            "chart_type": c_type,
-                            "filters": current_filters
-                        })
-                    st.markdown("---")
-
-                # --- Slot 4: Fully Custom Combo Chart ---
-                st.markdown(f"#### 🔸 圖表 4 (自由組合分析)")
-                st.info("可自行新增多個指標，並設定類型 (Bar/Line) 與座標軸。")
-                enable_4 = st.toggle(f"啟用圖表 4", value=True, key="enable_4")
+                exposure_sketch = title_sketches['卡片曝光uv']
+                exposure_max, exposure_step = slider_bounds(exposure_sketch, integer=True)
+                min_exposure = st.slider(
+                    "最低卡片曝光", 0, exposure_max,
+                    min(exposure_max, int(filter_default(exposure_sketch) // exposure_step * exposure_step)),
+                    step=exposure_step, help="範圍到每篇曝光的第 99 百分位數；預設為第 25 百分位數。"
+                )
+                st.caption(f"≈ {percentile_caption('卡片曝光uv', exposure_sketch)}")
+                # Titles whose total exposure passes, largest first
+                with trace.stage("global_filter") as stage:
+                    df_global_filtered = analysis.above_exposure(min_exposure)
+                    stage['rows'] = len(df_global_filtered)
+                st.write(f"樣本數: {len(df_global_filtered)} 篇 (共 {len(df):,} 列)")
                 
-                if enable_4:
-                    top_n_4 = st.number_input(f"顯示 Top (圖4)", 3, 50, 10, key="top_n_4")
-                    
-                    # 1. Select Metrics
-                    metric_options = ['卡片曝光uv', '頁面訪問uv', '行動點點擊uv (入口+詳情)', '文章訪問率', '功能轉化率']
-                    selected_metrics_4 = st.multiselect(
-                        "選擇要顯示的指標 (多選)", 
-                        metric_options, 
-                        default=['卡片曝光uv', '功能轉化率'],
-                        key="combo_metrics_4"
+                # Titles surviving every slider step, from one vectorized search
+                candidate_steps = list(range(0, exposure_max + 1, exposure_step))
+                survivors = title_engine.count_above('卡片曝光uv', candidate_steps)
+                st.area_chart(
+                    pd.DataFrame({"樣本數": survivors}, index=pd.Index(candidate_steps, name="最低卡片曝光")),
+                    height=120
+                )
+                memory = df.attrs.get('memory')
+                if memory and memory['rows']:
+                    st.caption(
+                        f"記憶體 (Memory): {memory['bytes_before'] / memory['rows']:,.0f} → "
+                        f"{memory['bytes_after'] / memory['rows']:,.0f} bytes/row"
                     )
-                    
-                    # 2. Configure each metric
-                    combo_config = {}
-                    if selected_metrics_4:
-                        st.markdown("**指標細項設定:**")
-                        for m_idx, m in enumerate(selected_metrics_4):
-                            with st.popover(f"⚙️ 設定: {m}"):
-                                c1, c2 = st.columns(2)
-                                c_type = c1.selectbox(f"類型", ["Bar", "Line"], index=0 if '曝光' in m else 1, key=f"c4_type_{m_idx}")
-                                c_axis = c2.selectbox(f"軸向", ["左軸 (主)", "右軸 (副)"], index=0 if '曝光' in m else 1, key=f"c4_axis_{m_idx}")
-                                combo_config[m] = {'type': c_type, 'axis': c_axis}
-
-                    # 3. Filter
-                    with st.popover(f"設定圖表 4 篩選條件"):
-                        st.markdown("**(AND 邏輯)**")
-                        filter_candidates_4 = [c for c in df.columns if c not in ['dt', 'title']]
-                        selected_filters_4 = st.multiselect(f"篩選欄位 (圖4)", filter_candidates_4, default=['卡片曝光uv'], key="filters_4")
-                        current_filters_4 = {}
-                        for f_col in selected_filters_4:
-                            default_val = 400.0 if '曝光' in f_col else 0.0
-                            val = st.number_input(f"{f_col} >", value=default_val, key=f"fv_4_{f_col}")
-                            current_filters_4[f_col] = val
-                    
-                    chart_configs.append({
-                        "id": 4,
-                        "type": "custom_combo",
-                        "top_n": top_n_4,
-                        "metrics_config": combo_config,
-                        "filters": current_filters_4
-                    })
-
-            # 3. Correlation Settings
-            with st.expander("🔥 3. 關聯分析設定"):
-                show_correlation = st.toggle("顯示關聯分析", value=True)
-                corr_color_exp = st.color_picker("曝光顏色", "#00f2fe", key="corr_c1")
-                corr_color_conv = st.color_picker("轉化顏色", "#fbc2eb", key="corr_c2")
+
+            # Distribution summary, from the sketches
+            with st.expander("📐 分佈摘要 (Distribution)"):
+                distribution = pd.DataFrame({
+                    col: {
+                        name: f"{value:,}" if name in ('count', 'missing') else metric_format(col).format(value)
+                        for name, value in sketch.summary().items()
+                    }
+                    for col, sketch in title_sketches.items()
+                }).T
+                distribution.columns = [
+                    {'count': '篇數', 'missing': '缺值', 'mean': '平均', 'min': '最小', 'max': '最大'}.get(c, c.upper())
+                    for c in distribution.columns
+                ]
+                st.dataframe(distribution, use_container_width=True)
+                st.caption("每篇標題的近似值 (分位數誤差 ±1%)，由可合併的分位數草圖計算，不需排序全部資料。")
+
+            # Time Rollup: chart slots read per-title aggregates for a period range
+            slot_masks, slot_sketches, rollup_key = title_engine, title_sketches, None
+            with st.expander("🗓️ 時間彙總 (Time Rollup)"):
+                if not rollups.available:
+                    st.caption("dt 欄位無法解析為日期，無法依時間彙總。")
+                    use_rollup = False
+                else:
+                    use_rollup = st.toggle("圖表改用時間彙總", value=False, key="use_rollup",
+                                           help="依標題加總所選期間的數據，比率以加總後的分子/分母重新計算。")
+                if use_rollup:
+                    granularity = st.selectbox("時間粒度", list(GRANULARITIES), format_func=GRANULARITIES.get, key="rollup_granularity")
+                    periods = rollups.periods(granularity)
+                    if len(periods) > 1:
+                        period_start, period_end = st.select_slider(
+                            "期間", options=periods, value=(periods[0], periods[-1]),
+                            format_func=lambda p: f"{p:%Y-%m-%d}", key=f"rollup_range_{granularity}"
+                        )
+                    else:
+                        period_start = period_end = periods[0]
+                    rollup_key = (granularity, str(period_start), str(period_end))
+                    slot_masks, slot_sketches = analysis.period(granularity, period_start, period_end)
+                    st.caption(f"{len(slot_masks.df):,} 篇標題 · {len(periods):,} 個期間")
 
         # --- Main Dashboard (Left Column) ---
         with col_main:
@@ -469,302 +861,63 @@ if df is not None:
                 </div>
                 """, unsafe_allow_html=True)
                 
-            avg_exp = df_global_filtered['卡片曝光uv'].mean()
-            avg_visit = df_global_filtered['頁面訪問uv'].mean()
             # Handle empty data case
             if len(df_global_filtered) == 0:
                 st.warning("⚠️ 篩選條件過於嚴格，無數據可顯示。")
                 st.stop()
                 
-            avg_article_rate = df_global_filtered['文章訪問率'].mean()
-            avg_conv_rate = df_global_filtered['功能轉化率'].mean()
+            # Means per title; rates are ratios of the summed counts, not means of per-title rates
+            card_metrics = analysis.card_metrics(min_exposure)
+            avg_exp, avg_visit = card_metrics['卡片曝光uv'], card_metrics['頁面訪問uv']
+            avg_article_rate, avg_conv_rate = card_metrics['文章訪問率'], card_metrics['功能轉化率']
 
-            metric_card(m1, "平均卡片曝光", f"{avg_exp:,.0f}")
-            metric_card(m2, "平均頁面訪問", f"{avg_visit:,.0f}")
-            metric_card(m3, "平均文章訪問 (CTR)", f"{avg_article_rate:.2%}")
-            metric_card(m4, "平均功能轉化 (CVR)", f"{avg_conv_rate:.2%}")
+            metric_card(m1, "每篇平均卡片曝光", f"{avg_exp:,.0f}")
+            metric_card(m2, "每篇平均頁面訪問", f"{avg_visit:,.0f}")
+            metric_card(m3, "整體文章訪問率 (CTR)", f"{avg_article_rate:.2%}")
+            metric_card(m4, "整體功能轉化率 (CVR)", f"{avg_conv_rate:.2%}")
 
             st.markdown("<br>", unsafe_allow_html=True)
 
-            # 2. Charts
-            figs = []
-            
-            # Helper for standard chart layout
-            def update_chart_layout(fig, title_text=""):
-                fig.update_layout(
-                    template="plotly_dark",
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    xaxis=dict(
-                        showgrid=False, 
-                        tickangle=-45,  # Rotate labels to prevent squeezing
-                        automargin=True,
-                        title=None
-                    ),
-                    yaxis=dict(gridcolor='rgba(255,255,255,0.1)', showgrid=True),
-                    legend=dict(orientation="h", y=1.15, x=0.5, xanchor="center", font=dict(size=12)),
-                    margin=dict(t=60, b=100, r=50), # Extra margins
-                    uniformtext_minsize=8, 
-                    uniformtext_mode='hide',
-                    hovermode="x unified" # Enable unified tooltip for combo charts
-                )
-                if title_text:
-                    fig.update_layout(title=dict(text=title_text, x=0.5, xanchor='center'))
-                return fig
-
-            # Overview
-            if show_overview:
-                st.markdown("### 📈 Performance Overview (Dual Axis)")
-                
-                # Sort by Exposure
-                df_ov = df_global_filtered.sort_values(by='卡片曝光uv', ascending=False)
-                
-                fig_overview = make_subplots(specs=[[{"secondary_y": True}]])
-                
-                # Big Numbers: Exposure (Left Axis, Bar)
-                fig_overview.add_trace(
-                    go.Bar(
-                        x=df_ov['title'], y=df_ov['卡片曝光uv'], name='Exp. (L)', 
-                        marker_color='#4facfe', opacity=0.7,
-                        text=df_ov['卡片曝光uv'], textposition='outside', texttemplate='<b>%{y:.0f}</b>',
-                        textfont=dict(color='white', size=12),
-                        offsetgroup=1,
-                        hovertemplate="%{y:.0f}" # Simplified for unified view
-                    ),
-                    secondary_y=False
+            # 2. Charts, each a fragment: a slot's settings sit with its chart and rerun only it.
+            # Units record their latest (figure key, figure) here for the report; the dict is
+            # emptied on each full rerun, keeping the report order (overview, trend, slots)
+            report_figs = st.session_state.setdefault('report_figs', {})
+            report_figs.clear()
+
+            overview_unit(analysis, df_global_filtered, cache_key, min_exposure, figure_cache, report_figs, trace)
+
+            # Trend across periods, straight from the rollup totals
+            if use_rollup:
+                st.markdown(f"### 🗓️ Trend ({GRANULARITIES[granularity]})")
+                trend = rollups.totals(granularity, period_start, period_end)
+                trend_key = figure_key(cache_key, "trend", rollup_key)
+                fig_trend = figure_cache.get_or_build(
+                    trend_key,
+                    lambda: build_overview_figure(trend.assign(title=trend['period'].dt.strftime('%Y-%m-%d')))
                 )
-
-                # Smaller Numbers: Visits & Clicks (Right Axis, Lines/Scatter)
-                # Visits
-                fig_overview.add_trace(
-                    go.Scatter(
-                        x=df_ov['title'], y=df_ov['頁面訪問uv'], name='Visits (R)',
-                        line=dict(color='#a18cd1', width=3), mode='lines+markers+text',
-                        text=df_ov['頁面訪問uv'], textposition='top center', texttemplate='<b>%{y:.0f}</b>',
-                        textfont=dict(color='white', size=12),
-                        hovertemplate="%{y:.0f}"
-                    ),
-                    secondary_y=True
-                )
-                
-                # Clicks
-                fig_overview.add_trace(
-                    go.Scatter(
-                        x=df_ov['title'], y=df_ov['行動點點擊uv (入口+詳情)'], name='Clicks (R)',
-                        line=dict(color='#ff9f43', width=3), mode='lines+markers+text',
-                        text=df_ov['行動點點擊uv (入口+詳情)'], textposition='bottom center', texttemplate='<b>%{y:.0f}</b>',
-                        textfont=dict(color='white', size=12),
-                        hovertemplate="%{y:.0f}"
-                    ),
-                    secondary_y=True
-                )
-                
-                update_chart_layout(fig_overview)
-                
-                # Adjust Axes
-                fig_overview.update_layout(
-                    yaxis=dict(title="Exposure", side="left", showgrid=True),
-                    yaxis2=dict(title="Visits & Clicks", side="right", overlaying="y", showgrid=False),
-                    barmode='group' 
-                )
-                st.plotly_chart(fig_overview, use_container_width=True)
-                figs.append(fig_overview)
+                st.plotly_chart(fig_trend, use_container_width=True)
+                report_figs['trend'] = (trend_key, fig_trend)
 
             # Customizable Charts (Slots 1-4)
-            if chart_configs:
-                # Layout: 2 cols per row
-                chart_cols = st.columns(2)
-                
-                for idx, config in enumerate(chart_configs):
-                    with chart_cols[idx % 2]:
-                        # --- Apply Specific Filters ---
-                        df_chart = df.copy()
-                        mask = pd.Series([True] * len(df_chart), index=df_chart.index)
-                        filter_txt = []
-                        
-                        for f_col, f_val in config['filters'].items():
-                             if pd.api.types.is_numeric_dtype(df_chart[f_col]):
-                                mask = mask & (df_chart[f_col] > f_val)
-                                filter_txt.append(f"{f_col}>{f_val}")
-                        
-                        df_chart = df_chart[mask]
-                        
-                        # --- Render ---
-                        if len(df_chart) == 0:
-                            st.warning(f"圖表 {config['id']}: 無符合數據")
-                            continue
-                            
-                        top_n = config['top_n']
-                        
-                        if config['type'] == 'generic':
-                            metric = config['metric']
-                            st.markdown(f"### 📊 Chart {config['id']}: {metric}")
-                            if filter_txt: st.caption(f"Filter: {', '.join(filter_txt)}")
-                            
-                            # Sort Descending
-                            top_data = df_chart.nlargest(min(top_n, len(df_chart)), metric)
-                            
-                            # Simple High Contrast Color
-                            chart_color = '#00f2fe' if idx % 2 == 0 else '#fbc2eb'
-                            
-                            is_rate = '率' in metric
-                            fmt = '.1%' if is_rate else '.0f'
-                            
-                            if "Bar" in config['chart_type']:
-                                fig = px.bar(
-                                    top_data, x='title', y=metric, 
-                                    text=metric
-                                )
-                                fig.update_traces(
-                                    marker_color=chart_color,
-                                    texttemplate=f'<b>%{{y:{fmt}}}</b>',
-                                    textposition='outside',
-                                    cliponaxis=False,
-                                    textfont=dict(color='white', size=12),
-                                    hovertemplate=f"%{{y:{fmt}}}<extra></extra>"
-                                )
-                            else:
-                                fig = px.line(
-                                    top_data, x='title', y=metric, 
-                                    markers=True, text=metric
-                                )
-                                fig.update_traces(
-                                    line_color=chart_color,
-                                    texttemplate=f'<b>%{{y:{fmt}}}</b>',
-                                    textposition='top center',
-                                    cliponaxis=False,
-                                    textfont=dict(color='white', size=12),
-                                    hovertemplate=f"%{{y:{fmt}}}<extra></extra>"
-                                )
-                                
-                            update_chart_layout(fig)
-                            st.plotly_chart(fig, use_container_width=True)
-                            figs.append(fig)
-                            
-                        elif config['type'] == 'custom_combo':
-                            st.markdown(f"### 🔸 Chart {config['id']}: Multi-Metric Combo")
-                            if filter_txt: st.caption(f"Filter: {', '.join(filter_txt)}")
-                            
-                            # Sort Logic: Sort by the first Bar chart metric found, else first Line metric.
-                            metrics_cfg = config['metrics_config']
-                            if not metrics_cfg:
-                                st.warning("請至少選擇一個指標")
-                                continue
-                                
-                            # Determine Sort Column (First Bar or First Metric)
-                            sort_col = list(metrics_cfg.keys())[0]
-                            for m, cfg in metrics_cfg.items():
-                                if cfg['type'] == 'Bar':
-                                    sort_col = m
-                                    break
-                            
-                            # Sort Descending
-                            top_data = df_chart.nlargest(min(top_n, len(df_chart)), sort_col)
-                            
-                            fig = make_subplots(specs=[[{"secondary_y": True}]])
-                            
-                            # Color Palette generator
-                            colors = ['#00f2fe', '#fbc2eb', '#4facfe', '#ff9f43', '#a18cd1']
-                            
-                            # Track Scaling for range adjustment
-                            max_l, max_r = 0, 0
-                            
-                            for m_i, (metric_name, m_cfg) in enumerate(metrics_cfg.items()):
-                                color = colors[m_i % len(colors)]
-                                is_sec = (m_cfg['axis'] == "右軸 (副)")
-                                is_rate = '率' in metric_name
-                                fmt = '.1%' if is_rate else '.0f'
-                                
-                                # Update Max for range
-                                current_max = top_data[metric_name].max()
-                                if is_sec:
-                                    max_r = max(max_r, current_max)
-                                else:
-                                    max_l = max(max_l, current_max)
-                                
-                                # Visual adjustments
-                                if m_cfg['type'] == 'Bar':
-                                    fig.add_trace(
-                                        go.Bar(
-                                            x=top_data['title'], y=top_data[metric_name], 
-                                            name=f"{metric_name} ({'R' if is_sec else 'Main'})",
-                                            marker_color=color, opacity=0.8,
-                                            text=top_data[metric_name], textposition='outside', 
-                                            texttemplate=f'<b>%{{y:{fmt}}}</b>',
-                                            textfont=dict(color='white', size=12), # Reduced slightly for density
-                                            hovertemplate=f"%{{y:{fmt}}}" # Clean for unified
-                                        ),
-                                        secondary_y=is_sec
-                                    )
-                                else:
-                                    fig.add_trace(
-                                        go.Scatter(
-                                            x=top_data['title'], y=top_data[metric_name],
-                                            name=f"{metric_name} ({'R' if is_sec else 'Main'})",
-                                            mode='lines+markers+text',
-                                            line=dict(color=color, width=4),
-                                            marker=dict(size=10, line=dict(width=2, color='white')), # Pop markers
-                                            text=top_data[metric_name], textposition='top center',
-                                            texttemplate=f'<b>%{{y:{fmt}}}</b>',
-                                            textfont=dict(color='white', size=12),
-                                            hovertemplate=f"%{{y:{fmt}}}"
-                                        ),
-                                        secondary_y=is_sec
-                                    )
-                            
-                            update_chart_layout(fig)
-                            
-                            # Axis Titles & Range Padding (to fit 'outside' text)
-                            fig.update_layout(
-                                yaxis=dict(title="Main Axis", showgrid=True, range=[0, max_l * 1.25]),
-                                yaxis2=dict(title="Secondary Axis", showgrid=False, overlaying='y', side='right', range=[0, max_r * 1.25]),
-                                barmode='group',
-                                # Unified hover enabled in update_chart_layout
-                            )
-                            st.plotly_chart(fig, use_container_width=True)
-                            figs.append(fig)
-
-        # 3. Summary Section
-        st.markdown("---")
-        st.markdown("### 🧠 Insight Generation")
-        
-        # Ensure df_global_filtered is used for summary if df_filtered is not defined elsewhere
-        # Assuming df_filtered should be df_global_filtered for consistency with metric cards
-        top_titles_conv = df_global_filtered.nlargest(3, '功能轉化率')['title'].tolist()
-        default_summary = f"""**本期數據洞察 (Automated Insights)：**
-
-1. **高轉化 (High CVR)**：
-   - 「{top_titles_conv[0] if top_titles_conv else 'N/A'}」表現最佳。
-   - 建議：分析該篇的 Call-to-Action 與排版結構。
-
-2. **策略建議 (Strategy)**：
-   - (在此輸入您的觀察...)
-"""
-        analysis_input = st.text_area("Analysis Summary", value=default_summary, height=250)
-        
-        # 4. Export Options
-        st.markdown("---")
-        st.subheader("📤 匯出與分享 (Export & Share)")
-        st.info("💡 **如何分享報告？**\n下載下方的 **HTML 網頁報告**，您可以直接將檔案傳送給同事，或上傳至 Google Drive / 公司內網，即可生成分享連結。")
-        
-        col_dl1, col_dl2 = st.columns(2)
-        
-        # Option 1: Markdown
-        with col_dl1:
-            report_md = f"# Bitget Data Report\n{analysis_input}"
-            st.download_button("📝 下載 Markdown 筆記", report_md, "report.md")
-            
-        # Option 2: HTML Output (Web Link Equivalent)
-        with col_dl2:
-            html_report = create_html_report(df_global_filtered, analysis_input, figs)
-            st.download_button(
-                label="🌐 下載完整分析報告 (HTML 網頁)",
-                data=html_report,
-                file_name=f"Bitget_Analysis_Report_{pd.Timestamp.now().strftime('%Y%m%d')}.html",
-                mime="text/html",
-                help="下載後可直接用瀏覽器開啟，保留所有互動圖表功能。"
+            st.markdown("### 🧩 自定義圖表區 (Custom Charts)")
+            # Layout: 2 cols per row
+            chart_cols = st.columns(2)
+            for i in range(1, 5):
+                with chart_cols[(i - 1) % 2]:
+                    chart_slot(i, analysis, slot_masks, slot_sketches, cache_key, rollup_key, figure_cache, report_figs, trace)
+
+            # 3. Correlation
+            correlation_unit(analysis, df_global_filtered, cache_key, min_exposure, figure_cache, report_figs, trace)
+
+            # Figure cache counters
+            st.caption(
+                f"Figure cache: {figure_cache.hits} hits / {figure_cache.misses} misses "
+                f"({figure_cache.hit_rate:.0%}), {len(figure_cache)} cached"
             )
 
+        # 3. Summary & Export
+        export_unit(df_global_filtered, (cache_key, min_exposure), report_figs, trace)
+
     except Exception as e:
         st.error(f"Error: {e}")
         st.exception(e)
@@ -778,3 +931,48 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
+# --- Shared dataset store (admin view) ---
+with diag_panel:
+    st.markdown("**🗄️ 共用資料集 (Shared datasets)**")
+    if st.button("釋放未被引用的資料集", key="evict_unreferenced"):
+        st.caption(f"已釋放 {ingest_cache.evict_unreferenced() / 1024 ** 2:,.1f} MB")
+    resident = ingest_cache.entries()
+    st.caption(
+        f"{ingest_cache.total_bytes / 1024 ** 2:,.1f} / {ingest_cache.budget_bytes / 1024 ** 2:,.0f} MB · "
+        f"{len(resident)} 個資料集 · 命中 {ingest_cache.hits} / 未命中 {ingest_cache.misses} · "
+        f"淘汰 {ingest_cache.evictions}"
+    )
+    if resident:
+        resident = pd.DataFrame(resident)
+        st.dataframe(
+            pd.DataFrame({
+                "來源": resident['source'],
+                "指紋": resident['key'].str.split(':').str[-1].str[:12],
+                "列數": resident['rows'],
+                "MB": (resident['bytes'] / 1024 ** 2).round(1),
+                "引用": resident['refs'],
+                "命中": resident['hits'],
+                "最後使用": pd.to_datetime(resident['used_at'], unit='s').dt.strftime('%H:%M:%S'),
+            }),
+            hide_index=True, use_container_width=True
+        )
+
+# --- Diagnostics ---
+if trace.enabled:
+    # Last 50 reruns of this session, downloadable as JSON lines
+    history = record_trace(trace.finish())
+
+    with diag_panel:
+        if trace.stages:
+            stage_table = pd.DataFrame(trace.stages).set_index('stage')
+            st.dataframe(stage_table, use_container_width=True)
+        rss = trace.max_rss_bytes
+        st.caption(
+            f"Rerun #{trace.rerun_id} ({trace.context['backend']}): {trace.total_seconds:.3f}s"
+            + (f", 最大 RSS {rss / 1024 ** 2:,.0f} MB" if rss is not None else "")
+        )
+        st.download_button(
+            "⬇️ 下載紀錄 (JSON lines)", ''.join(history),
+            file_name="rerun_trace.jsonl", mime="application/x-ndjson"
+        )
+
@@ -0,0 +1,304 @@
+"""Query engines behind the dashboard's filters, top-N lists, means and group-bys.
+
+Every engine answers the same questions about one normalized dataset, with
+the interface of ``filters.MaskCache``:
+
+- ``pandas`` (default): ``MaskCache``, cached masks and presorted indexes.
+- ``duckdb``: SQL over an Arrow view of the frame, multi-threaded.
+- ``polars``: lazy Polars queries over the same Arrow view, multi-threaded.
+
+DuckDB and Polars are optional and only imported when selected. The engine
+is picked per deployment with the ``DATA_ANALYZER_BACKEND`` environment
+variable, or per call with ``backend=``.
+
+Engines return row positions, so row results are the same pandas rows in
+the same order on every engine. Counts and integer sums are exact; float
+means and sums are computed in float64 and agree up to summation order.
+``python backends.py`` checks every installed engine against pandas.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from filters import MaskCache, column_threshold, sum_dtypes
+
+BACKEND_ENV = 'DATA_ANALYZER_BACKEND'
+BACKENDS = ('pandas', 'duckdb', 'polars')
+POSITION = '__pos'
+
+
+def default_backend():
+    """Engine named by ``DATA_ANALYZER_BACKEND``, ``pandas`` when unset."""
+    name = os.environ.get(BACKEND_ENV, '').strip().lower() or 'pandas'
+    if name not in BACKENDS:
+        raise ValueError(f"{BACKEND_ENV}={name!r}; expected one of {BACKENDS}")
+    return name
+
+
+def create_engine(df, key=None, backend=None):
+    """Query engine over ``df``; ``backend`` defaults to ``default_backend()``."""
+    backend = backend or default_backend()
+    if backend == 'pandas':
+        return MaskCache(df, key=key)
+    if backend == 'duckdb':
+        return DuckDBEngine(df, key=key)
+    if backend == 'polars':
+        return PolarsEngine(df, key=key)
+    raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+class _ArrowEngine:
+    """Columnar engines: an Arrow view of the numeric columns plus each row's position.
+
+    The view shares the frame's buffers where Arrow allows it (NaN becomes
+    null, as pandas skips it). Grouping keys are factorized on first use and
+    added to the view as integer codes.
+    """
+
+    def __init__(self, df, key=None):
+        self._bind(df, key)
+
+    def _bind(self, df, key):
+        import pyarrow as pa
+
+        self.df, self.key = df, key
+        self._numeric = {c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])}
+        arrays = {c: pa.array(df[c].to_numpy(), from_pandas=True) for c in df.columns if c in self._numeric}
+        arrays[POSITION] = pa.array(np.arange(len(df), dtype='int64'))
+        self._table = pa.table(arrays)
+        self._group_keys = {}  # column -> (codes column, group values)
+        self._load(self._table)
+
+    def apply_delta(self, df, key, delta):
+        """Moves the engine to ``df``; the Arrow view is rebuilt, which is about a column copy."""
+        self._bind(df, key)
+
+    @property
+    def filter_columns(self):
+        """Columns a ``column > threshold`` filter applies to: the numeric ones."""
+        return [c for c in self.df.columns if c in self._numeric]
+
+    def _threshold(self, column, threshold):
+        return column_threshold(self.df[column].dtype, threshold)
+
+    def _filters(self, filters):
+        return [(c, float(self._threshold(c, v))) for c, v in (filters or {}).items() if c in self._numeric]
+
+    def _group_column(self, by):
+        import pyarrow as pa
+
+        entry = self._group_keys.get(by)
+        if entry is None:
+            values = self.df[by]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes, uniques = values.cat.codes.to_numpy(), None
+            else:
+                codes, uniques = pd.factorize(values, sort=True)
+            name = f'__by_{len(self._group_keys)}'
+            self._table = self._table.append_column(name, pa.array(codes.astype('int64'), mask=codes < 0))
+            self._load(self._table)
+            entry = self._group_keys[by] = (name, uniques)
+        return entry[0]
+
+    def _group_index(self, by, codes):
+        """Group labels for ``codes``, typed like the index of ``groupby(by)``."""
+        uniques = self._group_keys[by][1]
+        if uniques is None:
+            return pd.CategoricalIndex(pd.Categorical.from_codes(codes, dtype=self.df[by].dtype), name=by)
+        return uniques.take(codes).rename(by)
+
+    def count(self, filters):
+        return int(self._count(self._filters(filters)))
+
+    def count_above(self, column, threshold):
+        """Rows with ``column > threshold``; accepts an array of thresholds too."""
+        thresholds = self._threshold(column, threshold)
+        counts = self._counts_above(column, np.atleast_1d(thresholds).tolist())
+        return counts if thresholds.ndim else counts[0]
+
+    def rows_above(self, column, threshold):
+        """Rows with ``column > threshold``, sorted by that column descending."""
+        return self.df.iloc[self._positions([(column, float(self._threshold(column, threshold)))], column, None)]
+
+    def top_n(self, filters, column, n):
+        """Top ``n`` filtered rows by ``column``, like ``nlargest`` on the filtered frame."""
+        return self.df.iloc[self._positions(self._filters(filters), column, n)]
+
+    def means(self, columns, filters=None):
+        """Float64 mean of each column over the filtered rows (NaN skipped)."""
+        values = [np.nan if v is None else v for v in self._means(self._filters(filters), columns)]
+        return pd.Series(values, index=pd.Index(columns), dtype='float64')
+
+    def group_sums(self, by, columns, filters=None):
+        """Sums of ``columns`` per value of ``by``, like ``MaskCache.group_sums``."""
+        dtypes = sum_dtypes(self.df[columns])
+        codes, sums = self._group_sums(self._filters(filters), self._group_column(by), columns, dtypes)
+        frame = pd.DataFrame(dict(zip(columns, sums)), index=self._group_index(by, codes), columns=columns)
+        return frame.astype(dtypes)
+
+
+class DuckDBEngine(_ArrowEngine):
+    """SQL on an in-process DuckDB connection; the Arrow view is registered as ``dataset``."""
+
+    backend = 'duckdb'
+
+    def _load(self, table):
+        import duckdb
+
+        if not hasattr(self, '_con'):
+            self._con = duckdb.connect()
+        self._con.register('dataset', table)
+
+    def _where(self, filters, not_null=()):
+        clauses = [f"CAST({_quote(c)} AS DOUBLE) > ?" for c, _ in filters]
+        clauses += [f"{_quote(c)} IS NOT NULL" for c in not_null]
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), [v for _, v in filters]
+
+    def _count(self, filters):
+        where, params = self._where(filters)
+        return self._con.execute(f"SELECT count(*) FROM dataset{where}", params).fetchone()[0]
+
+    def _counts_above(self, column, thresholds):
+        counts = ', '.join(f"count(*) FILTER (WHERE CAST({_quote(column)} AS DOUBLE) > ?)" for _ in thresholds)
+        return np.array(self._con.execute(f"SELECT {counts} FROM dataset", thresholds).fetchone(), dtype='int64')
+
+    def _positions(self, filters, column, limit):
+        where, params = self._where(filters, not_null=[column])
+        sql = f"SELECT {POSITION} FROM dataset{where} ORDER BY {_quote(column)} DESC, {POSITION}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return np.asarray(self._con.execute(sql, params).fetchnumpy()[POSITION], dtype='int64')
+
+    def _means(self, filters, columns):
+        where, params = self._where(filters)
+        means = ', '.join(f"avg(CAST({_quote(c)} AS DOUBLE))" for c in columns)
+        return self._con.execute(f"SELECT {means} FROM dataset{where}", params).fetchone()
+
+    def _group_sums(self, filters, key, columns, dtypes):
+        where, params = self._where(filters, not_null=[key])
+        sums = ', '.join(
+            f"coalesce(CAST(sum({_quote(c)}) AS BIGINT), 0)" if dtypes[c] == 'int64'
+            else f"coalesce(sum(CAST({_quote(c)} AS DOUBLE)), 0)"
+            for c in columns
+        )
+        result = self._con.execute(
+            f"SELECT {key}, {sums} FROM dataset{where} GROUP BY {key} ORDER BY {key}", params
+        ).fetchnumpy()
+        values = list(result.values())
+        return np.asarray(values[0], dtype='int64'), [np.asarray(v) for v in values[1:]]
+
+
+class PolarsEngine(_ArrowEngine):
+    """Lazy Polars queries over the Arrow view."""
+
+    backend = 'polars'
+
+    def _load(self, table):
+        import polars as pl
+
+        self._frame = pl.from_arrow(table)
+
+    def _query(self, filters, not_null=()):
+        import polars as pl
+
+        conditions = [pl.col(c).cast(pl.Float64) > v for c, v in filters]
+        conditions += [pl.col(c).is_not_null() for c in not_null]
+        query = self._frame.lazy()
+        return query.filter(pl.all_horizontal(conditions)) if conditions else query
+
+    def _count(self, filters):
+        import polars as pl
+
+        return self._query(filters).select(pl.len()).collect().item()
+
+    def _counts_above(self, column, thresholds):
+        import polars as pl
+
+        value = pl.col(column).cast(pl.Float64)
+        counts = self._frame.select([(value > t).sum().alias(str(i)) for i, t in enumerate(thresholds)])
+        return np.array(counts.row(0), dtype='int64')
+
+    def _positions(self, filters, column, limit):
+        # Filtering keeps row order, so a stable sort breaks ties by position
+        query = self._query(filters, not_null=[column]).sort(column, descending=True, maintain_order=True)
+        if limit is not None:
+            query = query.head(int(limit))
+        return query.select(POSITION).collect().to_series().to_numpy().astype('int64', copy=False)
+
+    def _means(self, filters, columns):
+        import polars as pl
+
+        return self._query(filters).select([pl.col(c).cast(pl.Float64).mean() for c in columns]).collect().row(0)
+
+    def _group_sums(self, filters, key, columns, dtypes):
+        import polars as pl
+
+        sums = [pl.col(c).cast(pl.Int64 if dtypes[c] == 'int64' else pl.Float64).sum() for c in columns]
+        result = self._query(filters, not_null=[key]).group_by(key).agg(sums).sort(key).collect()
+        return result[key].to_numpy().astype('int64'), [result[c].to_numpy() for c in columns]
+
+
+# --- Consistency check ---
+CHECK_FILTERS = [{}, {'卡片曝光uv': 400}, {'卡片曝光uv': 400, '頁面訪問uv': 50}, {'功能轉化率': 0.1}]
+
+
+def check_engine(df, backend):
+    """Runs the dashboard's queries on ``backend`` and on pandas; returns the mismatches."""
+    from normalize import COUNT_COLS, RATE_COLS
+
+    expected, engine = MaskCache(df), create_engine(df, backend=backend)
+    problems = []
+
+    def same(name, got, want, exact=True):
+        try:
+            if isinstance(want, pd.DataFrame):
+                pd.testing.assert_frame_equal(got, want, check_exact=exact)
+            elif isinstance(want, pd.Series):
+                pd.testing.assert_series_equal(got, want, check_exact=exact)
+            else:
+                np.testing.assert_array_equal(got, want)
+        except AssertionError as e:
+            problems.append(f"{name}: {str(e).strip().splitlines()[0]}")
+
+    steps = list(range(0, 5001, 100))
+    same('count_above', engine.count_above('卡片曝光uv', steps), expected.count_above('卡片曝光uv', steps))
+    for threshold in (0, 400, 5000):
+        same(f'rows_above {threshold}', engine.rows_above('卡片曝光uv', threshold), expected.rows_above('卡片曝光uv', threshold))
+    for filters in CHECK_FILTERS:
+        same(f'count {filters}', engine.count(filters), expected.count(filters))
+        for column in COUNT_COLS + RATE_COLS:
+            same(f'top_n {column} {filters}', engine.top_n(filters, column, 10), expected.top_n(filters, column, 10))
+        same(f'means {filters}', engine.means(COUNT_COLS + RATE_COLS, filters),
+             expected.means(COUNT_COLS + RATE_COLS, filters), exact=False)
+        for by in ('title', 'dt'):
+            same(f'group_sums {by} {filters}', engine.group_sums(by, COUNT_COLS, filters),
+                 expected.group_sums(by, COUNT_COLS, filters))
+    return problems
+
+
+if __name__ == '__main__':
+    from normalize import normalize_frame
+    from synthetic import synthetic_frame
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    df = normalize_frame(synthetic_frame(rows))
+    failed = False
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        try:
+            problems = check_engine(df, backend)
+        except ImportError as e:
+            print(f"{backend}: not installed ({e.name})")
+            continue
+        failed = failed or bool(problems)
+        print(f"{backend}: {'ok' if not problems else f'{len(problems)} mismatches'} ({time.perf_counter() - start:.2f}s)")
+        for problem in problems:
+            print(f"  {problem}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,213 @@
+"""Headless report generation: the dashboard pipeline without Streamlit.
+
+Each input file is loaded, normalized, filtered by minimum exposure, charted
+from the configured slots and exported as HTML and/or Markdown. Files are
+processed in parallel on a process pool; per-job stage timings and any
+failures are written to ``batch_report.json`` in the output directory,
+with approximate per-title metric distributions for each file and, merged
+from the files' quantile sketches, for all of them.
+
+    python batch_report.py channels/*.xlsx -c weekly.json -o reports -j 8
+
+Inputs are Excel or CSV/TSV files, or Google Sheets links (fetched through
+the same on-disk HTTP cache as the dashboard).
+
+The config file is JSON; missing keys fall back to ``DEFAULT_CONFIG`` (the
+dashboard defaults), nested objects key by key, while lists such as
+``charts`` replace the default list. ``charts`` uses the same slot configs
+as the app::
+
+    {"min_exposure": 400,
+     "charts": [{"type": "generic", "metric": "功能轉化率", "top_n": 6,
+                 "chart_type": "Bar (長條)", "filters": {"卡片曝光uv": 400}}]}
+"""
+import argparse
+import contextlib
+import copy
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from backends import BACKENDS
+from core import Analysis, is_sheet_url, load_path, sheet_ids
+from normalize import normalize_frame
+from report import default_summary, markdown_report, write_html_report
+from sketches import merge_sketches
+
+DEFAULT_CONFIG = {
+    'min_exposure': 400,
+    'sheets': None,  # Excel sheet names to merge; default: the first sheet
+    'overview': {'max_points': 200, 'webgl_rows': 150},  # null to leave it out
+    'charts': [
+        {'type': 'generic', 'metric': '功能轉化率', 'top_n': 6, 'chart_type': 'Bar (長條)', 'filters': {}},
+        {'type': 'generic', 'metric': '文章訪問率', 'top_n': 6, 'chart_type': 'Bar (長條)', 'filters': {}},
+        {
+            'type': 'custom_combo', 'top_n': 10,
+            'metrics_config': {
+                '卡片曝光uv': {'type': 'Bar', 'axis': '左軸 (主)'},
+                '功能轉化率': {'type': 'Line', 'axis': '右軸 (副)'},
+            },
+            'filters': {'卡片曝光uv': 400.0},
+        },
+    ],
+    'summary': None,  # summary text; default: the automated insights
+    'offline': True,  # embed plotly.js in the HTML report
+    'formats': ['html', 'md'],
+    'backend': None,  # query engine: pandas, duckdb or polars; default: DATA_ANALYZER_BACKEND
+}
+
+CHART_TYPES = ('generic', 'custom_combo')
+
+
+def _merge_config(base, overrides):
+    """``base`` updated in place with ``overrides``, recursing into objects present in both."""
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge_config(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def load_config(path=None):
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if path:
+        with open(path, encoding='utf-8') as f:
+            _merge_config(config, json.load(f))
+    for chart in config['charts']:
+        if chart.get('type') not in CHART_TYPES:
+            raise ValueError(f"Unknown chart type {chart.get('type')!r}; expected one of {CHART_TYPES}")
+        chart.setdefault('filters', {})
+    if config['backend'] is not None and config['backend'] not in BACKENDS:
+        raise ValueError(f"Unknown backend {config['backend']!r}; expected one of {BACKENDS}")
+    return config
+
+
+@contextlib.contextmanager
+def _stage(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.perf_counter() - start, 4)
+
+
+def run_job(path, config, out_dir, name):
+    """Generates the reports for one input file; never raises, failures go in the result."""
+    timings = {}
+    result = {'input': path, 'status': 'ok', 'timings': timings, 'outputs': []}
+    start = time.perf_counter()
+    try:
+        with _stage(timings, 'load'):
+            raw = load_path(path, config.get('sheets'))
+        with _stage(timings, 'normalize'):
+            df = normalize_frame(raw)
+        with _stage(timings, 'filter'):
+            analysis = Analysis(df, backend=config.get('backend'))
+            df_filtered = analysis.above_exposure(config['min_exposure'])
+        result['rows'], result['rows_filtered'] = len(df), len(df_filtered)
+        # Sketches go back to the parent to be merged; only their summaries are written
+        result['sketches'] = analysis.sketches
+        result['distribution'] = {col: sketch.summary() for col, sketch in analysis.sketches.items()}
+        if len(df_filtered) == 0:
+            raise ValueError(f"No rows with 卡片曝光uv > {config['min_exposure']}")
+        with _stage(timings, 'charts'):
+            figs = analysis.slot_figures(config['charts'], df_filtered, config.get('overview'))
+        summary_text = config.get('summary') or default_summary(df_filtered)
+        with _stage(timings, 'export'):
+            if 'html' in config['formats']:
+                html_path = os.path.join(out_dir, f"{name}.html")
+                with open(html_path, 'w', encoding='utf-8') as f:
+                    write_html_report(
+                        f, df_filtered, summary_text, figs,
+                        plotlyjs='inline' if config['offline'] else 'cdn', compress=config['offline']
+                    )
+                result['outputs'].append(html_path)
+            if 'md' in config['formats']:
+                md_path = os.path.join(out_dir, f"{name}.md")
+                with open(md_path, 'w', encoding='utf-8') as f:
+                    f.write(markdown_report(summary_text))
+                result['outputs'].append(md_path)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def _output_names(paths):
+    """Report file stem per input, made unique when two inputs share a name."""
+    names, seen = [], {}
+    for path in paths:
+        if is_sheet_url(path) and sheet_ids(path) is not None:
+            stem = '-'.join(['sheet', *filter(None, sheet_ids(path))])  # sheet-<id>[-<gid>]
+        else:
+            stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(stem if seen[stem] == 1 else f"{stem}-{seen[stem]}")
+    return names
+
+
+def generate_reports(paths, config, out_dir, jobs=None, on_result=None):
+    """Runs every input on a process pool; returns the job results in input order."""
+    os.makedirs(out_dir, exist_ok=True)
+    results = [None] * len(paths)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(run_job, path, config, out_dir, name): i
+            for i, (path, name) in enumerate(zip(paths, _output_names(paths)))
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # The worker process itself died
+                result = {'input': paths[i], 'status': 'failed', 'error': f"{type(e).__name__}: {e}", 'outputs': []}
+            results[i] = result
+            if on_result is not None:
+                on_result(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate HTML/Markdown reports for many input files without the dashboard.")
+    parser.add_argument('inputs', nargs='+', help="Excel or CSV/TSV files, or Google Sheets links")
+    parser.add_argument('-c', '--config', help="JSON file with report settings and chart configs")
+    parser.add_argument('-o', '--out-dir', default='reports', help="output directory (default: reports)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    start = time.perf_counter()
+
+    def print_result(result):
+        status = 'OK  ' if result['status'] == 'ok' else 'FAIL'
+        detail = ', '.join(f"{k} {v:.2f}s" for k, v in result.get('timings', {}).items())
+        print(f"{status} {result['input']} ({result.get('seconds', 0):.2f}s{': ' + detail if detail else ''})")
+
+    results = generate_reports(args.inputs, config, args.out_dir, args.jobs, on_result=print_result)
+    failures = [r for r in results if r['status'] != 'ok']
+    merged = merge_sketches([r.pop('sketches') for r in results if 'sketches' in r])
+    report_path = os.path.join(args.out_dir, 'batch_report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'seconds': round(time.perf_counter() - start, 4),
+            'succeeded': len(results) - len(failures),
+            'failed': len(failures),
+            'distribution': {col: sketch.summary() for col, sketch in merged.items()},
+            'jobs': results,
+        }, f, ensure_ascii=False, indent=1)
+
+    print(f"\n{len(results) - len(failures)}/{len(results)} reports written to {args.out_dir} ({report_path})")
+    for r in failures:
+        print(f"  FAILED {r['input']}: {r['error']}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
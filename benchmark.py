@@ -0,0 +1,254 @@
+"""Stage-by-stage benchmarks of the dashboard pipeline on synthetic sheets.
+
+Each stage is timed separately (best and median of ``--repeat`` runs) for
+every dataset size and written as one JSON object per line, tagged with
+the git commit, so runs on two commits can be compared:
+
+    python benchmark.py --sizes 1000 100000 1000000 -o main.jsonl
+    python benchmark.py --sizes 1000 100000 1000000 -o branch.jsonl --compare main.jsonl
+
+``--compare`` exits with status 1 when a stage got slower than
+``--threshold`` times its baseline, or missed its ``SPEEDUP_TARGETS``
+ratio over the code it replaced. Writing workbooks is slow, so the Excel
+parse stage only runs up to ``--excel-rows`` rows. ``--backend`` picks the
+query engine for the filter and top-N stages (see ``backends``).
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from backends import BACKENDS, create_engine
+from charts import build_overview_figure, build_slot_figure, downsample_overview
+from coerce import coerce_numeric
+from excel_reader import read_excel_sheets
+from normalize import COUNT_COLS, RATE_COLS, match_columns, normalize_frame
+from paste_reader import read_pasted
+from report import create_html_report, default_summary
+from rollups import RollupEngine
+from synthetic import synthetic_frame, to_csv_text, to_xlsx_bytes
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+EXCEL_MAX_ROWS = 1_048_575
+
+# The dashboard's default chart slots
+BENCH_SLOTS = [
+    {'type': 'generic', 'metric': '功能轉化率', 'top_n': 6, 'chart_type': 'Bar (長條)', 'filters': {}},
+    {'type': 'generic', 'metric': '文章訪問率', 'top_n': 6, 'chart_type': 'Bar (長條)', 'filters': {'頁面訪問uv': 50.0}},
+    {
+        'type': 'custom_combo', 'top_n': 10,
+        'metrics_config': {
+            '卡片曝光uv': {'type': 'Bar', 'axis': '左軸 (主)'},
+            '功能轉化率': {'type': 'Line', 'axis': '右軸 (副)'},
+        },
+        'filters': {'卡片曝光uv': 400.0},
+    },
+]
+MIN_EXPOSURE = 400
+
+# (stage, source) -> (reference (stage, source), minimum speedup, smallest size checked)
+SPEEDUP_TARGETS = {
+    ('coerce', 'counts'): (('coerce', 'counts_legacy'), 10.0, 1_000_000),
+}
+
+
+def legacy_counts(series):
+    """The count cleaning ``coerce_numeric`` replaced: a string round trip and ``pd.to_numeric``."""
+    return pd.to_numeric(series.astype(str).str.replace(',', '', regex=False), errors='coerce').fillna(0)
+
+
+def time_stage(fn, repeat, setup=None):
+    """(best, median) seconds of ``fn(setup())``; setup time is not counted.
+
+    One untimed run goes first, so lazy imports and first-use caches are
+    not billed to whichever size happens to run first.
+    """
+    times = []
+    for i in range(repeat + 1):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        if i:
+            times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def run_size(rows, repeat, excel_rows, seed=0, backend='pandas'):
+    """Yields ``(stage, source, best, median)`` for one dataset size."""
+    raw = synthetic_frame(rows, seed=seed)
+
+    # Parsing, per source type
+    csv_bytes = to_csv_text(raw).encode('utf-8')
+    yield ('parse', 'sheets_csv', *time_stage(lambda: pd.read_csv(io.BytesIO(csv_bytes)), repeat))
+    paste_text = to_csv_text(raw, sep='\t')
+    yield ('parse', 'paste_tsv', *time_stage(lambda: read_pasted(paste_text), repeat))
+    if rows <= min(excel_rows, EXCEL_MAX_ROWS):
+        xlsx_bytes = to_xlsx_bytes(raw)
+        yield ('parse', 'excel', *time_stage(lambda: read_excel_sheets(io.BytesIO(xlsx_bytes)), repeat))
+    del csv_bytes, paste_text
+
+    # Cleaning: fuzzy matching, coercion alone, then the whole normalize step
+    yield ('match_columns', None, *time_stage(match_columns, repeat, setup=lambda: raw.copy(deep=False)))
+    matched = match_columns(raw.copy(deep=False))
+    yield ('coerce', None, *time_stage(
+        lambda: [coerce_numeric(matched[col]) for col in COUNT_COLS + RATE_COLS], repeat
+    ))
+    # Comma-formatted count columns, against the cleaning they replaced
+    text_counts = [col for col in COUNT_COLS if not pd.api.types.is_numeric_dtype(matched[col])]
+    yield ('coerce', 'counts_legacy', *time_stage(lambda: [legacy_counts(matched[col]) for col in text_counts], repeat))
+    yield ('coerce', 'counts', *time_stage(lambda: [coerce_numeric(matched[col]) for col in text_counts], repeat))
+    yield ('normalize', None, *time_stage(normalize_frame, repeat, setup=lambda: raw.copy(deep=False)))
+    rows_df = normalize_frame(raw.copy(deep=False))
+
+    # One row per title: everything after this reads the per-title table
+    yield ('title_totals', None, *time_stage(lambda: RollupEngine(rows_df).titles(), repeat))
+    df = RollupEngine(rows_df).titles()
+
+    # Global filter, cold (index build) and warm (cached index)
+    yield ('global_filter', 'cold', *time_stage(
+        lambda masks: masks.rows_above('卡片曝光uv', MIN_EXPOSURE), repeat, setup=lambda: create_engine(df, backend=backend)
+    ))
+    masks = create_engine(df, backend=backend)
+    yield ('global_filter', 'warm', *time_stage(lambda: masks.rows_above('卡片曝光uv', MIN_EXPOSURE), repeat))
+    df_filtered = masks.rows_above('卡片曝光uv', MIN_EXPOSURE)
+
+    # Per-slot filter + top-N: boolean mask + nlargest, and the cached mask/index path
+    def slots_nlargest():
+        for slot in BENCH_SLOTS:
+            subset = df
+            for col, threshold in slot['filters'].items():
+                subset = subset[subset[col] > threshold]
+            metric = slot.get('metric') or next(iter(slot['metrics_config']))
+            subset.nlargest(slot['top_n'], metric)
+    yield ('slot_top_n', 'nlargest', *time_stage(slots_nlargest, repeat))
+
+    def slots_cached(slot_masks):
+        for slot in BENCH_SLOTS:
+            metric = slot.get('metric') or next(iter(slot['metrics_config']))
+            slot_masks.top_n(slot['filters'], metric, slot['top_n'])
+    yield ('slot_top_n', 'mask_cache_cold', *time_stage(slots_cached, repeat, setup=lambda: create_engine(df, backend=backend)))
+    yield ('slot_top_n', 'mask_cache_warm', *time_stage(lambda: slots_cached(masks), repeat))
+
+    # Figures and the HTML report
+    def build_figures():
+        figs = [build_overview_figure(downsample_overview(df_filtered, 200))]
+        figs.extend(build_slot_figure(masks, slot, '#00f2fe') for slot in BENCH_SLOTS)
+        return figs
+    yield ('figures', None, *time_stage(build_figures, repeat))
+    figs = build_figures()
+    summary_text = default_summary(df_filtered)
+    yield ('html_report', 'cdn', *time_stage(
+        lambda: create_html_report(df_filtered, summary_text, figs, plotlyjs='cdn'), repeat
+    ))
+    yield ('html_report', 'inline_compressed', *time_stage(
+        lambda: create_html_report(df_filtered, summary_text, figs, plotlyjs='inline', compress=True), repeat
+    ))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _record_key(record):
+    return record['stage'], record['source'], record['rows'], record.get('backend', 'pandas')
+
+
+def compare(records, baseline_path, threshold, noise_floor=0.005):
+    """Prints current vs baseline per stage; returns the regressed records."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {_record_key(r): r for r in (json.loads(line) for line in f if line.strip())}
+    regressions = []
+    for record in records:
+        base = baseline.get(_record_key(record))
+        if base is None:
+            continue
+        ratio = record['best'] / base['best'] if base['best'] else float('inf')
+        regressed = ratio > threshold and record['best'] - base['best'] > noise_floor
+        if regressed:
+            regressions.append(record)
+        stage = record['stage'] + (f"[{record['source']}]" if record['source'] else '')
+        print(f"{'SLOWER' if regressed else '      '} {stage:<36} {record['rows']:>10,} rows  "
+              f"{base['best']:.4f}s -> {record['best']:.4f}s  x{ratio:.2f}", file=sys.stderr)
+    return regressions
+
+
+def check_speedups(records):
+    """Prints each ``SPEEDUP_TARGETS`` ratio; returns the records that missed theirs."""
+    by_key = {_record_key(r): r for r in records}
+    missed = []
+    for record in records:
+        target = SPEEDUP_TARGETS.get((record['stage'], record['source']))
+        if target is None:
+            continue
+        (stage, source), minimum, min_rows = target
+        reference = by_key.get((stage, source, record['rows'], record.get('backend', 'pandas')))
+        if reference is None or record['rows'] < min_rows or not record['best']:
+            continue
+        speedup = reference['best'] / record['best']
+        if speedup < minimum:
+            missed.append(record)
+        print(f"{'MISSED' if speedup < minimum else '      '} {record['stage']}[{record['source']}]"
+              f" {record['rows']:>10,} rows  x{speedup:.1f} over {source} (target x{minimum:g})", file=sys.stderr)
+    return missed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every dashboard pipeline stage on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="row counts (up to 10,000,000)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage; best and median are reported")
+    parser.add_argument('--excel-rows', type=int, default=50_000, help="largest size to benchmark Excel parsing at")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=BACKENDS, default='pandas', help="query engine for the filter and top-N stages")
+    parser.add_argument('-o', '--output', help="JSON lines file (default: stdout)")
+    parser.add_argument('--compare', help="baseline JSON lines file from an earlier run")
+    parser.add_argument('--threshold', type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    context = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'backend': args.backend,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    records = []
+    try:
+        for rows in args.sizes:
+            for stage, source, best, median in run_size(rows, args.repeat, args.excel_rows, args.seed, args.backend):
+                record = {
+                    'stage': stage, 'source': source, 'rows': rows,
+                    'best': round(best, 6), 'median': round(median, 6), 'repeat': args.repeat,
+                    **context,
+                }
+                records.append(record)
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if args.compare:
+        regressions = compare(records, args.compare, args.threshold)
+        print(f"{len(regressions)} regression(s) over x{args.threshold}", file=sys.stderr)
+        missed = check_speedups(records)
+        if missed:
+            print(f"{len(missed)} speedup target(s) missed", file=sys.stderr)
+        return 1 if regressions or missed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""Plotly figure builders for the dashboard, plus a memoizing figure cache.
+
+plotly is imported by the builders, so importing this module stays cheap
+until the first figure is needed.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from correlation import density_grid, is_heavy_tailed
+
+# Standard chart layout, shared by every figure
+CHART_LAYOUT = dict(
+    template="plotly_dark",
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='rgba(0,0,0,0)',
+    xaxis=dict(
+        showgrid=False,
+        tickangle=-45,  # Rotate labels to prevent squeezing
+        automargin=True,
+        title=None
+    ),
+    yaxis=dict(gridcolor='rgba(255,255,255,0.1)', showgrid=True),
+    legend=dict(orientation="h", y=1.15, x=0.5, xanchor="center", font=dict(size=12)),
+    margin=dict(t=60, b=100, r=50), # Extra margins
+    uniformtext_minsize=8,
+    uniformtext_mode='hide',
+    hovermode="x unified" # Enable unified tooltip for combo charts
+)
+
+OVERVIEW_METRICS = ['卡片曝光uv', '頁面訪問uv', '行動點點擊uv (入口+詳情)']
+
+# Color Palette for combo charts
+COMBO_COLORS = ['#00f2fe', '#fbc2eb', '#4facfe', '#ff9f43', '#a18cd1']
+
+# Simple high contrast colors for single-metric slots, alternating by position
+SLOT_COLORS = ['#00f2fe', '#fbc2eb']
+
+
+def update_chart_layout(fig, title_text=""):
+    fig.update_layout(**CHART_LAYOUT)
+    if title_text:
+        fig.update_layout(title=dict(text=title_text, x=0.5, xanchor='center'))
+    return fig
+
+
+def downsample_overview(df_ov, max_points):
+    """Keeps the top rows by exposure and folds the rest into one averaged "others" row.
+
+    ``df_ov`` must already be sorted by exposure, largest first.
+    """
+    if len(df_ov) <= max_points:
+        return df_ov
+    top, rest = df_ov.iloc[:max_points - 1], df_ov.iloc[max_points - 1:]
+    data = {'title': top['title'].astype(str).tolist() + [f"其他 {len(rest):,} 篇 (平均)"]}
+    for col in OVERVIEW_METRICS:
+        data[col] = np.append(top[col].to_numpy(dtype='float64'), rest[col].mean())
+    return pd.DataFrame(data)
+
+
+def build_overview_figure(df_ov, webgl=False):
+    """Dual-axis overview: exposure bars (left), visits & clicks lines (right).
+
+    ``webgl`` renders the lines as ``Scattergl`` and drops per-point text labels.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig_overview = make_subplots(specs=[[{"secondary_y": True}]])
+    line_trace = go.Scattergl if webgl else go.Scatter
+    line_mode = 'lines+markers' if webgl else 'lines+markers+text'
+
+    # Big Numbers: Exposure (Left Axis, Bar)
+    fig_overview.add_trace(
+        go.Bar(
+            x=df_ov['title'], y=df_ov['卡片曝光uv'], name='Exp. (L)',
+            marker_color='#4facfe', opacity=0.7,
+            text=None if webgl else df_ov['卡片曝光uv'], textposition='outside', texttemplate='<b>%{y:.0f}</b>',
+            textfont=dict(color='white', size=12),
+            offsetgroup=1,
+            hovertemplate="%{y:.0f}" # Simplified for unified view
+        ),
+        secondary_y=False
+    )
+
+    # Smaller Numbers: Visits & Clicks (Right Axis, Lines/Scatter)
+    # Visits
+    fig_overview.add_trace(
+        line_trace(
+            x=df_ov['title'], y=df_ov['頁面訪問uv'], name='Visits (R)',
+            line=dict(color='#a18cd1', width=3), mode=line_mode,
+            text=None if webgl else df_ov['頁面訪問uv'], textposition='top center', texttemplate='<b>%{y:.0f}</b>',
+            textfont=dict(color='white', size=12),
+            hovertemplate="%{y:.0f}"
+        ),
+        secondary_y=True
+    )
+
+    # Clicks
+    fig_overview.add_trace(
+        line_trace(
+            x=df_ov['title'], y=df_ov['行動點點擊uv (入口+詳情)'], name='Clicks (R)',
+            line=dict(color='#ff9f43', width=3), mode=line_mode,
+            text=None if webgl else df_ov['行動點點擊uv (入口+詳情)'], textposition='bottom center', texttemplate='<b>%{y:.0f}</b>',
+            textfont=dict(color='white', size=12),
+            hovertemplate="%{y:.0f}"
+        ),
+        secondary_y=True
+    )
+
+    update_chart_layout(fig_overview)
+
+    # Adjust Axes
+    fig_overview.update_layout(
+        yaxis=dict(title="Exposure", side="left", showgrid=True),
+        yaxis2=dict(title="Visits & Clicks", side="right", overlaying="y", showgrid=False),
+        barmode='group'
+    )
+    return fig_overview
+
+
+def build_generic_figure(top_data, metric, chart_type, chart_color):
+    """Single-metric Bar/Line chart over the top rows."""
+    import plotly.express as px
+
+    is_rate = '率' in metric
+    fmt = '.1%' if is_rate else '.0f'
+
+    if "Bar" in chart_type:
+        fig = px.bar(
+            top_data, x='title', y=metric,
+            text=metric
+        )
+        fig.update_traces(
+            marker_color=chart_color,
+            texttemplate=f'<b>%{{y:{fmt}}}</b>',
+            textposition='outside',
+            cliponaxis=False,
+            textfont=dict(color='white', size=12),
+            hovertemplate=f"%{{y:{fmt}}}<extra></extra>"
+        )
+    else:
+        fig = px.line(
+            top_data, x='title', y=metric,
+            markers=True, text=metric
+        )
+        fig.update_traces(
+            line_color=chart_color,
+            texttemplate=f'<b>%{{y:{fmt}}}</b>',
+            textposition='top center',
+            cliponaxis=False,
+            textfont=dict(color='white', size=12),
+            hovertemplate=f"%{{y:{fmt}}}<extra></extra>"
+        )
+
+    update_chart_layout(fig)
+    return fig
+
+
+def combo_sort_column(metrics_cfg):
+    """Sort by the first Bar chart metric found, else the first metric."""
+    sort_col = list(metrics_cfg.keys())[0]
+    for m, cfg in metrics_cfg.items():
+        if cfg['type'] == 'Bar':
+            sort_col = m
+            break
+    return sort_col
+
+
+def build_combo_figure(top_data, metrics_cfg):
+    """Multi-metric Bar/Line combo on primary and secondary axes."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+
+    # Track Scaling for range adjustment
+    max_l, max_r = 0, 0
+
+    for m_i, (metric_name, m_cfg) in enumerate(metrics_cfg.items()):
+        color = COMBO_COLORS[m_i % len(COMBO_COLORS)]
+        is_sec = (m_cfg['axis'] == "右軸 (副)")
+        is_rate = '率' in metric_name
+        fmt = '.1%' if is_rate else '.0f'
+
+        # Update Max for range
+        current_max = top_data[metric_name].max()
+        if is_sec:
+            max_r = max(max_r, current_max)
+        else:
+            max_l = max(max_l, current_max)
+
+        # Visual adjustments
+        if m_cfg['type'] == 'Bar':
+            fig.add_trace(
+                go.Bar(
+                    x=top_data['title'], y=top_data[metric_name],
+                    name=f"{metric_name} ({'R' if is_sec else 'Main'})",
+                    marker_color=color, opacity=0.8,
+                    text=top_data[metric_name], textposition='outside',
+                    texttemplate=f'<b>%{{y:{fmt}}}</b>',
+                    textfont=dict(color='white', size=12), # Reduced slightly for density
+                    hovertemplate=f"%{{y:{fmt}}}" # Clean for unified
+                ),
+                secondary_y=is_sec
+            )
+        else:
+            fig.add_trace(
+                go.Scatter(
+                    x=top_data['title'], y=top_data[metric_name],
+                    name=f"{metric_name} ({'R' if is_sec else 'Main'})",
+                    mode='lines+markers+text',
+                    line=dict(color=color, width=4),
+                    marker=dict(size=10, line=dict(width=2, color='white')), # Pop markers
+                    text=top_data[metric_name], textposition='top center',
+                    texttemplate=f'<b>%{{y:{fmt}}}</b>',
+                    textfont=dict(color='white', size=12),
+                    hovertemplate=f"%{{y:{fmt}}}"
+                ),
+                secondary_y=is_sec
+            )
+
+    update_chart_layout(fig)
+
+    # Axis Titles & Range Padding (to fit 'outside' text)
+    fig.update_layout(
+        yaxis=dict(title="Main Axis", showgrid=True, range=[0, max_l * 1.25]),
+        yaxis2=dict(title="Secondary Axis", showgrid=False, overlaying='y', side='right', range=[0, max_r * 1.25]),
+        barmode='group',
+        # Unified hover enabled in update_chart_layout
+    )
+    return fig
+
+
+def build_slot_figure(masks, config, chart_color):
+    """Figure for one chart slot config, from the filtered top rows in ``masks`` (a MaskCache)."""
+    if config['type'] == 'generic':
+        metric = config['metric']
+        top_data = masks.top_n(config['filters'], metric, config['top_n'])
+        return build_generic_figure(top_data, metric, config['chart_type'], chart_color)
+    metrics_cfg = config['metrics_config']
+    top_data = masks.top_n(config['filters'], combo_sort_column(metrics_cfg), config['top_n'])
+    return build_combo_figure(top_data, metrics_cfg)
+
+
+# --- Correlation ---
+def build_correlation_figure(matrix, neg_color, pos_color):
+    """Annotated heatmap of a correlation matrix, -1 in ``neg_color`` to +1 in ``pos_color``."""
+    import plotly.graph_objects as go
+
+    labels = list(matrix.columns)
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(), x=labels, y=labels, zmin=-1, zmax=1,
+        colorscale=[[0, neg_color], [0.5, '#111827'], [1, pos_color]],
+        text=matrix.to_numpy(), texttemplate='<b>%{text:.2f}</b>', textfont=dict(color='white', size=12),
+        hovertemplate="%{y} × %{x}: %{z:.3f}<extra></extra>"
+    ))
+    update_chart_layout(fig)
+    fig.update_layout(
+        hovermode='closest',
+        yaxis=dict(autorange='reversed', showgrid=False),
+        margin=dict(t=30, b=100, r=30)
+    )
+    return fig
+
+
+def _log_ticks(edges):
+    """Tick positions (log10(1 + value)) and labels at powers of ten within the bin edges."""
+    powers = [10 ** k for k in range(0, int(np.log10(max(edges[-1], 1))) + 1) if 10 ** k >= edges[0]]
+    return [float(np.log10(1 + p)) for p in powers], [f"{p:,}" for p in powers]
+
+
+def build_pair_figure(frame, x, y, max_points, bins, low_color, high_color):
+    """``y`` against ``x``: a scatter up to ``max_points`` rows, else a binned density heatmap.
+
+    The density is aggregated here, so the browser receives ``bins`` x ``bins``
+    counts instead of one marker per row.
+    """
+    import plotly.graph_objects as go
+
+    if len(frame) <= max_points:
+        fig = go.Figure(go.Scattergl(
+            x=frame[x], y=frame[y], mode='markers',
+            marker=dict(color=high_color, size=7, opacity=0.7, line=dict(width=0)),
+            text=frame['title'] if 'title' in frame.columns else None,
+            hovertemplate="%{text}<br>" + f"{x}: %{{x:,.0f}}<br>{y}: %{{y:.3~f}}<extra></extra>"
+        ))
+        update_chart_layout(fig)
+        fig.update_layout(
+            hovermode='closest',
+            xaxis=dict(title=x, type='log' if is_heavy_tailed(x) else 'linear', tickangle=0),
+            yaxis=dict(title=y, type='log' if is_heavy_tailed(y) else 'linear'),
+        )
+        return fig
+
+    grid = density_grid(frame, x, y, bins)
+    # Drawn on log10(1 + value) when the bins are, labelled in data units
+    x_pos = np.log10(1 + grid.x_edges) if grid.log_x else grid.x_edges
+    y_pos = np.log10(1 + grid.y_edges) if grid.log_y else grid.y_edges
+    x_mid, y_mid = (grid.x_edges[:-1] + grid.x_edges[1:]) / 2, (grid.y_edges[:-1] + grid.y_edges[1:]) / 2
+    fig = go.Figure(go.Heatmap(
+        z=np.where(grid.counts > 0, grid.counts, np.nan), x=x_pos, y=y_pos,
+        colorscale=[[0, low_color], [1, high_color]],
+        customdata=np.dstack(np.meshgrid(x_mid, y_mid)),
+        hovertemplate=f"{x} ≈ %{{customdata[0]:,.3~f}}<br>{y} ≈ %{{customdata[1]:,.3~f}}<br>%{{z:,}} 篇<extra></extra>",
+        colorbar=dict(title="篇數")
+    ))
+    update_chart_layout(fig)
+    fig.update_layout(hovermode='closest', xaxis=dict(title=x, tickangle=0), yaxis=dict(title=y))
+    if grid.log_x:
+        tickvals, ticktext = _log_ticks(grid.x_edges)
+        fig.update_xaxes(tickvals=tickvals, ticktext=ticktext)
+    if grid.log_y:
+        tickvals, ticktext = _log_ticks(grid.y_edges)
+        fig.update_yaxes(tickvals=tickvals, ticktext=ticktext)
+    return fig
+
+
+# --- Figure Cache ---
+def figure_key(*parts):
+    """Stable key from the dataset fingerprint, chart config and layout settings."""
+    payload = json.dumps([CHART_LAYOUT, *parts], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class FigureCache:
+    """Bounded LRU of built figures. Cached figures are shared: do not mutate them."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        fig = self._entries.get(key)
+        if fig is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return fig
+        self.misses += 1
+        fig = build()
+        self._entries[key] = fig
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return fig
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,123 @@
+"""Vectorized coercion of sheet cells (counts, percents, decorated numbers) to floats."""
+from dataclasses import dataclass, field, asdict
+
+import numpy as np
+import pandas as pd
+
+# Thousands separators, whitespace, trend arrows and percent signs ("1,234 ↑", "12.5% ▼")
+_NOISE_PATTERN = r"[,，\s←-⇿▲-▽⬆⬇%％]"
+_NUMBER_PATTERN = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+# Full-width forms typed with a CJK input method ("５０％", "１，２３４") to their ASCII counterparts
+_FULL_WIDTH = {**{c: c - 0xFEE0 for c in range(0xFF01, 0xFF5F)}, 0x3000: ord(' ')}
+_FULL_WIDTH_PATTERN = "[\uff01-\uff5e\u3000]"
+BLANK_TOKENS = ['', '-', '--', 'n/a', 'na', 'nan', 'null', 'none']
+MAX_FAILED_EXAMPLES = 5
+
+# Per-cell outcome, as counted in a CoercionReport
+NUMERIC, COERCED, BLANK, FAILED = range(4)
+
+
+@dataclass
+class CoercionReport:
+    column: str
+    total: int = 0
+    numeric: int = 0   # already numeric, passed through untouched
+    coerced: int = 0   # parsed after stripping separators / arrows / percent
+    blank: int = 0     # empty cells, kept as NaN
+    failed: int = 0    # unparseable cells, kept as NaN
+    failed_examples: list = field(default_factory=list)
+
+    def as_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_statuses(cls, column, statuses, failed_examples=()):
+        """Report of a column from the status code of each of its cells."""
+        numeric, coerced, blank, failed = np.bincount(statuses, minlength=4).tolist()
+        return cls(column=column, total=len(statuses), numeric=numeric, coerced=coerced, blank=blank,
+                   failed=failed, failed_examples=list(failed_examples)[:MAX_FAILED_EXAMPLES])
+
+
+def coerce_numeric(series):
+    """Converts a raw column to float64 without raising on malformed cells.
+
+    Cells containing ``%`` are scaled by 1/100; bare numbers are kept as they
+    are, so a rate column may mix ``"12.5%"`` and ``0.125``. Full-width
+    digits and signs (``"５０％"``) read as their ASCII forms. Returns
+    ``(values, report)``.
+    """
+    values, report, _ = coerce_cells(series)
+    return values, report
+
+
+def coerce_cells(series):
+    """``coerce_numeric`` plus the status of every cell (``NUMERIC`` ... ``FAILED``, int8).
+
+    Statuses let a report be recomputed when rows are replaced (see
+    ``incremental``). Returns ``(values, report, statuses)``.
+    """
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.astype('float64')
+        statuses = np.where(values.isna().to_numpy(), BLANK, NUMERIC).astype('int8')
+        return values, CoercionReport.from_statuses(str(series.name), statuses), statuses
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # Each distinct cell is parsed once: counts and rates repeat a lot, so one
+    # Arrow hash of the column plus a gather beats any per-cell string kernel
+    text = pa.array(series.astype('string').array)
+    if isinstance(text, pa.ChunkedArray):
+        text = text.combine_chunks()
+    encoded = pc.dictionary_encode(text)
+    codes = encoded.indices.fill_null(-1).to_numpy() if encoded.null_count else encoded.indices.to_numpy()
+    uniques = encoded.dictionary
+    values, valid, blank, untouched = _parse_strings(uniques)
+    failed = ~valid & ~blank
+    # Code -1 (missing cell) picks the trailing blank slot appended here
+    statuses = np.append(np.select([failed, blank, untouched], [FAILED, BLANK, NUMERIC], COERCED), BLANK)
+    statuses = statuses.astype('int8')[codes]
+    values = np.append(values, np.nan)[codes]
+    # Distinct failing cells, in order of first appearance
+    examples = uniques.filter(failed)[:MAX_FAILED_EXAMPLES].to_pylist()
+    report = CoercionReport.from_statuses(str(series.name), statuses, examples)
+
+    return pd.Series(values, index=series.index, name=series.name), report, statuses
+
+
+def _parse_strings(text):
+    """``(values, valid, blank, untouched)`` of an Arrow string array, in whole-array Arrow kernels."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    is_pct = pc.or_(pc.match_substring(text, '%'), pc.match_substring(text, '％'))
+    # Common case first: literal replaces, then a straight cast
+    cleaned = pc.replace_substring(pc.replace_substring(text, ',', ''), '%', '')
+    try:
+        values = pc.cast(cleaned, pa.float64())
+    except pa.ArrowInvalid:
+        # Decorated or malformed cells: only cells that are not plain numbers yet get the noise regex
+        number = f"^{_NUMBER_PATTERN}$"
+        ok = pc.match_substring_regex(cleaned, number).fill_null(False)
+        if not pc.all(ok).as_py():
+            noisy = pc.replace_substring_regex(cleaned.filter(pc.invert(ok)), _NOISE_PATTERN, '')
+            full_width = pc.match_substring_regex(noisy, _FULL_WIDTH_PATTERN).fill_null(False)
+            if pc.any(full_width).as_py():
+                translated = pa.array([cell.translate(_FULL_WIDTH) for cell in noisy.filter(full_width).to_pylist()],
+                                      type=noisy.type)
+                noisy = pc.replace_with_mask(noisy, full_width, pc.replace_substring_regex(translated, _NOISE_PATTERN, ''))
+            cleaned = pc.replace_with_mask(cleaned, pc.invert(ok), noisy)
+            ok = pc.match_substring_regex(cleaned, number).fill_null(False)
+        values = pc.cast(pc.if_else(ok, cleaned, pa.scalar(None, cleaned.type)), pa.float64())
+
+    values = values.to_numpy(zero_copy_only=False).copy()
+    is_pct = is_pct.fill_null(False).to_numpy(zero_copy_only=False)
+    values[is_pct] /= 100
+    valid = ~np.isnan(values)
+    if valid.all():
+        blank = np.zeros(len(text), dtype=bool)
+    else:
+        blank = pc.or_(pc.is_null(text), pc.is_in(pc.utf8_lower(cleaned), pa.array(BLANK_TOKENS))).fill_null(True)
+        blank = ~valid & blank.to_numpy(zero_copy_only=False)
+    untouched = pc.equal(text, cleaned).fill_null(False).to_numpy(zero_copy_only=False)
+    return values, valid, blank, untouched
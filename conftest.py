@@ -0,0 +1,28 @@
+"""Shared pytest fixtures; being at the repository root, it also puts the app's modules on ``sys.path``."""
+import pandas as pd
+import pytest
+
+RAW_COLUMNS = ['dt', 'title', '卡片曝光uv', '頁面訪問uv', '文章訪問率', '行動點點擊uv (入口+詳情)', '功能轉化率']
+
+
+def raw_rows(rows):
+    """Raw frame, as a sheet export reads, from ``(dt, title, exposure, visits, clicks)`` tuples."""
+    return pd.DataFrame(
+        [
+            (dt, title, f"{exposure:,}", f"{visits:,}", f"{visits / exposure:.2%}", str(clicks), f"{clicks / visits:.2%}")
+            for dt, title, exposure, visits, clicks in rows
+        ],
+        columns=RAW_COLUMNS,
+    )
+
+
+@pytest.fixture
+def raw_frame():
+    """Three titles over three days; 'b' has one row, so its totals keep the compact dtypes."""
+    return raw_rows([
+        ('2026-01-01', 'a', 1_000, 100, 10),
+        ('2026-01-02', 'a', 2_000, 150, 30),
+        ('2026-01-02', 'b', 500, 50, 5),
+        ('2026-01-03', 'c', 40_000, 4_000, 400),
+        ('2026-01-03', 'a', 3_000, 200, 20),
+    ])
@@ -0,0 +1,262 @@
+"""Streamlit-free analysis core: load, clean, filter, aggregate and chart a dataset.
+
+Everything the dashboard computes is importable from here without running
+the app, and the app itself goes through it: sources (Excel, Google Sheets,
+pasted text, files) are fingerprinted and parsed by the ``*_source``
+functions, and ``Analysis`` builds the filtered views and chart figures.
+Heavy dependencies are loaded on first use only: plotly when a figure or
+report is built, openpyxl when a workbook is read. Importing this module
+costs little more than pandas (which itself loads pyarrow for its string
+columns).
+
+``python core.py`` checks the cold import time against ``IMPORT_BUDGET_SECONDS``.
+"""
+import io
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Callable
+
+import pandas as pd
+
+from backends import create_engine
+from charts import SLOT_COLORS, build_overview_figure, build_slot_figure, downsample_overview
+from correlation import correlate
+from excel_reader import read_excel_sheets
+from ingest_cache import source_key
+from normalize import COUNT_COLS, normalize_frame
+from paste_reader import read_pasted
+from rollups import RollupEngine, weighted_metrics
+from sheets_fetch import SheetFetcher
+
+# Cold `import core` in a fresh interpreter; pandas alone is ~0.6s of it
+IMPORT_BUDGET_SECONDS = 1.0
+LAZY_MODULES = ('streamlit', 'plotly', 'openpyxl', 'matplotlib', 'duckdb', 'polars')
+
+SHEET_URL_PREFIX = 'https://docs.google.com/spreadsheets/'
+
+
+# --- Sources ---
+@dataclass
+class Source:
+    """A raw data source, fingerprinted before it is parsed.
+
+    ``key`` identifies the content, so a cleaned frame cached under it
+    skips the parse entirely. ``read(progress)`` parses it into a raw frame;
+    ``progress(fraction, rows_read)`` is only called by Excel sources.
+    """
+    kind: str            # 'excel', 'gsheet', 'paste' or 'file'
+    key: str             # ``ingest_cache.source_key`` of the content
+    input_bytes: int
+    reader: Callable
+    stale: bool = False  # Sheets export served from the HTTP cache while it refreshes
+
+    def read(self, progress=None):
+        return self.reader(progress)
+
+
+def excel_source(data, sheets=None):
+    """Uploaded workbook bytes; ``sheets`` are merged in order (default: the first sheet)."""
+    sheets = list(sheets or [])
+    # Streams only the matched columns, chunk by chunk
+    return Source('excel', source_key('excel', data, *sheets), len(data),
+                  lambda progress: read_excel_sheets(io.BytesIO(data), sheets, progress=progress))
+
+
+def paste_source(text):
+    """Text pasted from a spreadsheet; the delimiter and header are sniffed from the first lines."""
+    return Source('paste', source_key('paste', text), len(text), lambda progress: read_pasted(text))
+
+
+def sheet_ids(url):
+    """``(spreadsheet_id, gid)`` of a Google Sheets link (``gid`` ``None`` without a tab); ``None`` if it has no ``/d/<id>``."""
+    match_id = re.search(r"/d/([a-zA-Z0-9-_]+)", url)
+    if not match_id:
+        return None
+    match_gid = re.search(r"[#&]gid=([0-9]+)", url)
+    return match_id.group(1), match_gid.group(1) if match_gid else None
+
+
+def sheet_export_url(url):
+    """CSV export URL of a Google Sheets link (``/edit`` to ``/export``), keeping its tab; ``None`` if unrecognized."""
+    ids = sheet_ids(url)
+    if ids is None:
+        return None
+    spreadsheet_id, gid = ids
+    export_url = f"{SHEET_URL_PREFIX}d/{spreadsheet_id}/export?format=csv"
+    return f"{export_url}&gid={gid}" if gid else export_url
+
+
+def sheet_source(url, fetcher=None, force=False):
+    """A Google Sheets link, fetched through ``fetcher`` (default: a ``SheetFetcher`` on the shared disk cache).
+
+    The export is served from the local HTTP cache when fresh enough;
+    unchanged content keeps the same key. ``force`` revalidates it now.
+    """
+    export_url = sheet_export_url(url)
+    if export_url is None:
+        raise ValueError(f"Not a Google Sheets link (no /d/<id>): {url}")
+    fetched = (fetcher or SheetFetcher()).fetch(export_url, force=force)
+    return Source('gsheet', source_key('gsheet', export_url, fetched.digest), len(fetched.content),
+                  lambda progress: pd.read_csv(io.BytesIO(fetched.content)), stale=fetched.stale)
+
+
+def is_sheet_url(path):
+    return path.startswith(SHEET_URL_PREFIX)
+
+
+def file_source(path, sheets=None, fetcher=None):
+    """An Excel workbook, a CSV/TSV file (delimiter sniffed like pasted data) or a Google Sheets link."""
+    if is_sheet_url(path):
+        return sheet_source(path, fetcher)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm', '.xls'):
+        with open(path, 'rb') as f:
+            return excel_source(f.read(), sheets)
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        text = f.read()
+    return Source('file', source_key('file', text), len(text), lambda progress: read_pasted(text))
+
+
+def load_path(path, sheets=None, fetcher=None):
+    """Raw frame of ``file_source(path)``."""
+    return file_source(path, sheets, fetcher).read()
+
+
+def load_dataset(path, sheets=None, fetcher=None):
+    """Cleaned, typed frame for a file or Sheets link, as the dashboard works on it."""
+    return normalize_frame(load_path(path, sheets, fetcher))
+
+
+# --- Analysis ---
+class Analysis:
+    """One dataset with its time rollups and a query engine over the per-title table.
+
+    Like the dashboard, filters and charts work on one row per title (counts
+    summed over every ``dt`` row). ``backend`` names the engine (see
+    ``backends``); default: ``DATA_ANALYZER_BACKEND``, else pandas. The
+    dashboard keeps one per session and draws every chart through it.
+    """
+
+    def __init__(self, df, key=None, backend=None):
+        self.df = df
+        self.key = key
+        self.backend = backend
+        self.rollups = RollupEngine(df, key=key)
+        self.masks = create_engine(self.rollups.titles(), key=key, backend=backend)
+        self._period = None        # ((granularity, start, end), engine) of the last period range
+        self._correlations = None  # (min_exposure, Correlations) of the last global filter
+
+    @property
+    def titles(self):
+        return self.rollups.titles()
+
+    @property
+    def sketches(self):
+        """Quantile sketches of the per-title metrics (built once per dataset)."""
+        return self.rollups.sketches()
+
+    def apply_delta(self, df, key, delta, previous):
+        """Moves the analysis to ``df`` after an incremental append.
+
+        The rollups are patched (see ``RollupEngine.apply_delta``) and so are
+        the masks and sort indexes of the per-title engine: only the titles
+        the append touched are re-evaluated.
+        """
+        self.df, self.key = df, key
+        title_delta = self.rollups.apply_delta(df, key, delta, previous)
+        self.masks.apply_delta(self.rollups.titles(), key, title_delta)
+        self._period = self._correlations = None
+
+    def above_exposure(self, min_exposure):
+        """Global filter: titles with total exposure above ``min_exposure``, largest first."""
+        return self.masks.rows_above('卡片曝光uv', min_exposure)
+
+    def card_metrics(self, min_exposure):
+        """Means per title above ``min_exposure``; rates as ratios of the summed counts."""
+        return weighted_metrics(self.masks.means(COUNT_COLS, {'卡片曝光uv': min_exposure}))
+
+    def period(self, granularity, start=None, end=None):
+        """Query engine and sketches over the per-title totals of ``[start, end]`` periods.
+
+        The engine of the last range asked for is kept, so reruns on the same
+        range reuse its masks and indexes.
+        """
+        period_key = (granularity, start, end)
+        if self._period is None or self._period[0] != period_key:
+            table = self.rollups.by_title(granularity, start, end)
+            self._period = (period_key, create_engine(table, key=(self.key, period_key), backend=self.backend))
+        return self._period[1], self.rollups.sketches(granularity, start, end)
+
+    def correlations(self, df_filtered, min_exposure):
+        """Pearson and rank matrices of ``df_filtered`` (``above_exposure(min_exposure)``), kept for the last filter."""
+        if self._correlations is None or self._correlations[0] != min_exposure:
+            self._correlations = (min_exposure, correlate(df_filtered))
+        return self._correlations[1]
+
+    def overview_figure(self, df_filtered, max_points, webgl_rows):
+        """Overview of ``df_filtered``: the top ``max_points`` titles, WebGL past ``webgl_rows`` of them."""
+        df_ov = downsample_overview(df_filtered, max_points)
+        return build_overview_figure(df_ov, webgl=len(df_ov) > webgl_rows)
+
+    def empty_slot(self, config, masks=None):
+        """Why chart slot ``config`` has nothing to draw: ``'no_rows'``, ``'no_metrics'`` or ``None``.
+
+        ``'no_rows'`` when no title passes its filters, ``'no_metrics'`` for
+        a combo without metrics. ``masks`` defaults to every title.
+        """
+        masks = self.masks if masks is None else masks
+        if masks.count(config['filters']) == 0:
+            return 'no_rows'
+        if config['type'] == 'custom_combo' and not config.get('metrics_config'):
+            return 'no_metrics'
+        return None
+
+    def slot_figure(self, config, masks=None, position=0):
+        """Figure of one chart slot over ``masks``, or ``None`` when ``empty_slot``.
+
+        Single-metric slots alternate ``SLOT_COLORS`` by ``position``.
+        """
+        masks = self.masks if masks is None else masks
+        if self.empty_slot(config, masks):
+            return None
+        return build_slot_figure(masks, config, SLOT_COLORS[position % 2])
+
+    def slot_figures(self, chart_configs, df_filtered=None, overview=None):
+        """Overview (when ``overview`` settings are given) plus one figure per chart slot.
+
+        Slots with nothing to draw are skipped, like on the dashboard.
+        """
+        figs = []
+        if overview and df_filtered is not None:
+            figs.append(self.overview_figure(df_filtered, overview['max_points'], overview['webgl_rows']))
+        for idx, config in enumerate(chart_configs):
+            fig = self.slot_figure(config, position=idx)
+            if fig is not None:
+                figs.append(fig)
+        return figs
+
+
+def measure_import_seconds(module='core', runs=3):
+    """Best-of-``runs`` import time of ``module`` in a fresh interpreter, and the lazy modules it loaded."""
+    code = (
+        "import sys, time; t = time.perf_counter(); import {m}; t = time.perf_counter() - t; "
+        "print(t); print(','.join(sorted({{n.split('.')[0] for n in sys.modules}} & set({lazy!r}))))"
+    ).format(m=module, lazy=LAZY_MODULES)
+    here = os.path.dirname(os.path.abspath(__file__))
+    best, loaded = None, ''
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True, check=True).stdout.split('\n')
+        seconds, loaded = float(out[0]), out[1]
+        best = seconds if best is None else min(best, seconds)
+    return best, [m for m in loaded.split(',') if m]
+
+
+if __name__ == '__main__':
+    seconds, loaded = measure_import_seconds()
+    print(f"import core: {seconds:.3f}s (budget {IMPORT_BUDGET_SECONDS:.1f}s)")
+    if loaded:
+        print(f"eagerly imported: {', '.join(loaded)}")
+    sys.exit(0 if seconds <= IMPORT_BUDGET_SECONDS and not loaded else 1)
@@ -0,0 +1,107 @@
+"""Correlations between the metric columns, in vectorized passes that scale to millions of rows.
+
+``correlate`` computes the Pearson and rank (Spearman) matrices of every
+metric pair at once: rows missing any metric are dropped, the columns are
+centered in one float64 block and each matrix is a single matrix product.
+Ranks come from one argsort per column, ties averaged.
+
+``density_grid`` bins an x/y pair into a 2D histogram, so large scatters are
+drawn as a grid of counts instead of one marker per row.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from normalize import COUNT_COLS, RATE_COLS
+
+METRIC_COLS = COUNT_COLS + RATE_COLS
+
+
+@dataclass
+class Correlations:
+    pearson: pd.DataFrame
+    spearman: pd.DataFrame
+    rows: int          # rows with every metric present
+
+
+@dataclass
+class DensityGrid:
+    counts: np.ndarray   # (y bins, x bins)
+    x_edges: np.ndarray  # bin edges in data units
+    y_edges: np.ndarray
+    log_x: bool          # bins are even in log10(1 + value)
+    log_y: bool
+    rows: int
+
+
+def _corr_of_columns(block):
+    """Pearson matrix of the columns of a float64 block, centered in place."""
+    block -= block.mean(axis=0)
+    cov = block.T @ block
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(std, std)
+    # Constant columns correlate with nothing
+    corr[~np.isfinite(corr)] = np.nan
+    np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+    return np.clip(corr, -1.0, 1.0)
+
+
+def average_ranks(values):
+    """1-based ranks of a 1-D array, tied values sharing their average rank."""
+    order = np.argsort(values)
+    ordered = values[order]
+    # Start and end of each run of equal values
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    ranks = np.empty(len(values))
+    ranks[order] = np.repeat((starts + ends + 1) / 2, ends - starts)
+    return ranks
+
+
+def correlate(frame, columns=None):
+    """Pearson and Spearman matrices of ``columns`` (default: every metric present)."""
+    columns = [c for c in (columns or METRIC_COLS) if c in frame.columns]
+    block = frame[columns].to_numpy(dtype='float64', na_value=np.nan)
+    complete = np.isfinite(block).all(axis=1)
+    if not complete.all():
+        block = block[complete]
+    block = np.asfortranarray(block)  # Each column contiguous for the per-column sorts
+    if len(block) < 2:
+        empty = pd.DataFrame(np.nan, index=columns, columns=columns)
+        return Correlations(empty, empty.copy(), len(block))
+    ranks = np.column_stack([average_ranks(block[:, i]) for i in range(len(columns))])
+    return Correlations(
+        pd.DataFrame(_corr_of_columns(block), index=columns, columns=columns),
+        pd.DataFrame(_corr_of_columns(ranks), index=columns, columns=columns),
+        len(block),
+    )
+
+
+def is_heavy_tailed(column):
+    """Counts span orders of magnitude and are binned on a log scale; rates are not."""
+    return column not in RATE_COLS
+
+
+def density_grid(frame, x, y, bins=60):
+    """2D histogram of columns ``x`` and ``y`` over the rows where both are present."""
+    xs = frame[x].to_numpy(dtype='float64', na_value=np.nan)
+    ys = frame[y].to_numpy(dtype='float64', na_value=np.nan)
+    log_x, log_y = is_heavy_tailed(x), is_heavy_tailed(y)
+    present = np.isfinite(xs) & np.isfinite(ys)
+    if log_x:
+        present &= xs >= 0
+    if log_y:
+        present &= ys >= 0
+    xs, ys = xs[present], ys[present]
+    if log_x:
+        xs = np.log10(1 + xs)
+    if log_y:
+        ys = np.log10(1 + ys)
+    counts, y_edges, x_edges = np.histogram2d(ys, xs, bins=bins)  # Rows are y
+    if log_x:
+        x_edges = 10 ** x_edges - 1
+    if log_y:
+        y_edges = 10 ** y_edges - 1
+    return DensityGrid(counts.astype('int64'), x_edges, y_edges, log_x, log_y, len(xs))
@@ -0,0 +1,98 @@
+"""Per-rerun instrumentation: stage timings, row counts, frame sizes and peak memory.
+
+``RerunTrace`` records one dashboard rerun. When diagnostics are off the app
+uses ``NULL_TRACE``, whose stages are no-op context managers, so the
+instrumented code paths cost next to nothing.
+"""
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# When set, every traced rerun is appended to this file as JSON lines
+TRACE_LOG_ENV = 'DATA_ANALYZER_TRACE_LOG'
+
+
+def max_rss_bytes():
+    """Peak resident memory of the process so far, where the platform reports it."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if os.uname().sysname == 'Darwin' else rss * 1024  # Linux reports KiB
+
+
+class RerunTrace:
+    """Stages of one rerun, in the order they ran.
+
+    ``track_memory`` also records each stage's peak Python/numpy allocation
+    with ``tracemalloc``; that slows allocation-heavy stages noticeably and
+    is process-wide, so keep it for debugging sessions.
+    """
+
+    enabled = True
+
+    def __init__(self, rerun_id=None, track_memory=False, **context):
+        self.rerun_id = rerun_id
+        self.context = context
+        self.started_at = time.time()
+        self.stages = []
+        self.total_seconds = None  # Set, with max_rss_bytes, by finish()
+        self.max_rss_bytes = None
+        self.track_memory = track_memory
+        self._owns_tracing = track_memory and not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        """Times the block; the yielded dict takes extra fields such as ``rows`` or ``bytes``."""
+        record = {'stage': name, **fields}
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.track_memory:
+                record['peak_bytes'] = tracemalloc.get_traced_memory()[1] - baseline
+            self.stages.append(record)
+
+    def finish(self):
+        if self.total_seconds is None:
+            self.total_seconds = time.perf_counter() - self._start
+            self.max_rss_bytes = max_rss_bytes()
+            if self._owns_tracing:
+                tracemalloc.stop()
+        return self
+
+    def records(self):
+        """One flat record per stage, tagged with the rerun, for log pipelines."""
+        base = {'rerun': self.rerun_id, 'timestamp': self.started_at, **self.context}
+        records = [{**base, **stage} for stage in self.stages]
+        records.append({**base, 'stage': 'total', 'seconds': self.total_seconds, 'max_rss_bytes': self.max_rss_bytes})
+        return records
+
+    def to_json_lines(self):
+        return ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in self.records())
+
+
+class _NullTrace:
+    enabled = False
+
+    def stage(self, name, **fields):
+        return contextlib.nullcontext({})
+
+    def finish(self):
+        return self
+
+
+NULL_TRACE = _NullTrace()
@@ -0,0 +1,118 @@
+"""Low-memory Excel ingestion: streams rows and keeps only the columns we use.
+
+.xlsx workbooks are read with openpyxl in read-only mode, which parses the
+sheet XML as a stream instead of building the whole workbook in memory.
+Rows are buffered in chunks and turned into typed frames as they arrive.
+Legacy .xls files fall back to ``pd.read_excel``.
+"""
+import zipfile
+from operator import itemgetter
+
+import pandas as pd
+
+from normalize import COL_KEYWORD_MAP, MissingColumnsError
+
+CHUNK_ROWS = 50_000
+
+
+def _is_xlsx(source):
+    is_zip = zipfile.is_zipfile(source)
+    source.seek(0)
+    return is_zip
+
+
+def list_sheets(source):
+    if not _is_xlsx(source):
+        return pd.ExcelFile(source).sheet_names
+    from openpyxl import load_workbook
+    wb = load_workbook(source, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+        source.seek(0)
+
+
+def match_header(header):
+    """Positions of the first header cell matching each keyword in ``COL_KEYWORD_MAP``.
+
+    Returns ``{standard_col: position}`` in sheet order; raises
+    ``MissingColumnsError`` when a keyword has no match.
+    """
+    header = ['' if h is None else str(h).strip() for h in header]
+    matched, missing = {}, []
+    for standard_col, keyword in COL_KEYWORD_MAP.items():
+        pos = next((i for i, col in enumerate(header) if keyword.lower() in col.lower()), None)
+        if pos is None:
+            missing.append(f"{standard_col} (keyword: {keyword})")
+        else:
+            matched[standard_col] = pos
+    if missing:
+        raise MissingColumnsError(missing, header)
+    return dict(sorted(matched.items(), key=lambda item: item[1]))
+
+
+def read_excel_sheets(source, sheet_names=None, chunk_rows=CHUNK_ROWS, progress=None):
+    """Reads the selected sheets (default: the first) into one frame.
+
+    Only the matched columns are kept, already renamed to their standard
+    names. ``progress(fraction, rows_read)`` is called after every chunk;
+    ``fraction`` is ``None`` when the sheet does not declare its size.
+    """
+    if not _is_xlsx(source):
+        frames = pd.read_excel(source, sheet_name=sheet_names or 0)
+        return pd.concat(frames.values(), ignore_index=True) if isinstance(frames, dict) else frames
+
+    from openpyxl import load_workbook
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        names = sheet_names or wb.sheetnames[:1]
+        frames = []
+        for sheet_idx, name in enumerate(names):
+            frames.extend(_read_sheet(wb[name], chunk_rows, progress, sheet_idx, len(names)))
+    finally:
+        wb.close()
+
+    if not frames:
+        return pd.DataFrame(columns=list(COL_KEYWORD_MAP))
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def _read_sheet(ws, chunk_rows, progress, sheet_idx, n_sheets):
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return []
+    columns = match_header(header)
+    width = max(columns.values()) + 1
+    pick = itemgetter(*columns.values())
+    total_rows = ws.max_row  # from the sheet's dimension tag; may be missing
+
+    chunks, buffer, rows_read = [], [], 0
+    for row in rows:
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        values = pick(row)
+        # Formatting often extends sheets with fully empty rows
+        if all(v is None for v in values):
+            continue
+        buffer.append(values)
+        if len(buffer) >= chunk_rows:
+            chunks.append(pd.DataFrame.from_records(buffer, columns=list(columns)))
+            rows_read += len(buffer)
+            buffer = []
+            _report(progress, rows_read, total_rows, sheet_idx, n_sheets)
+    if buffer:
+        chunks.append(pd.DataFrame.from_records(buffer, columns=list(columns)))
+        rows_read += len(buffer)
+    _report(progress, rows_read, rows_read + 1, sheet_idx, n_sheets)
+    return chunks
+
+
+def _report(progress, rows_read, total_rows, sheet_idx, n_sheets):
+    if progress is None:
+        return
+    fraction = None
+    if total_rows:
+        fraction = (sheet_idx + min(rows_read / max(total_rows - 1, 1), 1.0)) / n_sheets
+    progress(fraction, rows_read)
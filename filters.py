@@ -0,0 +1,226 @@
+"""Threshold filters and top-N queries over one dataset.
+
+Masks are cached per (column, threshold) and each metric gets a presorted
+index, so top-N walks the sorted order and "> threshold" becomes a binary
+search plus a slice.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_ENTRIES = 64  # per kind; slider drags only ever touch a few thresholds at a time
+
+
+def column_threshold(dtype, threshold):
+    """``threshold`` as ``column > threshold`` sees it: rounded to a float column's precision.
+
+    pandas compares a float32 column against float32(threshold), so the
+    presorted float64 indexes (and other engines) must use the same value.
+    """
+    if pd.api.types.is_float_dtype(dtype):
+        return np.asarray(threshold, dtype=dtype).astype('float64')
+    return np.asarray(threshold, dtype='float64')
+
+
+class SortIndex:
+    """Row positions of one column in descending order (ties by position, NaN last)."""
+
+    def __init__(self, values, order=None):
+        values = np.asarray(values, dtype='float64')
+        self.order = np.argsort(-values, kind='stable') if order is None else order
+        self.n_valid = int(np.count_nonzero(~np.isnan(values)))
+        self.ascending = np.ascontiguousarray(values[self.order[:self.n_valid]][::-1])
+        self.order.flags.writeable = False
+
+    def updated(self, values, touched, positions=None):
+        """Index for ``values`` where only the ``touched`` positions changed or are new.
+
+        ``positions`` maps each old row to its new position (ascending, so
+        rows may be inserted between them); by default rows keep their
+        positions and new ones are appended. Merges the re-sorted touched
+        rows into the existing order in linear time instead of sorting
+        everything again; the result is identical.
+        """
+        values = np.asarray(values, dtype='float64')
+        stale = np.zeros(len(values), dtype=bool)
+        stale[touched] = True
+        kept = self.order if positions is None else positions[self.order]
+        kept = kept[~stale[kept]]
+        kept_keys = -values[kept]
+
+        touched = np.sort(touched)
+        moved = touched[np.argsort(-values[touched], kind='stable')]
+        moved_keys = -values[moved]
+        slots = np.searchsorted(kept_keys, moved_keys, side='left')
+        tie_end = np.searchsorted(kept_keys, moved_keys, side='right')
+        # Equal values stay ordered by position, as in a full stable sort. Rows
+        # past every tied position (appended rows) go straight to the end.
+        tied = np.flatnonzero(tie_end > slots)
+        after = moved[tied] > kept[tie_end[tied] - 1]
+        slots[tied[after]] = tie_end[tied[after]]
+        for i in tied[~after]:
+            slots[i] += np.searchsorted(kept[slots[i]:tie_end[i]], moved[i])
+        return SortIndex(values, order=np.insert(kept, slots, moved))
+
+    def count_above(self, threshold):
+        """Rows with ``value > threshold``; accepts an array of thresholds too."""
+        return self.n_valid - np.searchsorted(self.ascending, threshold, side='right')
+
+    def above(self, threshold):
+        """Positions with ``value > threshold``, largest first."""
+        return self.order[:self.count_above(threshold)]
+
+    def top(self, n, mask=None):
+        """First ``n`` positions in sorted order, optionally only where ``mask`` holds.
+
+        Same rows and order as ``nlargest(n, keep='first')`` on the masked frame.
+        """
+        order = self.order[:self.n_valid]
+        if mask is None:
+            return order[:n]
+        found, need, start, chunk = [], n, 0, max(4 * n, 1024)
+        while need > 0 and start < len(order):
+            block = order[start:start + chunk]
+            hits = block[mask[block]][:need]
+            found.append(hits)
+            need -= len(hits)
+            start += chunk
+            chunk *= 2
+        return np.concatenate(found) if found else order[:0]
+
+
+class MaskCache:
+    """Caches ``column > threshold`` masks, their AND-combinations and sort indexes.
+
+    Bound to a single dataset: build a new one when the data changes, or
+    ``apply_delta`` when only some rows did (an incremental append). This is
+    the ``pandas`` query engine; ``backends`` has the others.
+    """
+
+    backend = 'pandas'
+
+    def __init__(self, df, key=None):
+        self.df = df
+        self.key = key
+        self._masks = {}     # (column, threshold) -> bool ndarray
+        self._combined = {}  # frozenset of filters -> (bool ndarray, row count)
+        self._indexes = {}   # column -> SortIndex
+        self.hits = 0
+        self.misses = 0
+
+    def sort_index(self, column):
+        index = self._indexes.get(column)
+        if index is None:
+            index = self._indexes[column] = SortIndex(self.df[column].to_numpy(dtype='float64', na_value=np.nan))
+        return index
+
+    def mask(self, column, threshold):
+        cache_key = (column, float(threshold))
+        mask = self._masks.get(cache_key)
+        if mask is None:
+            self.misses += 1
+            mask = (self.df[column] > threshold).to_numpy()
+            mask.flags.writeable = False
+            _bounded_put(self._masks, cache_key, mask)
+        else:
+            self.hits += 1
+        return mask
+
+    def apply_delta(self, df, key, delta):
+        """Moves the cache to ``df``, the old frame with only ``delta.touched`` rows changed or new.
+
+        ``delta.positions`` is the new position of each old row.
+        """
+        touched, positions = delta.touched, delta.positions
+        self.df, self.key = df, key
+        for column, index in list(self._indexes.items()):
+            values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+            self._indexes[column] = index.updated(values, touched, positions)
+        for (column, threshold), mask in list(self._masks.items()):
+            values = df[column].to_numpy()
+            patched = np.zeros(len(df), dtype=bool)
+            patched[positions] = mask
+            patched[touched] = values[touched] > threshold
+            patched.flags.writeable = False
+            self._masks[(column, threshold)] = patched
+        # AND-combinations are rebuilt from the updated masks on demand
+        self._combined.clear()
+
+    @property
+    def filter_columns(self):
+        """Columns a ``column > threshold`` filter applies to: the numeric ones."""
+        return [c for c in self.df.columns if pd.api.types.is_numeric_dtype(self.df[c])]
+
+    def combined(self, filters):
+        """``(mask, count)`` for every ``column > threshold`` filter (AND logic).
+
+        Filters on columns that are missing or not numeric are skipped; the
+        mask is ``None`` when no filter applies.
+        """
+        numeric = self.filter_columns
+        filters = {c: v for c, v in filters.items() if c in numeric}
+        if not filters:
+            return None, len(self.df)
+        if len(filters) == 1:
+            (column, threshold), = filters.items()
+            return self.mask(column, threshold), int(self.count_above(column, threshold))
+        cache_key = frozenset((c, float(v)) for c, v in filters.items())
+        entry = self._combined.get(cache_key)
+        if entry is None:
+            mask = np.ones(len(self.df), dtype=bool)
+            for column, threshold in filters.items():
+                mask &= self.mask(column, threshold)
+            mask.flags.writeable = False
+            entry = (mask, int(np.count_nonzero(mask)))
+            _bounded_put(self._combined, cache_key, entry)
+        return entry
+
+    def count(self, filters):
+        return self.combined(filters)[1]
+
+    def count_above(self, column, threshold):
+        """Rows with ``column > threshold``; accepts an array of thresholds too."""
+        return self.sort_index(column).count_above(column_threshold(self.df[column].dtype, threshold))
+
+    def rows_above(self, column, threshold):
+        """Rows with ``column > threshold``, sorted by that column descending."""
+        return self.df.iloc[self.sort_index(column).above(column_threshold(self.df[column].dtype, threshold))]
+
+    def top_n(self, filters, column, n):
+        """Top ``n`` filtered rows by ``column``, like ``nlargest`` on the filtered frame.
+
+        Walks the presorted order of ``column``; only the selected rows are materialized.
+        """
+        mask, _ = self.combined(filters)
+        return self.df.iloc[self.sort_index(column).top(n, mask)]
+
+    def _filtered(self, filters, columns):
+        mask, _ = self.combined(filters or {})
+        frame = self.df[columns]
+        return frame if mask is None else frame[mask]
+
+    def means(self, columns, filters=None):
+        """Float64 mean of each column over the filtered rows (NaN skipped)."""
+        return self._filtered(filters, columns).astype('float64').mean()
+
+    def group_sums(self, by, columns, filters=None):
+        """Sums of ``columns`` per value of ``by`` over the filtered rows.
+
+        Groups are sorted by key and rows with a missing key dropped, as in
+        ``groupby(observed=True)``. Integer columns sum to int64, the rest to float64.
+        """
+        frame = self._filtered(filters, [by] + columns)
+        return frame.astype(sum_dtypes(frame[columns])).groupby(by, observed=True, sort=True)[columns].sum()
+
+
+def sum_dtypes(frame):
+    """Result dtype of every engine's sums: int64 for integer columns, float64 otherwise."""
+    return {
+        col: 'int64' if pd.api.types.is_integer_dtype(dtype) else 'float64'
+        for col, dtype in frame.dtypes.items()
+    }
+
+
+def _bounded_put(entries, key, value):
+    if len(entries) >= MAX_ENTRIES:
+        del entries[next(iter(entries))]
+    entries[key] = value
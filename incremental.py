@@ -0,0 +1,192 @@
+"""Incremental append mode: only new or corrected rows are cleaned and merged.
+
+Each load is compared cell by cell with the previous raw load of the same
+source (row by row, in sheet order), which is cheap even for millions of
+rows. Only the rows that differ are cleaned; they are upserted by their
+(dt, title) key, so corrected rows replace the stored version in place and
+new keys are appended at the end. Among the changed rows the last
+occurrence of a key wins. Rows deleted from the source are kept.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from coerce import FAILED, CoercionReport, coerce_cells
+from ingest_cache import frame_nbytes, source_key
+from normalize import COUNT_COLS, RATE_COLS, match_columns, normalize_frame
+
+KEY_COLS = ['dt', 'title']
+
+
+@dataclass
+class Delta:
+    """What an append changed in the merged frame."""
+    updated: np.ndarray  # positions overwritten by corrected rows
+    appended: int        # new rows, at the end of the merged frame
+    unchanged: int
+    size: int            # rows in the merged frame
+
+    @property
+    def touched(self):
+        """Positions whose values changed or are new, ascending."""
+        start = self.size - self.appended
+        return np.concatenate([np.sort(self.updated), np.arange(start, self.size)])
+
+    @property
+    def positions(self):
+        """New position of each previous row: rows stay in place, new ones are appended."""
+        return np.arange(self.size - self.appended)
+
+    def __bool__(self):
+        return bool(len(self.updated) or self.appended)
+
+
+def row_keys(raw):
+    """Hash of the raw (dt, title) cells of each row."""
+    return pd.util.hash_pandas_object(raw[KEY_COLS], index=False).to_numpy()
+
+
+def changed_rows(previous, raw):
+    """Rows of ``raw`` that differ from the row at the same position in ``previous``.
+
+    Rows past the end of ``previous`` count as changed, and so does every row
+    when the columns or their dtypes differ.
+    """
+    changed = np.ones(len(raw), dtype=bool)
+    if list(previous.columns) != list(raw.columns):
+        return changed
+    n = min(len(previous), len(raw))
+    same = np.ones(n, dtype=bool)
+    for col in raw.columns:
+        old, new = previous[col].array[:n], raw[col].array[:n]
+        if old.dtype != new.dtype:
+            return changed
+        same &= np.asarray(old == new, dtype=bool) | (pd.isna(old) & pd.isna(new))
+    changed[:n] = ~same
+    return changed
+
+
+def _last_per_key(keys):
+    return ~pd.Index(keys).duplicated(keep='last')
+
+
+def merged_key(source, previous=None):
+    """Cache key of the merged frame after loading ``source`` (a content key) on top of ``previous``.
+
+    Chaining the previous merged key in makes the key name the whole
+    sequence of loads, so equal keys mean equal merged frames, whichever
+    session built them.
+    """
+    return source_key("append", previous or "", source)
+
+
+class AppendLog:
+    """The merged dataset of one source, plus its last raw load and row keys.
+
+    Keeping the raw load costs roughly the raw frame's memory; it is what
+    lets the next load find its changed rows without cleaning or hashing
+    everything again. ``source`` is the content key of the last load and
+    ``key`` the ``merged_key`` of the merged frame. ``statuses`` holds the
+    coercion status of every metric cell of the merged frame, so the
+    coercion reports stay exact when corrected rows replace stored ones.
+    """
+
+    def __init__(self, raw, lineage=None, key=None, source=None, df=None):
+        """Full load: every row is cleaned (the last occurrence of each key wins).
+
+        ``df`` is the merged frame of ``raw`` when it is already known (from
+        the shared cache), to skip the cleaning.
+        """
+        self.raw = match_columns(raw)
+        keys = row_keys(self.raw)
+        keep = _last_per_key(keys)
+        rows = self.raw[keep].reset_index(drop=True) if not keep.all() else self.raw.copy(deep=False)
+        self.statuses = {}
+        if df is None:
+            df = normalize_frame(rows, statuses=self.statuses)
+        else:
+            for col in COUNT_COLS + RATE_COLS:
+                self.statuses[col] = coerce_cells(rows[col])[2]
+        self.df = df
+        self.keys = keys[keep]
+        self.lineage = lineage
+        self.key = key
+        self.source = source
+        self._positions = pd.Index(self.keys)
+
+    def append(self, raw, key=None, source=None):
+        """Upserts the rows of ``raw`` that changed since the previous load.
+
+        Returns the ``Delta``, or ``None`` when the changed rows do not fit
+        the current schema (different columns or unparseable dates); reload
+        in full then.
+        """
+        raw = match_columns(raw)
+        changed = np.flatnonzero(changed_rows(self.raw, raw))
+        n_rows = len(self.df)
+        if not len(changed):
+            self.raw, self.key, self.source = raw, key, source
+            return Delta(updated=np.empty(0, dtype='int64'), appended=0, unchanged=n_rows, size=n_rows)
+
+        rows = raw.iloc[changed]
+        fresh_keys = row_keys(rows)
+        keep = _last_per_key(fresh_keys)
+        rows, fresh_keys = rows[keep], fresh_keys[keep]
+        statuses = {}
+        delta = normalize_frame(rows.reset_index(drop=True), statuses=statuses)
+        if list(delta.columns) != list(self.df.columns) or not (
+            pd.api.types.is_datetime64_any_dtype(delta['dt']) and pd.api.types.is_datetime64_any_dtype(self.df['dt'])
+        ):
+            return None
+
+        positions = self._positions.get_indexer(fresh_keys)
+        is_update = positions >= 0
+        updated = positions[is_update]
+
+        self.df = self._merge(delta, statuses, updated, is_update)
+        self.keys = np.concatenate([self.keys, fresh_keys[~is_update]])
+        self._positions = self._positions.append(pd.Index(fresh_keys[~is_update]))
+        self.raw, self.key, self.source = raw, key, source
+        return Delta(
+            updated=updated, appended=int((~is_update).sum()),
+            unchanged=n_rows - len(updated), size=len(self.df),
+        )
+
+    def _merge(self, delta, statuses, updated, is_update):
+        base = self.df
+        titles = union_categoricals([base['title'], delta['title']], ignore_order=True).categories
+        merged = pd.concat([
+            base.assign(title=base['title'].cat.set_categories(titles)),
+            delta.assign(title=delta['title'].cat.set_categories(titles))[~is_update],
+        ], ignore_index=True)
+
+        # Corrected rows share the key columns, so only the values are overwritten
+        corrections = delta[is_update]
+        for col in merged.columns.difference(KEY_COLS, sort=False):
+            new_values = corrections[col].to_numpy()
+            values = merged[col].to_numpy()
+            values = values.astype(np.result_type(values, new_values), copy=True)
+            values[updated] = new_values
+            merged[col] = values
+
+        # Reports are recounted from the cell statuses, so replaced rows no longer count
+        reports = {}
+        for col, fresh in statuses.items():
+            cells = np.concatenate([self.statuses[col], fresh[~is_update]])
+            cells[updated] = fresh[is_update]
+            self.statuses[col] = cells
+            # Examples of replaced cells may linger, but never more than the cells still failing
+            examples = delta.attrs['coercion'][col]['failed_examples'] + base.attrs['coercion'][col]['failed_examples']
+            examples = list(dict.fromkeys(examples))[:int((cells == FAILED).sum())]
+            reports[col] = CoercionReport.from_statuses(col, cells, examples).as_dict()
+        merged.attrs['coercion'] = reports
+        # Each replaced row is costed by its new version: only the appended rows add to the total
+        appended = len(delta) - len(updated)
+        merged.attrs['memory'] = {
+            'rows': len(merged),
+            'bytes_before': base.attrs['memory']['bytes_before'] + delta.attrs['memory']['bytes_before'] * appended // len(delta),
+            'bytes_after': frame_nbytes(merged),
+        }
+        return merged
@@ -0,0 +1,176 @@
+"""Process-wide store of normalized DataFrames, keyed by a fingerprint of the raw source.
+
+Every session that loads the same source shares one resident frame. A
+session holds a ``DatasetRef`` to the dataset it is showing; referenced
+datasets are never evicted, unreferenced ones are dropped least recently
+used first once the store is over its byte budget
+(``DATA_ANALYZER_CACHE_MB``, default 512).
+"""
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+CACHE_BUDGET_ENV = 'DATA_ANALYZER_CACHE_MB'
+DEFAULT_BUDGET_BYTES = 512 * 1024 * 1024
+
+
+def source_key(kind, *parts):
+    """Fingerprints a data source: uploaded bytes, sheet URL + gid, or paste text."""
+    h = hashlib.sha256(kind.encode('utf-8'))
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        h.update(b'\0')
+        h.update(part)
+    return f"{kind}:{h.hexdigest()}"
+
+
+def frame_nbytes(df):
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def default_budget_bytes():
+    """Byte budget from ``DATA_ANALYZER_CACHE_MB``, else ``DEFAULT_BUDGET_BYTES``."""
+    megabytes = os.environ.get(CACHE_BUDGET_ENV, '').strip()
+    return int(float(megabytes) * 1024 * 1024) if megabytes else DEFAULT_BUDGET_BYTES
+
+
+class _Entry:
+    __slots__ = ('df', 'nbytes', 'refs', 'hits', 'created_at', 'used_at')
+
+    def __init__(self, df, nbytes):
+        self.df = df
+        self.nbytes = nbytes
+        self.refs = 0
+        self.hits = 0
+        self.created_at = self.used_at = time.time()
+
+
+class DatasetRef:
+    """A session's claim on a resident dataset; released explicitly or when garbage collected."""
+
+    def __init__(self, cache, key):
+        self.key = key
+        self._release = weakref.finalize(self, cache._unref, key)
+
+    def release(self):
+        self._release()
+
+    @property
+    def released(self):
+        return not self._release.alive
+
+
+class IngestCache:
+    """Keeps cleaned frames under a byte budget, evicting unreferenced ones least recently used first.
+
+    Frames are shared between sessions and reruns: ``put`` stores and ``get``
+    and ``put`` hand out shallow copies, so with pandas' copy-on-write neither
+    a session's edits nor the caller's later edits reach the shared frame.
+    """
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = default_budget_bytes() if budget_bytes is None else budget_bytes
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        # Re-entrant: a DatasetRef can be collected (and release) while the lock is held
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._touch(key, entry)
+            entry.hits += 1
+            self.hits += 1
+            return entry.df.copy(deep=False)
+
+    def put(self, key, df):
+        nbytes = frame_nbytes(df)
+        with self._lock:
+            previous = self._entries.get(key)
+            self._drop(key)
+            entry = self._entries[key] = _Entry(df.copy(deep=False), nbytes)
+            if previous is not None:
+                entry.refs = previous.refs
+            self.total_bytes += nbytes
+            # The new frame stays even over budget: its session is about to reference it
+            self._evict(keep=key)
+        return df.copy(deep=False)
+
+    def reference(self, key):
+        """``DatasetRef`` keeping ``key`` resident until released; ``None`` if it is not stored."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.refs += 1
+            self._touch(key, entry)
+        return DatasetRef(self, key)
+
+    def _unref(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs > 0:
+                entry.refs -= 1
+
+    def evict_unreferenced(self):
+        """Drops every dataset no session references; returns the bytes freed."""
+        with self._lock:
+            before = self.total_bytes
+            for key in [k for k, e in self._entries.items() if e.refs == 0]:
+                self._drop(key)
+                self.evictions += 1
+            return before - self.total_bytes
+
+    def entries(self):
+        """Resident datasets for the admin view, most recently used first."""
+        with self._lock:
+            return [
+                {
+                    'key': key, 'source': key.split(':', 1)[0], 'rows': len(e.df),
+                    'bytes': e.nbytes, 'refs': e.refs, 'hits': e.hits,
+                    'created_at': e.created_at, 'used_at': e.used_at,
+                }
+                for key, e in reversed(self._entries.items())
+            ]
+
+    def discard(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _touch(self, key, entry):
+        self._entries.move_to_end(key)
+        entry.used_at = time.time()
+
+    def _evict(self, keep=None):
+        for key in [k for k, e in self._entries.items() if e.refs == 0 and k != keep]:
+            if self.total_bytes <= self.budget_bytes:
+                break
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.nbytes
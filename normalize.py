@@ -0,0 +1,111 @@
+"""Column matching and type conversion for raw analytics sheets."""
+import pandas as pd
+
+from coerce import coerce_cells
+from ingest_cache import frame_nbytes
+
+# Fuzzy Match Columns: standard name -> keyword searched in the raw header
+COL_KEYWORD_MAP = {
+    'dt': 'dt',
+    'title': 'title',
+    '卡片曝光uv': '卡片曝光',
+    '頁面訪問uv': '頁面訪問',
+    '文章訪問率': '文章訪問',
+    '行動點點擊uv (入口+詳情)': '行動點點擊',
+    '功能轉化率': '功能轉化'
+}
+
+COUNT_COLS = ['卡片曝光uv', '頁面訪問uv', '行動點點擊uv (入口+詳情)']
+RATE_COLS = ['文章訪問率', '功能轉化率']
+
+# Rates as numerator / denominator counts, for recomputing them after aggregation
+RATE_DEFINITIONS = {
+    '文章訪問率': ('頁面訪問uv', '卡片曝光uv'),
+    '功能轉化率': ('行動點點擊uv (入口+詳情)', '頁面訪問uv'),
+}
+
+
+class MissingColumnsError(ValueError):
+    """Raised when required columns cannot be matched in the raw header."""
+
+    def __init__(self, missing, detected):
+        super().__init__(f"Missing columns: {', '.join(missing)}")
+        self.missing = missing
+        self.detected = detected
+
+
+def match_columns(df):
+    """Renames fuzzy-matched raw headers to the standard names in place."""
+    df.columns = df.columns.astype(str).str.strip()
+
+    missing_cols = []
+    for standard_col, keyword in COL_KEYWORD_MAP.items():
+        match = next((col for col in df.columns if keyword.lower() in col.lower()), None)
+        if match:
+            df.rename(columns={match: standard_col}, inplace=True)
+        else:
+            missing_cols.append(f"{standard_col} (keyword: {keyword})")
+
+    if missing_cols:
+        raise MissingColumnsError(missing_cols, list(df.columns))
+    return df
+
+
+def compact_counts(values):
+    """Smallest unsigned int for whole, non-negative counts; float32 otherwise."""
+    if (values >= 0).all() and (values % 1 == 0).all():
+        return pd.to_numeric(values, downcast='unsigned')
+    return values.astype('float32')
+
+
+def parse_dt(series):
+    """Parses the date column to datetime64, keeping the raw values if any cell fails."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        # Sheets often export dates as 20240131
+        parsed = pd.to_datetime(series.astype('Int64').astype('string'), format='%Y%m%d', errors='coerce')
+    else:
+        parsed = pd.to_datetime(series, format='mixed', errors='coerce')
+    if parsed.notna().sum() < series.notna().sum():
+        return series.astype('category')
+    return parsed
+
+
+def normalize_frame(df, statuses=None):
+    """Returns the cleaned, typed frame the dashboard works on.
+
+    Per-column coercion reports are kept in ``df.attrs['coercion']`` and the
+    footprint before/after dtype compaction in ``df.attrs['memory']``. When
+    a dict is passed as ``statuses``, it receives the per-cell coercion
+    statuses of each metric column.
+    """
+    df = match_columns(df)
+
+    # Type Conversion: malformed cells become NaN and are counted, never raised
+    reports = {}
+    for col in COUNT_COLS + RATE_COLS:
+        values, report, cell_statuses = coerce_cells(df[col])
+        if statuses is not None:
+            statuses[col] = cell_statuses
+        if col in COUNT_COLS:
+            values = values.fillna(0)
+        df[col] = values
+        reports[col] = report.as_dict()
+    bytes_before = frame_nbytes(df)
+
+    # Compact Schema: uint counts, float32 rates, categorical title, datetime dt
+    for col in COUNT_COLS:
+        df[col] = compact_counts(df[col])
+    for col in RATE_COLS:
+        df[col] = df[col].astype('float32')
+    df['title'] = df['title'].astype('category')
+    df['dt'] = parse_dt(df['dt'])
+
+    df.attrs['coercion'] = reports
+    df.attrs['memory'] = {
+        'rows': len(df),
+        'bytes_before': bytes_before,
+        'bytes_after': frame_nbytes(df),
+    }
+    return df
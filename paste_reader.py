@@ -0,0 +1,165 @@
+"""Pasted tables: the format is sniffed from a small prefix, then the text is parsed once.
+
+Excel and Google Sheets put copied ranges on the clipboard as tab-separated
+text; exports paste as CSV. The delimiter, the quoting style and the header
+row are decided from the first ``SNIFF_BYTES`` of the paste, and the whole
+paste is then parsed in one pass by pyarrow's multi-threaded CSV reader,
+block by block. As in ``excel_reader``, only the matched columns are kept,
+already renamed to their standard names.
+
+Google Sheets quirks are handled in that pass: quoted cells spanning several
+lines, trailing empty columns and rows, and title lines above the header.
+Pastes with ragged rows, which Arrow rejects, are read by pandas' C parser
+instead.
+"""
+import csv
+import io
+from dataclasses import dataclass
+from itertools import islice
+
+import pandas as pd
+
+from excel_reader import match_header
+from normalize import COL_KEYWORD_MAP, MissingColumnsError
+
+SNIFF_BYTES = 64 * 1024
+SNIFF_ROWS = 50
+DELIMITERS = ('\t', ',', ';', '|')  # Tab first: what spreadsheets put on the clipboard
+BLOCK_BYTES = 4 << 20  # Arrow parses blocks of this size in parallel
+
+
+@dataclass
+class PasteFormat:
+    delimiter: str
+    quoted: bool       # '"' quotes cells; off for pastes with stray quotes
+    data_line: int     # physical line the data starts on; the header and lines above it are skipped
+    width: int         # cells in the header row
+    columns: dict      # standard name -> cell position, from match_header
+
+
+def _sniff_rows(prefix, delimiter, quoted, truncated):
+    """``(first line, cells)`` of the rows in ``prefix`` for one delimiter and quoting style."""
+    reader = csv.reader(
+        io.StringIO(prefix, newline=''), delimiter=delimiter,
+        quoting=csv.QUOTE_MINIMAL if quoted else csv.QUOTE_NONE,
+    )
+    rows, line = [], 0
+    try:
+        for cells in islice(reader, SNIFF_ROWS + 1):
+            rows.append((line, cells))
+            line = reader.line_num
+    except csv.Error:
+        pass
+    # A cut prefix ends mid-row
+    return rows[:-1] if truncated and len(rows) > 1 else rows[:SNIFF_ROWS]
+
+
+def _find_header(rows):
+    """First row whose cells match every keyword, and its index."""
+    for i, (_, cells) in enumerate(rows):
+        # With the wrong delimiter a whole line is one cell matching every keyword
+        if len(cells) < 2:
+            continue
+        try:
+            return i, match_header(cells)
+        except MissingColumnsError:
+            continue
+    return None, None
+
+
+def sniff_paste(text):
+    """Delimiter, quoting and header of a paste, from its first ``SNIFF_BYTES``.
+
+    Each candidate split must yield a matching header; the one whose data
+    rows most often have the header's width wins (ties: quoted, then the
+    ``DELIMITERS`` order). Raises ``MissingColumnsError`` when none matches.
+    """
+    truncated = len(text) > SNIFF_BYTES
+    prefix = text[:SNIFF_BYTES]
+    best, best_score = None, None
+    for quoted in (True, False):
+        for priority, delimiter in enumerate(DELIMITERS):
+            rows = _sniff_rows(prefix, delimiter, quoted, truncated)
+            i, columns = _find_header(rows)
+            if columns is None:
+                continue
+            header = rows[i][1]
+            data_line = rows[i + 1][0] if i + 1 < len(rows) else rows[i][0] + 1
+            widths = [len(cells) for _, cells in rows[i + 1:] if any(c.strip() for c in cells)]
+            share = sum(w == len(header) for w in widths) / len(widths) if widths else 1.0
+            score = (share, quoted, -priority)
+            if best_score is None or score > best_score:
+                best_score = score
+                best = PasteFormat(delimiter, quoted, data_line, len(header), columns)
+    if best is None:
+        # Report the missing columns against the first non-empty line
+        first = next((line for line in prefix.splitlines() if line.strip()), '')
+        raise MissingColumnsError(
+            [f"{col} (keyword: {keyword})" for col, keyword in COL_KEYWORD_MAP.items()
+             if keyword.lower() not in first.lower()] or ["(無法辨識分隔符號 / unknown delimiter)"],
+            [first[:200]],
+        )
+    return best
+
+
+def _line_offset(text, line):
+    """Character offset where physical line ``line`` (0-based) starts.
+
+    Lines end as the sniffing ``csv.reader`` sees them: at ``\\r\\n``, ``\\n``
+    or a bare ``\\r``, so the offset agrees with its ``line_num``.
+    """
+    return sum(len(physical) for physical in islice(io.StringIO(text, newline=''), line))
+
+
+def _read_arrow(body, fmt):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    names = [f"c{i}" for i in range(fmt.width)]
+    table = pacsv.read_csv(
+        io.BytesIO(body.encode('utf-8')),
+        read_options=pacsv.ReadOptions(column_names=names, block_size=BLOCK_BYTES),
+        parse_options=pacsv.ParseOptions(
+            delimiter=fmt.delimiter, quote_char='"' if fmt.quoted else False,
+            newlines_in_values=fmt.quoted, ignore_empty_lines=True,
+        ),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[names[pos] for pos in fmt.columns.values()],
+            strings_can_be_null=True,
+        ),
+    )
+    # Arrow infers ISO dates and times; pandas' parser keeps them as text for parse_dt
+    for i, field in enumerate(table.schema):
+        if pa.types.is_temporal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+    frame = table.to_pandas()
+    frame.columns = list(fmt.columns)
+    return frame
+
+
+def _read_pandas(body, fmt):
+    frame = pd.read_csv(
+        io.StringIO(body), sep=fmt.delimiter, header=None, names=range(fmt.width), index_col=False,
+        usecols=list(fmt.columns.values()), quoting=csv.QUOTE_MINIMAL if fmt.quoted else csv.QUOTE_NONE,
+    )
+    frame = frame[list(fmt.columns.values())]
+    frame.columns = list(fmt.columns)
+    return frame
+
+
+def read_pasted(text):
+    """Frame of the matched columns, renamed to their standard names, from pasted text."""
+    import pyarrow as pa
+
+    fmt = sniff_paste(text)
+    body = text[_line_offset(text, fmt.data_line):]
+    try:
+        frame = _read_arrow(body, fmt)
+    except pa.ArrowInvalid:
+        # Rows with a different cell count than the header
+        frame = _read_pandas(body, fmt)
+    # Selections often run past the data into empty rows
+    empty = frame.isna().all(axis=1).to_numpy()
+    if empty.any():
+        frame = frame[~empty].reset_index(drop=True)
+    return frame
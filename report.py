@@ -0,0 +1,268 @@
+"""HTML report export: streams a standalone document to a file-like object.
+
+Figures are written as compact JSON (numeric arrays binary-encoded by
+plotly's serializer) with the shared layout template stored once. plotly.js
+is either linked from the CDN or embedded exactly once, optionally
+gzip+base64 encoded and inflated in the browser. Charts render when they
+scroll into view. plotly is only imported when a report is written.
+"""
+import base64
+import functools
+import gzip
+import io
+import json
+
+from normalize import COUNT_COLS
+from rollups import weighted_metrics
+
+REPORT_HEAD = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Bitget Wallet Analysis Report</title>
+        <meta charset="utf-8">
+        {plotlyjs_tag}
+        <style>
+            body {{
+                background-color: #050505;
+                color: #e2e8f0;
+                font-family: 'Inter', sans-serif;
+                padding: 40px;
+                max-width: 1200px;
+                margin: 0 auto;
+            }}
+            h1 {{
+                background: linear-gradient(90deg, #00f2fe 0%, #4facfe 100%);
+                -webkit-background-clip: text;
+                -webkit-text-fill-color: transparent;
+                margin-bottom: 40px;
+                font-size: 2.5rem;
+            }}
+            h2 {{ border-bottom: 1px solid #333; padding-bottom: 10px; margin-top: 40px; color: #fff; }}
+            .metrics-grid {{
+                display: grid;
+                grid-template-columns: repeat(4, 1fr);
+                gap: 20px;
+                margin-bottom: 40px;
+            }}
+            .metric-card {{
+                background: rgba(255, 255, 255, 0.05);
+                padding: 20px;
+                border-radius: 12px;
+                border: 1px solid rgba(255,255,255,0.1);
+                text-align: center;
+            }}
+            .metric-value {{
+                font-size: 2rem;
+                font-weight: bold;
+                color: #4facfe;
+            }}
+            .metric-label {{ color: #94a3b8; font-size: 0.9rem; text-transform: uppercase; }}
+            .summary-box {{
+                background: #0f1115;
+                padding: 25px;
+                border-radius: 12px;
+                border-left: 4px solid #4facfe;
+                margin-bottom: 40px;
+                white-space: pre-wrap;
+                line-height: 1.6;
+            }}
+            .chart-container {{
+                margin-bottom: 50px;
+                background: #0f1115;
+                padding: 20px;
+                border-radius: 12px;
+            }}
+            .chart {{ min-height: 450px; }}
+        </style>
+    </head>
+    <body>
+        <h1>Bitget Wallet Content Analysis</h1>
+
+        <div class="metrics-grid">
+            <div class="metric-card">
+                <div class="metric-label">每篇平均卡片曝光</div>
+                <div class="metric-value">{avg_exp:,.0f}</div>
+            </div>
+            <div class="metric-card">
+                <div class="metric-label">每篇平均頁面訪問</div>
+                <div class="metric-value">{avg_visit:,.0f}</div>
+            </div>
+            <div class="metric-card">
+                <div class="metric-label">整體文章訪問率 (CTR)</div>
+                <div class="metric-value">{avg_article_rate:.2%}</div>
+            </div>
+            <div class="metric-card">
+                <div class="metric-label">整體功能轉化率 (CVR)</div>
+                <div class="metric-value">{avg_conv_rate:.2%}</div>
+            </div>
+        </div>
+
+        <h2>📝 題材分析小結 (Theme Analysis)</h2>
+        <div class="summary-box">{summary_text}</div>
+
+        <h2>📊 數據視覺化 (Visualizations)</h2>
+"""
+
+REPORT_FOOT = """
+        <div style="text-align: center; margin-top: 50px; color: #666; font-size: 0.8rem;">
+            Generated by Bitget Wallet Data Analyzer
+        </div>
+    </body>
+    </html>
+"""
+
+# Decodes payloads, loads plotly.js if embedded, renders charts as they scroll into view
+REPORT_LOADER_JS = """
+(function () {
+    function decode(node) {
+        if (node.dataset.encoding !== 'gzip-base64') return Promise.resolve(node.textContent);
+        var bytes = Uint8Array.from(atob(node.textContent), function (c) { return c.charCodeAt(0); });
+        var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+        return new Response(stream).text();
+    }
+    var templates = [];
+    var ready = (function () {
+        var payload = document.getElementById('plotlyjs-payload');
+        if (!payload || window.Plotly) return Promise.resolve();
+        return decode(payload).then(function (source) {
+            var script = document.createElement('script');
+            script.text = source;
+            document.head.appendChild(script);
+        });
+    })().then(function () {
+        return decode(document.getElementById('report-templates'));
+    }).then(function (text) { templates = JSON.parse(text); });
+
+    function render(container) {
+        var node = container.querySelector('script.figure-data');
+        Promise.all([ready, decode(node)]).then(function (results) {
+            var fig = JSON.parse(results[1]);
+            fig.layout.template = templates[+node.dataset.template];
+            Plotly.newPlot(container.querySelector('.chart'), fig.data, fig.layout, {responsive: true});
+        });
+    }
+    var charts = document.querySelectorAll('.chart-container');
+    if (LAZY && 'IntersectionObserver' in window) {
+        var observer = new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) { observer.unobserve(entry.target); render(entry.target); }
+            });
+        }, {rootMargin: '300px'});
+        charts.forEach(function (c) { observer.observe(c); });
+    } else {
+        charts.forEach(render);
+    }
+})();
+"""
+
+
+@functools.lru_cache(maxsize=1)
+def _plotlyjs_gzip_base64():
+    from plotly.offline import get_plotlyjs
+    return _gzip_base64(get_plotlyjs())
+
+
+def _gzip_base64(text):
+    return base64.b64encode(gzip.compress(text.encode('utf-8'), mtime=0)).decode('ascii')
+
+
+def _script_payload(text, element_id=None, css_class=None, compress=False, **data):
+    """Inline data block; JSON is escaped so it cannot close the script tag early."""
+    attrs = ['type="application/json"']
+    if element_id:
+        attrs.append(f'id="{element_id}"')
+    if css_class:
+        attrs.append(f'class="{css_class}"')
+    if compress:
+        text = _gzip_base64(text)
+        attrs.append('data-encoding="gzip-base64"')
+    else:
+        text = text.replace('</', '<\\/')
+    attrs.extend(f'data-{k}="{v}"' for k, v in data.items())
+    return f"<script {' '.join(attrs)}>{text}</script>"
+
+
+def default_summary(df_filtered):
+    """Automated insight text the summary box starts from (``df_filtered``: one row per title)."""
+    top_titles_conv = df_filtered.nlargest(3, '功能轉化率')['title'].tolist()
+    return f"""**本期數據洞察 (Automated Insights)：**
+
+1. **高轉化 (High CVR)**：
+   - 「{top_titles_conv[0] if top_titles_conv else 'N/A'}」表現最佳。
+   - 建議：分析該篇的 Call-to-Action 與排版結構。
+
+2. **策略建議 (Strategy)**：
+   - (在此輸入您的觀察...)
+"""
+
+
+def markdown_report(summary_text):
+    return f"# Bitget Data Report\n{summary_text}"
+
+
+def write_html_report(out, df_filtered, summary_text, figs, plotlyjs='cdn', compress=False, lazy=True, progress=None):
+    """Streams the report to ``out`` (a text file-like object).
+
+    ``df_filtered`` is the per-title table: the cards show mean counts per
+    title and rates as ratios of the summed counts.
+    ``plotlyjs`` is ``'cdn'`` (small file, needs internet) or ``'inline'``
+    (embedded once, works offline). ``compress`` gzip+base64 encodes the
+    embedded plotly.js and figure data; the browser inflates them with
+    ``DecompressionStream``. ``progress`` is called with the fraction of
+    figures written so far.
+    """
+    import plotly.io as pio
+    from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+    # Calculate metrics for the report
+    metrics = weighted_metrics(df_filtered[COUNT_COLS].mean())
+    avg_exp, avg_visit = metrics['卡片曝光uv'], metrics['頁面訪問uv']
+    avg_article_rate, avg_conv_rate = metrics['文章訪問率'], metrics['功能轉化率']
+
+    if plotlyjs == 'cdn':
+        plotlyjs_tag = f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" charset="utf-8"></script>'
+    else:
+        plotlyjs_tag = ''
+
+    out.write(REPORT_HEAD.format(
+        plotlyjs_tag=plotlyjs_tag,
+        avg_exp=avg_exp, avg_visit=avg_visit,
+        avg_article_rate=avg_article_rate, avg_conv_rate=avg_conv_rate,
+        summary_text=summary_text,
+    ))
+
+    # Figures: layout templates are shared, so each distinct one is written once
+    templates = {}
+    for i, fig in enumerate(figs):
+        fig_dict = fig.to_plotly_json()
+        template = pio.json.to_json_plotly(fig_dict['layout'].pop('template', {}))
+        template_id = templates.setdefault(template, len(templates))
+        out.write(f'        <div class="chart-container"><div class="chart" id="chart-{i}"></div>')
+        out.write(_script_payload(
+            pio.json.to_json_plotly(fig_dict), css_class="figure-data",
+            compress=compress, template=template_id,
+        ))
+        out.write('</div>\n')
+        if progress is not None:
+            progress((i + 1) / (len(figs) + 1))
+
+    out.write(_script_payload('[' + ','.join(templates) + ']', element_id="report-templates", compress=compress))
+    if plotlyjs != 'cdn':
+        if compress:
+            out.write('<script type="application/octet-stream" id="plotlyjs-payload" '
+                      f'data-encoding="gzip-base64">{_plotlyjs_gzip_base64()}</script>')
+        else:
+            # Plain embed: executes directly, no decoding needed
+            out.write('<script type="text/javascript">')
+            out.write(get_plotlyjs())
+            out.write('</script>')
+    out.write('<script>' + REPORT_LOADER_JS.replace('LAZY', json.dumps(lazy)) + '</script>')
+    out.write(REPORT_FOOT)
+
+
+def create_html_report(df_filtered, summary_text, figs, **options):
+    """Generates a standalone HTML file with the dashboard content."""
+    buffer = io.StringIO()
+    write_html_report(buffer, df_filtered, summary_text, figs, **options)
+    return buffer.getvalue()
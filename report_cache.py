@@ -0,0 +1,119 @@
+"""HTML report exports built on demand by background workers and cached by content.
+
+A report is identified by ``report_key``: the dataset fingerprint, the cache
+keys of its figures (each derived from the figure's data and chart config),
+a hash of the summary text and the export options. ``ReportCache.submit``
+starts at most one build per key on a small thread pool and reports its
+progress; finished reports stay in an LRU under a byte budget, so
+downloading an unchanged report again costs nothing.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BUDGET_BYTES = 128 * 1024 * 1024
+
+
+def report_key(dataset, figure_keys, summary_text, **options):
+    """Content key of a report; ``dataset`` fingerprints the rows it summarizes."""
+    summary_hash = hashlib.sha256(summary_text.encode('utf-8')).hexdigest()
+    payload = json.dumps([dataset, list(figure_keys), summary_hash, options], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ReportJob:
+    """One report build; ``progress`` goes from 0 to 1 as figures are written."""
+
+    def __init__(self, key):
+        self.key = key
+        self.progress = 0.0
+        self.started_at = time.time()
+        self.seconds = None
+        self.error = None
+        self.report = None
+        self.future = None
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+
+class ReportCache:
+    """Builds reports on ``max_workers`` threads and keeps the results under ``budget_bytes``."""
+
+    def __init__(self, max_workers=2, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._reports = OrderedDict()  # key -> bytes, least recently used first
+        self._jobs = {}  # key -> ReportJob still running, or failed
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self.total_bytes = 0
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, key):
+        with self._lock:
+            report = self._reports.get(key)
+            if report is not None:
+                self._reports.move_to_end(key)
+                self.hits += 1
+            return report
+
+    def job(self, key):
+        """The running (or failed) build of ``key``, if any."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def submit(self, key, build):
+        """Starts ``build(progress)`` for ``key`` unless it is cached or already building.
+
+        ``build`` returns the report bytes and calls ``progress(fraction)``
+        along the way. Returns the job, or ``None`` when the report is cached.
+        """
+        with self._lock:
+            if key in self._reports:
+                return None
+            job = self._jobs.get(key)
+            if job is not None and job.error is None:
+                return job
+            job = self._jobs[key] = ReportJob(key)
+            job.future = self._pool.submit(self._run, job, build)
+            return job
+
+    def result(self, key, build):
+        """The report for ``key``: cached, joined from a running build, or built now."""
+        report = self.get(key)
+        if report is not None:
+            return report
+        job = self.submit(key, build)
+        if job is None:  # Finished in the meantime
+            return self.get(key) or self.result(key, build)
+        job.future.result()
+        if job.error is not None:
+            raise job.error
+        return job.report
+
+    def _run(self, job, build):
+        start = time.perf_counter()
+        try:
+            report = build(lambda fraction: setattr(job, 'progress', fraction))
+        except Exception as e:
+            job.error = e
+            return
+        finally:
+            job.seconds = time.perf_counter() - start
+        job.report, job.progress = report, 1.0
+        with self._lock:
+            self._jobs.pop(job.key, None)
+            self._reports[job.key] = report
+            self.total_bytes += len(report)
+            self.builds += 1
+            # Oldest first, but the new report always stays
+            while self.total_bytes > self.budget_bytes and len(self._reports) > 1:
+                _, dropped = self._reports.popitem(last=False)
+                self.total_bytes -= len(dropped)
+
+    def __len__(self):
+        return len(self._reports)
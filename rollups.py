@@ -0,0 +1,165 @@
+"""Per-title totals and daily / weekly / monthly rollups of the dataset.
+
+Titles repeat across ``dt`` rows, so the dashboard works on one row per
+title: counts summed over every row. Each time granularity is aggregated
+once per dataset into a (period, title) table; time-range queries slice
+that table by period and re-aggregate it, never touching the raw rows
+again. Rates are always recomputed from summed numerators and
+denominators, never averaged.
+
+``sketches`` summarizes the per-title values of each metric in mergeable
+quantile sketches, built once per table, for data-aware slider ranges.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from normalize import COUNT_COLS, RATE_DEFINITIONS
+from sketches import sketch_columns
+
+GRANULARITIES = {'D': '日 (Daily)', 'W': '週 (Weekly)', 'M': '月 (Monthly)'}
+
+
+@dataclass
+class TitleDelta:
+    """How an append moved the per-title table."""
+    positions: np.ndarray  # new position of each previous title, ascending
+    touched: np.ndarray    # positions whose totals changed or are new titles, ascending
+
+
+def period_start(dt, granularity):
+    """First day of the period each timestamp falls into (weeks start on Monday)."""
+    day = dt.dt.floor('D')
+    if granularity == 'D':
+        return day
+    if granularity == 'W':
+        return day - pd.to_timedelta(day.dt.weekday, unit='D')
+    if granularity == 'M':
+        return day - pd.to_timedelta(day.dt.day - 1, unit='D')
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def with_rates(frame):
+    """Adds rate columns as ratio of summed counts (NaN where the denominator is 0)."""
+    for rate, (numerator, denominator) in RATE_DEFINITIONS.items():
+        den = frame[denominator].astype('float64')
+        frame[rate] = (frame[numerator] / den.where(den > 0)).astype('float32')
+    return frame
+
+
+def total_dtypes(counts):
+    """64-bit dtypes for totals of the ``counts`` columns: ``uint64`` for unsigned counts, else ``float64``."""
+    return {
+        col: 'uint64' if pd.api.types.is_unsigned_integer_dtype(dtype) else 'float64'
+        for col, dtype in counts.dtypes.items()
+    }
+
+
+def weighted_metrics(count_means):
+    """Metric-card values from mean counts per title: the means plus each rate as a ratio of them.
+
+    A ratio of means over the same titles is the ratio of sums, so rates are
+    weighted by their denominators instead of averaging per-title rates.
+    """
+    metrics = count_means.astype('float64').copy()
+    for rate, (numerator, denominator) in RATE_DEFINITIONS.items():
+        den = metrics[denominator]
+        metrics[rate] = metrics[numerator] / den if den > 0 else np.nan
+    return metrics
+
+
+class RollupEngine:
+    """Precomputed per-title and time-bucketed aggregates for one dataset."""
+
+    def __init__(self, df, key=None):
+        self.df = df
+        self.key = key
+        self.available = pd.api.types.is_datetime64_any_dtype(df['dt']) and bool(df['dt'].notna().any())
+        self._tables = {}   # granularity -> (period, title) table sorted by period; None -> title table
+        self._queries = {}  # (kind, granularity, start, end) -> frame
+        self._sketches = {}  # (granularity, start, end) -> {column: QuantileSketch}
+
+    def table(self, granularity):
+        table = self._tables.get(granularity)
+        if table is None:
+            table = self._aggregate(self.df, granularity).reset_index()
+            table = self._tables[granularity] = with_rates(table)
+        return table
+
+    def titles(self):
+        """One row per title with counts summed over every row, sorted by title."""
+        return self.table(None)
+
+    def sketches(self, granularity=None, start=None, end=None):
+        """Quantile sketches of the per-title metrics: of ``titles()``, or of ``by_title`` for a period range."""
+        cache_key = (granularity, start, end)
+        sketches = self._sketches.get(cache_key)
+        if sketches is None:
+            table = self.titles() if granularity is None else self.by_title(granularity, start, end)
+            sketches = self._sketches[cache_key] = sketch_columns(table)
+        return sketches
+
+    def apply_delta(self, df, key, delta, previous):
+        """Moves the rollups to ``df`` after an incremental append.
+
+        The touched rows of ``df`` are added to every computed table and the
+        versions they replaced (rows of ``previous``) subtracted, instead of
+        aggregating the whole frame again. Returns how the per-title table
+        moved (a ``TitleDelta``, for its query engine), or ``None`` when it
+        was not built yet.
+        """
+        added = df.iloc[delta.touched]
+        removed = previous.iloc[delta.updated]
+        self.df, self.key = df, key
+        # Totals can outgrow the compact dtype of the table they patch
+        dtypes = total_dtypes(df[COUNT_COLS])
+        title_delta = None
+        for granularity, table in list(self._tables.items()):
+            added_counts, removed_counts = self._aggregate(added, granularity), self._aggregate(removed, granularity)
+            counts = table.set_index(['title'] if granularity is None else ['period', 'title'])[COUNT_COLS]
+            counts = counts.add(added_counts, fill_value=0).sub(removed_counts, fill_value=0)
+            counts = counts.astype(dtypes).sort_index()
+            if granularity is None:
+                # New titles are inserted in title order; the others keep their relative order
+                titles = counts.index
+                touched = titles.get_indexer(added_counts.index.union(removed_counts.index))
+                title_delta = TitleDelta(positions=titles.get_indexer(table['title']), touched=np.unique(touched))
+            self._tables[granularity] = with_rates(counts.reset_index())
+        self._queries.clear()
+        self._sketches.clear()
+        return title_delta
+
+    @staticmethod
+    def _aggregate(df, granularity):
+        keys = [df['title']]
+        if granularity is not None:
+            keys.insert(0, period_start(df['dt'], granularity).rename('period'))
+        return df.groupby(keys, observed=True, sort=True)[COUNT_COLS].sum()
+
+    def periods(self, granularity):
+        return self.table(granularity)['period'].drop_duplicates().tolist()
+
+    def _slice(self, granularity, start, end):
+        table = self.table(granularity)
+        period = table['period'].to_numpy()
+        lo = np.searchsorted(period, np.datetime64(start), side='left') if start is not None else 0
+        hi = np.searchsorted(period, np.datetime64(end), side='right') if end is not None else len(table)
+        return table.iloc[lo:hi]
+
+    def by_title(self, granularity, start=None, end=None):
+        """One row per title with counts summed over ``[start, end]`` periods."""
+        return self._query('title', granularity, start, end)
+
+    def totals(self, granularity, start=None, end=None):
+        """One row per period with counts summed over all titles (for trend charts)."""
+        return self._query('period', granularity, start, end)
+
+    def _query(self, by, granularity, start, end):
+        cache_key = (by, granularity, start, end)
+        result = self._queries.get(cache_key)
+        if result is None:
+            rows = self._slice(granularity, start, end)
+            result = rows.groupby(by, observed=True, sort=True)[COUNT_COLS].sum().reset_index()
+            result = self._queries[cache_key] = with_rates(result)
+        return result
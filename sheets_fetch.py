@@ -0,0 +1,157 @@
+"""HTTP fetch layer for the Google Sheets CSV export, with an on-disk cache.
+
+Responses are kept on disk together with their validators (ETag /
+Last-Modified). Within ``ttl`` seconds the local copy is served as is; within
+the following ``stale_ttl`` seconds it is still served, while a conditional
+request revalidates it on a background thread. Past that window the request
+is made synchronously, falling back to the stale copy if the network fails.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "data-analyzer-http")
+
+
+@dataclass
+class FetchResult:
+    content: bytes
+    digest: str         # sha256 of the body; unchanged digest means unchanged data
+    fetched_at: float   # last time the server confirmed this body
+    stale: bool         # served past its TTL while a refresh runs / failed
+
+
+class SheetFetcher:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=300, stale_ttl=3600,
+                 timeout=30, clock=time.time):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()  # keeps body and metadata consistent
+        self._refreshing = {}  # url -> Thread
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def fetch(self, url, force=False):
+        """Returns the body for ``url``, from disk when fresh enough.
+
+        ``force`` revalidates synchronously regardless of age (still a
+        conditional request, so an unchanged sheet is not downloaded again).
+        """
+        meta = self._read_meta(url)
+        if meta is None:
+            return self._revalidate(url)
+
+        age = self.clock() - meta['fetched_at']
+        if force or age > self.ttl + self.stale_ttl:
+            try:
+                return self._revalidate(url)
+            except (urllib.error.URLError, OSError):
+                if force:
+                    raise
+                return self._result(url, stale=True)
+
+        if age > self.ttl:
+            self.refresh_async(url)
+            return self._result(url, stale=True)
+        return self._result(url, stale=False)
+
+    def refresh_async(self, url):
+        """Starts a background revalidation unless one is already running."""
+        with self._lock:
+            thread = self._refreshing.get(url)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(target=self._refresh_quietly, args=(url,), daemon=True)
+            self._refreshing[url] = thread
+        thread.start()
+        return thread
+
+    def is_refreshing(self, url):
+        with self._lock:
+            thread = self._refreshing.get(url)
+            return thread is not None and thread.is_alive()
+
+    def _refresh_quietly(self, url):
+        try:
+            self._revalidate(url)
+        except (urllib.error.URLError, OSError):
+            # Keep serving the stale copy; the next fetch retries
+            pass
+
+    def _revalidate(self, url):
+        meta = self._read_meta(url)
+        request = urllib.request.Request(url)
+        if meta is not None:
+            if meta.get('etag'):
+                request.add_header('If-None-Match', meta['etag'])
+            if meta.get('last_modified'):
+                request.add_header('If-Modified-Since', meta['last_modified'])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or meta is None:
+                raise
+            # Not modified: only the freshness timestamp changes
+            meta['fetched_at'] = self.clock()
+            with self._io_lock:
+                self._write_meta(url, meta)
+            return self._result(url, stale=False)
+
+        digest = hashlib.sha256(content).hexdigest()
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'digest': digest,
+            'fetched_at': self.clock(),
+        }
+        with self._io_lock:
+            self._write_atomic(self._path(url, '.body'), content)
+            self._write_meta(url, meta)
+        return FetchResult(content, digest, meta['fetched_at'], stale=False)
+
+    def _result(self, url, stale):
+        with self._io_lock:
+            meta = self._read_meta(url)
+            with open(self._path(url, '.body'), 'rb') as f:
+                content = f.read()
+        return FetchResult(content, meta['digest'], meta['fetched_at'], stale=stale)
+
+    def _path(self, url, suffix):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + suffix)
+
+    def _read_meta(self, url):
+        try:
+            with open(self._path(url, '.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._path(url, '.body')):
+            return None
+        return meta
+
+    def _write_meta(self, url, meta):
+        self._write_atomic(self._path(url, '.json'), json.dumps(meta).encode('utf-8'))
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
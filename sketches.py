@@ -0,0 +1,189 @@
+"""Mergeable quantile sketches of the metric columns, for slider ranges and distribution summaries.
+
+A ``QuantileSketch`` is a histogram over logarithmic buckets: bucket ``i``
+holds the values in ``(gamma**(i-1), gamma**i]``, so every quantile it
+reports is within ``relative_accuracy`` (1%) of a value of the data. Its size
+is bounded by ``max_buckets`` whatever the row count; past that, the lowest
+buckets are folded together. Sketches with the same accuracy merge by adding
+bucket counts, so sketches of separate files or periods combine without
+their rows.
+"""
+import math
+
+import numpy as np
+
+from normalize import COUNT_COLS, RATE_COLS
+
+RELATIVE_ACCURACY = 0.01
+MAX_BUCKETS = 2048
+SUMMARY_QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+class _Buckets:
+    """Dense counts for bucket indexes ``offset .. offset + len(counts) - 1``."""
+
+    def __init__(self, offset=0, counts=None):
+        self.offset = offset
+        self.counts = np.zeros(0, dtype='int64') if counts is None else counts
+
+    def add(self, index, counts):
+        """Adds ``counts`` (aligned to indexes ``index .. index + len(counts) - 1``)."""
+        if not len(counts):
+            return
+        if not len(self.counts):
+            self.offset, self.counts = index, counts.astype('int64')
+            return
+        lo = min(self.offset, index)
+        hi = max(self.offset + len(self.counts), index + len(counts))
+        merged = np.zeros(hi - lo, dtype='int64')
+        merged[self.offset - lo:self.offset - lo + len(self.counts)] += self.counts
+        merged[index - lo:index - lo + len(counts)] += counts
+        self.offset, self.counts = lo, merged
+
+    def collapse(self, max_buckets):
+        """Folds the lowest buckets into one when there are more than ``max_buckets``."""
+        extra = len(self.counts) - max_buckets
+        if extra > 0:
+            self.counts[extra] += self.counts[:extra].sum()
+            self.counts, self.offset = self.counts[extra:], self.offset + extra
+
+    def copy(self):
+        return _Buckets(self.offset, self.counts.copy())
+
+
+class QuantileSketch:
+    """Approximate distribution of one column: counts, extremes, mean and quantiles."""
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, max_buckets=MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._positive = _Buckets()
+        self._negative = _Buckets()  # Indexed by the magnitude of the value
+        self.zeros = 0
+        self.missing = 0
+        self.count = 0  # Values present, zeros included
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        """Adds an array or Series of values; NaN and infinities count as missing."""
+        values = np.asarray(values, dtype='float64')
+        present = np.isfinite(values)
+        self.missing += int(len(values) - present.sum())
+        values = values[present]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.zeros += int((values == 0).sum())
+        for store, part in ((self._positive, values[values > 0]), (self._negative, -values[values < 0])):
+            if len(part):
+                index = np.ceil(np.log(part) / self._log_gamma).astype('int64')
+                lo = int(index.min())
+                store.add(lo, np.bincount(index - lo))
+                # Precision is given up where it matters least: near zero
+                store.collapse(self.max_buckets)
+        return self
+
+    def merge(self, other):
+        """Sketch of both inputs; ``other`` must use the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        merged = QuantileSketch(self.relative_accuracy, self.max_buckets)
+        merged._positive, merged._negative = self._positive.copy(), self._negative.copy()
+        merged._positive.add(other._positive.offset, other._positive.counts)
+        merged._negative.add(other._negative.offset, other._negative.counts)
+        merged._positive.collapse(self.max_buckets)
+        merged._negative.collapse(self.max_buckets)
+        merged.zeros = self.zeros + other.zeros
+        merged.missing = self.missing + other.missing
+        merged.count = self.count + other.count
+        merged.total = self.total + other.total
+        merged.min, merged.max = min(self.min, other.min), max(self.max, other.max)
+        return merged
+
+    __add__ = merge
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def _value(self, index):
+        """Representative value of positive bucket ``index``: within the accuracy of both edges."""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantiles(self, qs):
+        """Approximate values at the quantiles ``qs`` (NaN for an empty sketch)."""
+        qs = np.atleast_1d(np.asarray(qs, dtype='float64'))
+        if not self.count:
+            return np.full(len(qs), math.nan)
+        # Ascending order: negative buckets from the largest magnitude, zeros, positive buckets
+        neg, pos = self._negative, self._positive
+        neg_index = neg.offset + np.arange(len(neg.counts))[::-1]
+        pos_index = pos.offset + np.arange(len(pos.counts))
+        values = np.concatenate([-self._value(neg_index), [0.0], self._value(pos_index)])
+        counts = np.concatenate([neg.counts[::-1], [self.zeros], pos.counts])
+        ranks = np.clip(np.floor(qs * (self.count - 1)), 0, self.count - 1)
+        result = values[np.searchsorted(np.cumsum(counts), ranks, side='right')]
+        # Exact extremes, and never outside them
+        return np.clip(np.where(qs <= 0, self.min, np.where(qs >= 1, self.max, result)), self.min, self.max)
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def summary(self, qs=SUMMARY_QUANTILES):
+        """Count, missing, mean, min, the ``qs`` quantiles (``p1``, ``p25``...) and max."""
+        summary = {'count': self.count, 'missing': self.missing, 'mean': self.mean,
+                   'min': self.min if self.count else math.nan}
+        summary.update({f"p{q * 100:g}": float(v) for q, v in zip(qs, self.quantiles(qs))})
+        summary['max'] = self.max if self.count else math.nan
+        return summary
+
+    @property
+    def nbytes(self):
+        return self._positive.counts.nbytes + self._negative.counts.nbytes
+
+
+def sketch_columns(frame, columns=None):
+    """One sketch per metric column of ``frame`` (default: every count and rate column present)."""
+    columns = [c for c in (columns or COUNT_COLS + RATE_COLS) if c in frame.columns]
+    return {col: QuantileSketch().add(frame[col].to_numpy(dtype='float64', na_value=np.nan)) for col in columns}
+
+
+def merge_sketches(sketch_sets):
+    """Column-wise merge of several ``sketch_columns`` results."""
+    merged = {}
+    for sketches in sketch_sets:
+        for col, sketch in sketches.items():
+            merged[col] = merged[col] + sketch if col in merged else sketch
+    return merged
+
+
+def nice_step(span, steps=50):
+    """A 1/2/5 x 10^k step dividing ``span`` into about ``steps`` steps."""
+    if not span > 0:
+        return 1
+    raw = span / steps
+    magnitude = 10 ** math.floor(math.log10(raw))
+    return next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+
+
+def slider_bounds(sketch, upper_quantile=0.99, steps=50, integer=False):
+    """``(max_value, step)`` for a threshold slider from 0: the upper quantile, rounded up to a step."""
+    upper = sketch.quantile(upper_quantile) if sketch.count else 0
+    step = nice_step(upper, steps)
+    if integer:
+        step = max(1, int(step))
+    return max(step, math.ceil(upper / step) * step), step
+
+
+def round_significant(value, digits=2):
+    """``value`` to ``digits`` significant digits, for data-aware widget defaults."""
+    if not value or not math.isfinite(value):
+        return 0.0
+    return round(value, digits - 1 - math.floor(math.log10(abs(value))))
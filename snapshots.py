@@ -0,0 +1,103 @@
+"""Local catalog of normalized datasets, stored as Arrow IPC snapshots.
+
+Snapshots are uncompressed Arrow IPC files, so opening one memory-maps the
+file instead of re-parsing and re-cleaning the raw source. ``catalog.json``
+keeps the metadata: source, row count, schema, dt range and the ingestion
+reports.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser("~"), ".data-analyzer", "snapshots")
+
+
+class SnapshotCatalog:
+    def __init__(self, root=DEFAULT_SNAPSHOT_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def _catalog_path(self):
+        return os.path.join(self.root, "catalog.json")
+
+    def entries(self):
+        """Catalog entries, newest first."""
+        try:
+            with open(self._catalog_path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return sorted(entries, key=lambda e: e['created_at'], reverse=True)
+
+    def save(self, df, name, source, fingerprint):
+        """Writes ``df`` as a snapshot; saving the same fingerprint again replaces it."""
+        import pyarrow as pa
+
+        snapshot_id = fingerprint.split(':')[-1][:16]
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        path = self._snapshot_path(snapshot_id)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.arrow')
+        os.close(fd)
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        dt = df['dt']
+        has_dates = pd.api.types.is_datetime64_any_dtype(dt) and dt.notna().any()
+        entry = {
+            'id': snapshot_id,
+            'name': name,
+            'source': source,
+            'fingerprint': fingerprint,
+            'rows': len(df),
+            'schema': {col: str(dtype) for col, dtype in df.dtypes.items()},
+            'dt_min': dt.min().isoformat() if has_dates else None,
+            'dt_max': dt.max().isoformat() if has_dates else None,
+            'bytes': os.path.getsize(path),
+            'created_at': time.time(),
+            'attrs': df.attrs,
+        }
+        with self._lock:
+            entries = [e for e in self.entries() if e['id'] != snapshot_id]
+            entries.append(entry)
+            self._write_catalog(entries)
+        return entry
+
+    def load(self, snapshot_id):
+        """Memory-maps a snapshot and returns it as a DataFrame (dtypes preserved)."""
+        import pyarrow as pa
+
+        # The map stays open for as long as the returned frame references it
+        source = pa.memory_map(self._snapshot_path(snapshot_id), 'r')
+        df = pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+        entry = next((e for e in self.entries() if e['id'] == snapshot_id), None)
+        if entry is not None:
+            df.attrs.update(entry.get('attrs', {}))
+        return df
+
+    def delete(self, snapshot_id):
+        with self._lock:
+            self._write_catalog([e for e in self.entries() if e['id'] != snapshot_id])
+        try:
+            os.unlink(self._snapshot_path(snapshot_id))
+        except FileNotFoundError:
+            pass
+
+    def _snapshot_path(self, snapshot_id):
+        return os.path.join(self.root, f"{snapshot_id}.arrow")
+
+    def _write_catalog(self, entries):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._catalog_path)
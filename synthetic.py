@@ -0,0 +1,94 @@
+"""Synthetic analytics sheets in the app's raw schema, for benchmarks.
+
+Frames look like a sheet export: Chinese headers with decorations the
+fuzzy matcher has to see through, an extra unused column, dates as
+YYYYMMDD numbers, counts with thousands separators, rates as percent
+strings, and a sprinkling of blank and malformed cells.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+RAW_HEADERS = {
+    'dt': 'dt',
+    'title': '文章 title',
+    '卡片曝光uv': '卡片曝光uv (人)',
+    '頁面訪問uv': '頁面訪問uv',
+    '文章訪問率': '文章訪問率 %',
+    '行動點點擊uv (入口+詳情)': '行動點點擊uv (入口+詳情)',
+    '功能轉化率': '功能轉化率',
+}
+EXTRA_COLUMN = '備註 (notes)'
+TITLE_WORDS = ['錢包', '教學', '空投', '質押', '安全', '新手', '合約', '跨鏈', '活動', '指南']
+
+
+def _format_each_distinct(values, fmt):
+    """Formats every distinct value once; columns repeat values a lot."""
+    codes, uniques = pd.factorize(values)
+    return np.array([fmt.format(v) for v in uniques.tolist()], dtype=object)[codes]
+
+
+def _format_thousands(values):
+    return _format_each_distinct(values, "{:,}")
+
+
+def _format_percent(values):
+    return _format_each_distinct(np.round(values, 4), "{:.2%}")
+
+
+def synthetic_frame(rows, seed=0, titles=None, days=90, noise=0.002):
+    """Raw frame of ``rows`` rows, as ``pd.read_csv`` would return it for a sheet export."""
+    rng = np.random.default_rng(seed)
+    titles = titles or max(rows // 30, 10)
+    title_ids = rng.integers(0, titles, rows)
+    words = np.array(TITLE_WORDS)
+    title_names = np.char.add(
+        np.char.add(words[np.arange(titles) % len(words)], words[(np.arange(titles) // len(words)) % len(words)]),
+        np.char.mod(' #%d', np.arange(titles)),
+    )
+
+    exposure = rng.lognormal(7, 1.5, rows).astype('int64') + 1
+    visits = (exposure * rng.beta(2, 20, rows)).astype('int64')
+    clicks = (visits * rng.beta(2, 8, rows)).astype('int64')
+    calendar = pd.date_range('2025-01-01', periods=days, freq='D')
+    yyyymmdd = (calendar.year * 10000 + calendar.month * 100 + calendar.day).to_numpy()
+
+    article_rate = np.divide(visits, exposure)
+    conv_rate = np.divide(clicks, visits, out=np.zeros(rows), where=visits > 0)
+    raw = pd.DataFrame({
+        RAW_HEADERS['dt']: yyyymmdd[rng.integers(0, days, rows)],
+        RAW_HEADERS['title']: title_names[title_ids],
+        RAW_HEADERS['卡片曝光uv']: _format_thousands(exposure),
+        RAW_HEADERS['頁面訪問uv']: visits,
+        RAW_HEADERS['文章訪問率']: _format_percent(article_rate),
+        RAW_HEADERS['行動點點擊uv (入口+詳情)']: _format_thousands(clicks),
+        RAW_HEADERS['功能轉化率']: _format_percent(conv_rate),
+        EXTRA_COLUMN: np.where(rng.random(rows) < 0.1, '置頂', ''),
+    })
+
+    # Blank and malformed cells, as hand-edited sheets have them
+    for col in (RAW_HEADERS['卡片曝光uv'], RAW_HEADERS['文章訪問率'], RAW_HEADERS['功能轉化率']):
+        hit = np.flatnonzero(rng.random(rows) < noise)
+        raw.loc[hit[::2], col] = '-'
+        raw.loc[hit[1::2], col] = 'N/A ?'
+    return raw
+
+
+def to_csv_text(raw, sep=','):
+    """The frame as a Sheets CSV export (``sep=','``) or a pasted Excel range (``sep='\\t'``)."""
+    return raw.to_csv(sep=sep, index=False)
+
+
+def to_xlsx_bytes(raw):
+    """The frame as a one-sheet workbook (at most Excel's 1,048,575 data rows)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(list(raw.columns))
+    for row in raw.itertuples(index=False, name=None):
+        ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
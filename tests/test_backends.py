@@ -0,0 +1,20 @@
+import pytest
+
+from backends import BACKENDS, check_engine
+from normalize import normalize_frame
+from synthetic import synthetic_frame
+
+# Modules each engine needs besides pandas; engines that are not installed are skipped
+REQUIRES = {'pandas': (), 'duckdb': ('pyarrow', 'duckdb'), 'polars': ('pyarrow', 'polars')}
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return normalize_frame(synthetic_frame(5_000))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_engine_matches_pandas(frame, backend):
+    for module in REQUIRES[backend]:
+        pytest.importorskip(module)
+    assert check_engine(frame, backend) == []
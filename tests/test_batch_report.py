@@ -0,0 +1,40 @@
+import json
+import os
+
+from batch_report import DEFAULT_CONFIG, generate_reports, load_config
+
+
+def test_reports_are_written_per_input_and_failures_recorded(tmp_path, raw_frame):
+    first, second = tmp_path / 'channel.csv', tmp_path / 'more' / 'channel.csv'
+    second.parent.mkdir()
+    for path in (first, second):
+        raw_frame.to_csv(path, index=False)
+    paths = [str(first), str(tmp_path / 'missing.csv'), str(second)]
+
+    results = generate_reports(paths, load_config(), str(tmp_path / 'out'), jobs=2)
+    assert [r['status'] for r in results] == ['ok', 'failed', 'ok']
+    assert results[1]['error'].startswith('FileNotFoundError')
+    # Inputs with the same name get distinct report names
+    assert [os.path.basename(p) for p in results[0]['outputs']] == ['channel.html', 'channel.md']
+    assert [os.path.basename(p) for p in results[2]['outputs']] == ['channel-2.html', 'channel-2.md']
+    assert all(os.path.getsize(p) > 0 for r in results for p in r['outputs'])
+    assert list(results[0]['timings']) == ['load', 'normalize', 'filter', 'charts', 'export']
+    assert results[0]['rows'] == len(raw_frame)
+
+
+def test_config_overrides_nested_keys_without_touching_the_defaults(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({
+        'overview': {'max_points': 50},
+        'charts': [{'type': 'generic', 'metric': '文章訪問率', 'top_n': 3, 'chart_type': 'Bar (長條)'}],
+    }), encoding='utf-8')
+    defaults = json.dumps(DEFAULT_CONFIG, sort_keys=True)
+
+    config = load_config(str(path))
+    assert config['overview'] == {'max_points': 50, 'webgl_rows': 150}
+    assert config['charts'] == [{'type': 'generic', 'metric': '文章訪問率', 'top_n': 3,
+                                 'chart_type': 'Bar (長條)', 'filters': {}}]
+
+    config['charts'][0]['filters']['卡片曝光uv'] = 1
+    load_config()['overview']['max_points'] = 1
+    assert json.dumps(DEFAULT_CONFIG, sort_keys=True) == defaults
@@ -0,0 +1,61 @@
+import pandas as pd
+
+import charts
+from charts import FigureCache, build_generic_figure, figure_key
+from report import create_html_report
+
+CONFIG = {'type': 'generic', 'metric': '功能轉化率', 'top_n': 6, 'chart_type': 'Bar (長條)', 'filters': {'卡片曝光uv': 400}}
+TOP = pd.DataFrame({
+    'title': ['a', 'b'], '卡片曝光uv': [900, 500], '頁面訪問uv': [90, 40], '文章訪問率': [0.1, 0.08],
+    '行動點點擊uv (入口+詳情)': [18, 4], '功能轉化率': [0.2, 0.1],
+})
+
+
+def build():
+    return build_generic_figure(TOP, '功能轉化率', 'Bar (長條)', '#00f2fe')
+
+
+def test_figure_key_follows_config_and_layout(monkeypatch):
+    key = figure_key('dataset', 'day', CONFIG, 1)
+    assert key == figure_key('dataset', 'day', dict(reversed(list(CONFIG.items()))), 1)
+    assert key != figure_key('dataset', 'day', {**CONFIG, 'top_n': 7}, 1)
+    assert key != figure_key('dataset', 'day', {**CONFIG, 'filters': {'卡片曝光uv': 500}}, 1)
+    assert key != figure_key('dataset', 'week', CONFIG, 1)
+    assert key != figure_key('other', 'day', CONFIG, 1)
+    assert key != figure_key('dataset', 'day', CONFIG, 2)
+
+    monkeypatch.setattr(charts, 'CHART_LAYOUT', {**charts.CHART_LAYOUT, 'template': 'plotly_white'})
+    assert key != figure_key('dataset', 'day', CONFIG, 1)
+
+
+def test_same_key_hits_and_other_keys_miss():
+    cache = FigureCache(max_entries=2)
+    calls = []
+
+    def counted():
+        calls.append(1)
+        return build()
+
+    first = cache.get_or_build('a', counted)
+    assert cache.get_or_build('a', counted) is first
+    cache.get_or_build('b', counted)
+    assert (len(calls), cache.hits, cache.misses) == (2, 1, 2)
+
+    cache.get_or_build('a', counted)  # 'b' is now the least recently used
+    cache.get_or_build('c', counted)
+    assert len(cache) == 2
+    cache.get_or_build('b', counted)
+    assert len(calls) == 4 and cache.hit_rate == 2 / 6
+
+
+def test_cached_figures_are_not_mutated_by_their_users():
+    cache = FigureCache()
+    fig = cache.get_or_build('a', build)
+    before = fig.to_json()
+
+    create_html_report(TOP, 'summary', [fig, fig], plotlyjs='cdn')
+    create_html_report(TOP, 'summary', [fig], plotlyjs='inline', compress=True)
+    fig.to_plotly_json()
+
+    assert cache.get_or_build('a', build) is fig
+    assert fig.to_json() == before
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from coerce import coerce_numeric
+
+
+def test_decorated_cells_are_coerced_and_counted():
+    values, report = coerce_numeric(pd.Series(['1,234', '12.5% ▼', '987 ↑', '7', '', 'n/a', None, 'oops'], name='c'))
+
+    np.testing.assert_allclose(values.to_numpy(), [1234, 0.125, 987, 7, np.nan, np.nan, np.nan, np.nan])
+    assert (report.total, report.numeric, report.coerced, report.blank, report.failed) == (8, 1, 3, 3, 1)
+    assert report.failed_examples == ['oops']
+
+
+def test_numeric_columns_pass_through():
+    values, report = coerce_numeric(pd.Series([1, 2, None], name='c', dtype='float64'))
+    np.testing.assert_array_equal(values.to_numpy(), [1, 2, np.nan])
+    assert (report.numeric, report.blank, report.coerced) == (2, 1, 0)
+
+
+def test_rates_mix_percent_and_fraction_cells():
+    values, report = coerce_numeric(pd.Series(['12.5%', '0.125', '50%'] * 100 + ['bad'], name='rate'))
+    np.testing.assert_allclose(values.to_numpy()[:3], [0.125, 0.125, 0.5])
+    assert (report.numeric, report.coerced, report.failed) == (100, 200, 1)
+
+
+def test_full_width_digits_and_signs_are_coerced():
+    values, report = coerce_numeric(pd.Series(['５０％', '１，２３４', '－３', '１２．５ ▲', '12%', '　', 'abc'], name='rate'))
+
+    np.testing.assert_allclose(values.to_numpy(), [0.5, 1234, -3, 12.5, 0.12, np.nan, np.nan])
+    assert (report.coerced, report.blank, report.failed) == (5, 1, 1)
+    assert report.failed_examples == ['abc']
+
+
+def test_repetitive_full_width_column_is_coerced():
+    values, report = coerce_numeric(pd.Series(['５０％', '２５％'] * 100, name='rate'))
+
+    np.testing.assert_allclose(values.to_numpy(), [0.5, 0.25] * 100)
+    assert report.coerced == 200 and report.failed == 0
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import METRIC_COLS, average_ranks, correlate, density_grid
+
+
+def metric_frame(seed, rows=500):
+    rng = np.random.default_rng(seed)
+    exposure = rng.lognormal(7, 1, rows).round()
+    visits = (exposure * rng.beta(2, 20, rows)).round()
+    frame = pd.DataFrame({
+        '卡片曝光uv': exposure,
+        '頁面訪問uv': visits,
+        '行動點點擊uv (入口+詳情)': rng.integers(0, 5, rows).astype('float64'),  # Heavily tied
+        '文章訪問率': visits / exposure,
+        '功能轉化率': rng.choice([0.0, 0.1, 0.25], rows),                         # Heavily tied
+    })
+    frame.iloc[rng.choice(rows, 20), 1] = np.nan
+    return frame
+
+
+def expected(frame, method):
+    # correlate drops every row missing any metric; DataFrame.corr works pairwise
+    return frame.dropna().corr(method=method)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_matrices_match_pandas(seed):
+    frame = metric_frame(seed)
+    result = correlate(frame)
+    assert result.rows == len(frame.dropna())
+    pd.testing.assert_frame_equal(result.pearson, expected(frame, 'pearson'), atol=1e-10, rtol=0)
+    pd.testing.assert_frame_equal(result.spearman, expected(frame, 'spearman'), atol=1e-10, rtol=0)
+
+
+def test_constant_and_empty_columns_correlate_with_nothing():
+    frame = metric_frame(0).assign(功能轉化率=0.5)
+    result = correlate(frame)
+    assert result.pearson['功能轉化率'].isna().all() and result.spearman.loc['功能轉化率'].isna().all()
+    pd.testing.assert_frame_equal(result.pearson, expected(frame, 'pearson'), atol=1e-10, rtol=0)
+
+    # An all-NaN column leaves no complete row
+    result = correlate(metric_frame(0).assign(功能轉化率=np.nan))
+    assert result.rows == 0 and result.pearson.isna().all().all()
+    assert list(result.pearson.columns) == METRIC_COLS
+
+
+def test_average_ranks_match_pandas():
+    values = np.array([3.0, 1.0, 3.0, 2.0, 3.0, 1.0])
+    np.testing.assert_array_equal(average_ranks(values), pd.Series(values).rank(method='average').to_numpy())
+
+
+def test_density_grid_counts_rows_with_both_values():
+    frame = metric_frame(1)
+    grid = density_grid(frame, '卡片曝光uv', '文章訪問率', bins=20)
+    assert grid.counts.shape == (20, 20)
+    assert grid.counts.sum() == grid.rows == frame[['卡片曝光uv', '文章訪問率']].dropna().shape[0]
+    assert grid.log_x and not grid.log_y
+    assert grid.x_edges[0] == pytest.approx(frame['卡片曝光uv'].min())
+    assert grid.x_edges[-1] == pytest.approx(frame['卡片曝光uv'].max())
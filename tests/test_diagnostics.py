@@ -0,0 +1,42 @@
+import json
+
+from diagnostics import NULL_TRACE, RerunTrace
+
+
+def test_stages_are_recorded_in_order():
+    trace = RerunTrace(rerun_id=3, track_memory=True, source='paste')
+    with trace.stage('load', rows=10) as record:
+        record['bytes'] = 640
+    with trace.stage('charts'):
+        data = [0] * 100_000
+    del data
+    trace.finish()
+
+    load, charts, total = trace.records()
+    assert (load['stage'], load['rows'], load['bytes']) == ('load', 10, 640)
+    assert charts['stage'] == 'charts' and charts['peak_bytes'] > 0
+    assert total['stage'] == 'total' and total['seconds'] >= load['seconds'] + charts['seconds']
+    assert all(r['rerun'] == 3 and r['source'] == 'paste' for r in (load, charts, total))
+
+
+def test_records_before_finish_have_no_totals():
+    trace = RerunTrace()
+    with trace.stage('load'):
+        pass
+    total = trace.records()[-1]
+    assert total['seconds'] is None and total['max_rss_bytes'] is None
+
+
+def test_json_lines_round_trip():
+    trace = RerunTrace(rerun_id='r1', title='標題')
+    with trace.stage('load'):
+        pass
+    lines = trace.finish().to_json_lines().splitlines()
+    assert [json.loads(line)['stage'] for line in lines] == ['load', 'total']
+    assert '標題' in lines[0]  # Kept readable, not \u-escaped
+
+
+def test_null_trace_stages_are_no_ops():
+    with NULL_TRACE.stage('load', rows=1) as record:
+        record['bytes'] = 1
+    assert NULL_TRACE.finish() is NULL_TRACE and not NULL_TRACE.enabled
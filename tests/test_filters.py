@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import raw_rows
+from core import Analysis
+from filters import MaskCache, SortIndex
+from incremental import AppendLog
+from normalize import COUNT_COLS, RATE_COLS
+
+
+@pytest.fixture
+def titles():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'title': [f"t{i}" for i in range(200)],
+        '卡片曝光uv': rng.integers(0, 1_000, 200),
+        '頁面訪問uv': rng.integers(0, 100, 200).astype('float64'),
+    })
+
+
+def test_masks_are_cached_per_column_and_threshold(titles):
+    engine = MaskCache(titles)
+    mask = engine.mask('卡片曝光uv', 400)
+    assert engine.mask('卡片曝光uv', 400.0) is mask
+    assert (engine.hits, engine.misses) == (1, 1)
+    np.testing.assert_array_equal(mask, titles['卡片曝光uv'] > 400)
+    assert not mask.flags.writeable
+
+
+def test_filters_combine_with_and(titles):
+    engine = MaskCache(titles)
+    filters = {'卡片曝光uv': 400, '頁面訪問uv': 50}
+    expected = titles[(titles['卡片曝光uv'] > 400) & (titles['頁面訪問uv'] > 50)]
+
+    assert engine.count(filters) == len(expected)
+    assert engine.count({}) == len(titles)
+    for column in ('卡片曝光uv', '頁面訪問uv'):
+        pd.testing.assert_frame_equal(engine.top_n(filters, column, 10), expected.nlargest(10, column))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sort_index_matches_nlargest_and_threshold_scans(seed):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, 50, 500).astype('float64')
+    values[rng.choice(500, 20)] = np.nan
+    mask = rng.random(500) < 0.3
+    index, series = SortIndex(values), pd.Series(values)
+
+    np.testing.assert_array_equal(index.top(10), series.nlargest(10).index)
+    np.testing.assert_array_equal(index.top(10, mask), series[mask].nlargest(10).index)
+    for threshold in (-1, 0, 25, 49, 100):
+        assert index.count_above(threshold) == np.count_nonzero(values > threshold)
+        np.testing.assert_array_equal(np.sort(index.above(threshold)), np.flatnonzero(values > threshold))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sort_index_update_matches_full_sort(seed):
+    rng = np.random.default_rng(seed)
+    old = rng.integers(0, 20, 200).astype('float64')
+    old[rng.choice(200, 10)] = np.nan
+    # Insert 30 rows between the old ones and change 25 of the old ones
+    inserted = np.sort(rng.choice(230, 30, replace=False))
+    positions = np.setdiff1d(np.arange(230), inserted)
+    values = np.empty(230)
+    values[positions] = old
+    values[inserted] = rng.integers(0, 20, 30)
+    changed = positions[rng.choice(200, 25, replace=False)]
+    values[changed] = rng.integers(0, 20, 25)
+    touched = np.union1d(inserted, changed)
+
+    updated = SortIndex(old).updated(values, touched, positions)
+    fresh = SortIndex(values)
+    np.testing.assert_array_equal(updated.order, fresh.order)
+    np.testing.assert_array_equal(updated.ascending, fresh.ascending)
+
+
+def test_title_engine_delta_matches_rebuild(raw_frame):
+    log = AppendLog(raw_frame.copy())
+    analysis = Analysis(log.df, key='first')
+    engine = analysis.masks
+    # Warm the masks and indexes that the append has to patch
+    for column in COUNT_COLS + RATE_COLS:
+        engine.top_n({'卡片曝光uv': 900}, column, 3)
+    engine.rows_above('卡片曝光uv', 0)
+
+    raw = pd.concat([raw_frame, raw_rows([
+        ('2026-01-04', 'aa', 5_000, 400, 40),   # New title between 'a' and 'b'
+        ('2026-01-04', 'b', 600, 60, 6),        # Existing title
+        ('2026-01-05', '0', 100, 10, 1),        # New first title
+    ])], ignore_index=True)
+    previous = log.df
+    delta = log.append(raw.copy())
+    analysis.apply_delta(log.df, 'second', delta, previous)
+
+    assert analysis.masks is engine
+    fresh = MaskCache(analysis.titles)
+    for filters in ({}, {'卡片曝光uv': 900}, {'卡片曝光uv': 900, '頁面訪問uv': 100}):
+        assert engine.count(filters) == fresh.count(filters)
+        for column in COUNT_COLS + RATE_COLS:
+            pd.testing.assert_frame_equal(engine.top_n(filters, column, 3), fresh.top_n(filters, column, 3))
+    for threshold in (0, 900, 5_000):
+        pd.testing.assert_frame_equal(engine.rows_above('卡片曝光uv', threshold), fresh.rows_above('卡片曝光uv', threshold))
+
+
+def test_filters_on_columns_missing_from_the_title_table_are_skipped(raw_frame):
+    raw = raw_frame.assign(**{'備註 (notes)': 'x'})
+    analysis = Analysis(AppendLog(raw).df)
+    engine = analysis.masks
+
+    assert '備註 (notes)' in analysis.df.columns
+    assert engine.filter_columns == COUNT_COLS + RATE_COLS
+    assert engine.count({'備註 (notes)': 0}) == len(analysis.titles)
+    assert engine.count({'備註 (notes)': 0, '卡片曝光uv': 900}) == engine.count({'卡片曝光uv': 900})
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from conftest import raw_rows
+from incremental import AppendLog
+from normalize import COUNT_COLS, normalize_frame
+
+
+def assert_same_rows(merged, expected):
+    columns = ['dt', 'title', *COUNT_COLS]
+    dtypes = {'title': str, **{c: 'float64' for c in COUNT_COLS}}
+    pd.testing.assert_frame_equal(merged[columns].astype(dtypes), expected[columns].astype(dtypes))
+
+
+def test_append_upserts_changed_rows_by_dt_and_title(raw_frame):
+    log = AppendLog(raw_frame.copy())
+    raw = pd.concat([raw_frame, raw_rows([
+        ('2026-01-04', 'd', 700, 70, 7),
+        ('2026-01-04', 'd', 800, 80, 8),  # Same key again: the last occurrence wins
+    ])], ignore_index=True)
+    raw.loc[2, '卡片曝光uv'] = '600'  # Corrected ('2026-01-02', 'b') row
+    delta = log.append(raw.copy())
+
+    assert list(delta.updated) == [2] and delta.appended == 1 and delta.unchanged == 4
+    assert list(delta.touched) == [2, 5]
+    assert_same_rows(log.df, normalize_frame(raw.drop(index=5).reset_index(drop=True)))
+
+
+def test_rows_deleted_from_the_source_are_kept(raw_frame):
+    log = AppendLog(raw_frame.copy())
+    delta = log.append(raw_frame.iloc[:-1].copy())
+
+    assert not delta and len(log.df) == len(raw_frame)
+    assert_same_rows(log.df, normalize_frame(raw_frame.copy()))
+
+
+def test_append_recounts_coercion_of_corrected_rows(raw_frame):
+    raw = raw_frame.copy()
+    raw.loc[1, '行動點點擊uv (入口+詳情)'] = 'oops'
+    log = AppendLog(raw.copy())
+
+    # Row 1 is corrected (its failed cell now parses), one row is new
+    raw = pd.concat([raw_frame, raw_rows([('2026-01-04', 'd', 700, 70, 7)])], ignore_index=True)
+    log.append(raw.copy())
+
+    expected = normalize_frame(raw.copy()).attrs['coercion']
+    assert log.df.attrs['coercion'] == expected
+    assert log.df.attrs['coercion']['行動點點擊uv (入口+詳情)']['failed'] == 0
+
+
+def test_corrections_do_not_grow_the_memory_totals(raw_frame):
+    log = AppendLog(raw_frame.copy())
+    bytes_before = log.df.attrs['memory']['bytes_before']
+
+    raw = raw_frame.copy()
+    raw.loc[0, '卡片曝光uv'] = '1,100'
+    delta = log.append(raw)
+
+    assert len(delta.updated) == 1 and not delta.appended
+    assert len(log.df) == len(raw_frame)
+    assert log.df.attrs['memory']['bytes_before'] == bytes_before
+    assert log.df.attrs['coercion']['卡片曝光uv']['total'] == len(raw_frame)
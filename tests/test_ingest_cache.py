@@ -0,0 +1,86 @@
+import gc
+
+import pandas as pd
+
+from ingest_cache import IngestCache, frame_nbytes, source_key
+
+
+def frame(rows, value=0):
+    return pd.DataFrame({'title': [f"t{i}" for i in range(rows)], 'value': [value] * rows})
+
+
+def test_equal_content_gives_equal_keys():
+    data = bytes(range(256)) * 4
+    assert source_key('excel', data) == source_key('excel', bytes(bytearray(data)))
+    assert source_key('paste', "dt\ttitle\n") == source_key('paste', "dt\ttitle\n".encode('utf-8'))
+    assert source_key('sheets', 'https://example.com/a', '0') == source_key('sheets', 'https://example.com/a', '0')
+
+    assert source_key('excel', data) != source_key('excel', data + b'\0')
+    assert source_key('excel', data) != source_key('paste', data)
+    # Parts are delimited, so moving bytes between them changes the key
+    assert source_key('sheets', 'ab', 'c') != source_key('sheets', 'a', 'bc')
+
+
+def test_budget_evicts_least_recently_used_first():
+    size = frame_nbytes(frame(100))
+    cache = IngestCache(budget_bytes=2 * size)
+    cache.put('a', frame(100))
+    cache.put('b', frame(100))
+    assert cache.get('a') is not None  # 'b' is now the least recently used
+
+    cache.put('c', frame(100))
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.total_bytes == 2 * size
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_new_frame_stays_even_over_budget():
+    cache = IngestCache(budget_bytes=1)
+    cache.put('a', frame(10))
+    cache.put('b', frame(10))
+    assert 'a' not in cache and 'b' in cache
+
+
+def test_referenced_dataset_survives_budget_pressure():
+    size = frame_nbytes(frame(100))
+    cache = IngestCache(budget_bytes=size)
+    cache.put('a', frame(100))
+    ref = cache.reference('a')
+    cache.put('b', frame(100))
+    cache.put('c', frame(100))
+
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.evict_unreferenced() == size  # 'c'
+    assert 'a' in cache
+    assert cache.entries()[0]['refs'] == 1
+    ref.release()
+    assert ref.released
+
+
+def test_dataset_is_evictable_once_its_last_ref_is_dropped():
+    cache = IngestCache(budget_bytes=10 ** 9)
+    cache.put('a', frame(100))
+    first, second = cache.reference('a'), cache.reference('a')
+    assert cache.reference('missing') is None
+
+    del first
+    gc.collect()
+    assert cache.evict_unreferenced() == 0
+    del second  # The finalizer releases the claim
+    gc.collect()
+    assert cache.entries()[0]['refs'] == 0
+    assert cache.evict_unreferenced() > 0 and 'a' not in cache
+
+
+def test_views_do_not_alias_the_shared_frame():
+    cache = IngestCache()
+    original = frame(3)
+    stored = cache.put('a', original)
+    stored.loc[0, 'value'] = 1
+    original.loc[1, 'value'] = 2
+
+    view = cache.get('a')
+    view['value'] = 3
+    view.loc[2, 'title'] = 'changed'
+
+    assert cache.get('a').equals(frame(3))
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+import paste_reader
+from conftest import RAW_COLUMNS
+from normalize import MissingColumnsError
+from paste_reader import read_pasted, sniff_paste
+
+ROWS = [
+    ['2026-01-01', 'Alpha', '1,000', '100', '10.00%', '10', '10.00%'],
+    ['2026-01-02', 'Beta', '2,000', '150', '7.50%', '30', '20.00%'],
+]
+
+
+def paste(delimiter, rows=ROWS, newline='\n'):
+    quote = (lambda cell: f'"{cell}"' if delimiter in cell else cell)
+    return newline.join(delimiter.join(quote(c) for c in row) for row in [RAW_COLUMNS, *rows]) + newline
+
+
+@pytest.mark.parametrize('delimiter', ['\t', ',', ';', '|'])
+def test_delimiter_is_sniffed(delimiter):
+    text = paste(delimiter)
+    assert sniff_paste(text).delimiter == delimiter
+
+    frame = read_pasted(text)
+    assert list(frame.columns) == RAW_COLUMNS
+    assert frame['title'].tolist() == ['Alpha', 'Beta']
+    assert frame['卡片曝光uv'].tolist() == ['1,000', '2,000']
+
+
+def test_quoted_cells_keep_delimiters_and_line_breaks():
+    rows = [['2026-01-01', '"Alpha, ""the first""\nof two"', '"1,000"', '100', '10%', '10', '10%']]
+    frame = read_pasted('\n'.join([','.join(RAW_COLUMNS), ','.join(rows[0])]))
+    assert frame.loc[0, 'title'] == 'Alpha, "the first"\nof two'
+    assert frame.loc[0, '卡片曝光uv'] == '1,000'
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n', '\r'])
+def test_title_lines_above_the_header_are_skipped(newline):
+    text = newline.join(['Weekly report', 'exported 2026-01-03', '']) + newline + paste('\t', newline=newline)
+    fmt = sniff_paste(text)
+    assert fmt.data_line == 4
+
+    frame = read_pasted(text)
+    assert frame['dt'].tolist() == ['2026-01-01', '2026-01-02']
+
+
+def test_trailing_empty_rows_and_columns_are_dropped():
+    text = paste('\t', [row + [''] for row in ROWS] + [[''] * 8, [''] * 8])
+    frame = read_pasted(text.replace('功能轉化率\n', '功能轉化率\t\n'))
+    assert len(frame) == 2 and list(frame.columns) == RAW_COLUMNS
+
+
+def test_ragged_rows_fall_back_to_pandas(monkeypatch):
+    calls = []
+    read_pandas = paste_reader._read_pandas
+    monkeypatch.setattr(paste_reader, '_read_pandas', lambda body, fmt: calls.append(1) or read_pandas(body, fmt))
+    text = paste(',', [ROWS[0], ROWS[1][:5]])
+
+    frame = read_pasted(text)
+    assert calls == [1]
+    assert frame['title'].tolist() == ['Alpha', 'Beta']
+    assert pd.isna(frame.loc[1, '功能轉化率'])
+
+
+def test_unrecognized_paste_reports_missing_columns():
+    with pytest.raises(MissingColumnsError):
+        read_pasted("a\tb\tc\n1\t2\t3\n")
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from report_cache import DEFAULT_BUDGET_BYTES, ReportCache, report_key
+
+
+def test_report_key_follows_content_and_options():
+    key = report_key('data', ['fig1', 'fig2'], 'summary', offline=True)
+    assert key == report_key('data', ['fig1', 'fig2'], 'summary', offline=True)
+    assert key != report_key('data', ['fig2', 'fig1'], 'summary', offline=True)
+    assert key != report_key('data', ['fig1', 'fig2'], 'summary!', offline=True)
+    assert key != report_key('data', ['fig1', 'fig2'], 'summary', offline=False)
+
+
+def test_concurrent_submits_build_once():
+    cache = ReportCache(max_workers=4)
+    release = threading.Event()
+    calls = []
+
+    def build(progress):
+        calls.append(1)
+        release.wait(5)
+        progress(0.5)
+        return b'report'
+
+    with ThreadPoolExecutor(8) as pool:
+        jobs = list(pool.map(lambda _: cache.submit('k', build), range(8)))
+        results = [pool.submit(cache.result, 'k', build) for _ in range(8)]
+        release.set()
+        assert [r.result(5) for r in results] == [b'report'] * 8
+
+    assert len({id(job) for job in jobs}) == 1
+    assert len(calls) == 1 and cache.builds == 1
+    assert cache.submit('k', build) is None  # Cached now
+    assert jobs[0].progress == 1.0 and jobs[0].done()
+
+
+def test_budget_evicts_least_recently_used_reports():
+    assert DEFAULT_BUDGET_BYTES == 128 * 1024 * 1024
+    cache = ReportCache(budget_bytes=10)
+    for key in 'abc':
+        cache.result(key, lambda progress, key=key: key.encode() * 4)
+        if key == 'b':
+            assert cache.get('a') is not None  # 'b' becomes the least recently used
+
+    assert cache.get('b') is None
+    assert cache.get('a') == b'aaaa' and cache.get('c') == b'cccc'
+    assert cache.total_bytes == 8
+
+    # A report over the whole budget still stays
+    cache.result('big', lambda progress: b'x' * 20)
+    assert len(cache) == 1 and cache.get('big') is not None
+
+
+def test_failed_build_is_reported_and_can_be_retried():
+    cache = ReportCache()
+
+    def fail(progress):
+        raise RuntimeError('no figures')
+
+    with pytest.raises(RuntimeError, match='no figures'):
+        cache.result('k', fail)
+    job = cache.job('k')
+    assert isinstance(job.error, RuntimeError) and job.report is None
+    assert cache.get('k') is None
+
+    retry = cache.submit('k', lambda progress: b'report')
+    assert retry is not job
+    retry.future.result(5)
+    assert cache.get('k') == b'report' and cache.job('k') is None
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from conftest import raw_rows
+from incremental import AppendLog
+from normalize import COUNT_COLS, normalize_frame
+from rollups import RollupEngine, weighted_metrics
+
+
+def append(log, rollups, raw):
+    previous = log.df
+    delta = log.append(raw)
+    rollups.apply_delta(log.df, 'next', delta, previous)
+    return delta
+
+
+def assert_same_totals(patched, rebuilt):
+    """Same rows and values; dtypes may differ (patched totals are widened)."""
+    dtypes = {'title': str, **{c: 'float64' for c in COUNT_COLS}}
+    pd.testing.assert_frame_equal(patched.astype(dtypes), rebuilt.astype(dtypes), check_exact=False)
+
+
+def test_apply_delta_matches_rebuild(raw_frame):
+    log = AppendLog(raw_frame.copy())
+    rollups = RollupEngine(log.df)
+    for granularity in (None, 'D', 'W', 'M'):
+        rollups.table(granularity)
+
+    raw = pd.concat([raw_frame, raw_rows([('2026-01-04', 'd', 700, 70, 7)])], ignore_index=True)
+    raw.loc[0, '卡片曝光uv'] = '1,100'  # Corrected row
+    append(log, rollups, raw.copy())
+
+    rebuilt = RollupEngine(log.df)
+    for granularity in (None, 'D', 'W', 'M'):
+        assert_same_totals(rollups.table(granularity), rebuilt.table(granularity))
+
+
+def test_title_rates_are_ratios_of_summed_counts(raw_frame):
+    titles = RollupEngine(normalize_frame(raw_frame.copy())).titles().set_index('title')
+
+    # 'a' has three rows; its rates are not the mean of their per-row rates
+    assert titles.loc['a', ['卡片曝光uv', '頁面訪問uv', '行動點點擊uv (入口+詳情)']].tolist() == [6_000, 450, 60]
+    assert titles.loc['a', '文章訪問率'] == pytest.approx(450 / 6_000)
+    assert titles.loc['a', '功能轉化率'] == pytest.approx(60 / 450)
+
+    metrics = weighted_metrics(titles[COUNT_COLS].mean())
+    assert metrics['文章訪問率'] == pytest.approx(titles['頁面訪問uv'].sum() / titles['卡片曝光uv'].sum())
+    assert metrics['功能轉化率'] == pytest.approx(titles['行動點點擊uv (入口+詳情)'].sum() / titles['頁面訪問uv'].sum())
+
+
+def test_apply_delta_widens_totals_past_the_compact_dtype(raw_frame):
+    log = AppendLog(raw_frame.copy())
+    rollups = RollupEngine(log.df)
+    assert rollups.titles()['頁面訪問uv'].dtype == 'uint16'
+
+    # 'b' had a single row (a uint16 total); these push it past 65,535
+    raw = pd.concat([raw_frame, raw_rows([('2026-01-04', 'b', 200_000, 99_950, 10)])], ignore_index=True)
+    append(log, rollups, raw.copy())
+
+    titles = rollups.titles().set_index('title')
+    assert titles.loc['b', '頁面訪問uv'] == 100_000
+    assert titles.loc['b', '卡片曝光uv'] == 200_500
+    assert_same_totals(rollups.titles(), RollupEngine(log.df).titles())
@@ -0,0 +1,124 @@
+import hashlib
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sheets_fetch import SheetFetcher
+
+
+class SheetServer:
+    """Local stand-in for the CSV export: serves ``body`` with an ETag and answers 304 to a matching one."""
+
+    def __init__(self):
+        self.body = b"dt,title\n2026-01-01,a\n"
+        self.requests = []  # status of each response
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                etag = '"%s"' % hashlib.sha256(server.body).hexdigest()[:16]
+                if self.headers.get('If-None-Match') == etag:
+                    server.requests.append(304)
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                server.requests.append(200)
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(server.body)))
+                self.end_headers()
+                self.wfile.write(server.body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}/export?format=csv"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    server = SheetServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def fetcher(tmp_path, clock):
+    return SheetFetcher(cache_dir=str(tmp_path), ttl=300, stale_ttl=3600, timeout=5, clock=clock)
+
+
+def test_fresh_copy_is_served_from_disk(server, fetcher, clock):
+    first = fetcher.fetch(server.url)
+    clock.now += 100
+    second = fetcher.fetch(server.url)
+
+    assert first.content == second.content == server.body
+    assert not first.stale and not second.stale
+    assert server.requests == [200]
+
+
+def test_stale_copy_is_served_while_refreshing_in_the_background(server, fetcher, clock):
+    old = server.body
+    fetcher.fetch(server.url)
+    server.body = b"dt,title\n2026-01-02,b\n"
+    clock.now += 600
+
+    result = fetcher.fetch(server.url)
+    assert result.content == old and result.stale
+    fetcher.refresh_async(server.url).join(5)
+
+    result = fetcher.fetch(server.url)
+    assert result.content == server.body and not result.stale
+    assert server.requests == [200, 200]
+
+
+def test_unchanged_sheet_is_revalidated_with_its_etag(server, fetcher, clock):
+    first = fetcher.fetch(server.url)
+    clock.now += 5_000  # Past the stale window: revalidated synchronously
+
+    result = fetcher.fetch(server.url)
+    assert server.requests == [200, 304]
+    assert result.content == first.content and result.digest == first.digest
+    assert result.fetched_at == clock.now and not result.stale
+
+
+def test_disk_cache_survives_a_restart(server, fetcher, tmp_path, clock):
+    first = fetcher.fetch(server.url)
+    restarted = SheetFetcher(cache_dir=str(tmp_path), ttl=300, stale_ttl=3600, timeout=5, clock=clock)
+
+    result = restarted.fetch(server.url)
+    assert result.content == first.content and not result.stale
+    assert server.requests == [200]
+
+
+def test_offline_fetch_falls_back_to_the_stale_copy(server, fetcher, clock):
+    first = fetcher.fetch(server.url)
+    server.stop()
+    clock.now += 5_000
+
+    result = fetcher.fetch(server.url)
+    assert result.content == first.content and result.stale
+    with pytest.raises(urllib.error.URLError):
+        fetcher.fetch(server.url, force=True)
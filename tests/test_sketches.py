@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sketches import RELATIVE_ACCURACY, QuantileSketch, merge_sketches, slider_bounds, sketch_columns
+
+QUANTILES = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def sample(seed, n=20_000):
+    rng = np.random.default_rng(seed)
+    return np.concatenate([rng.lognormal(6, 2, n), -rng.lognormal(1, 1, n // 10), np.zeros(n // 20)])
+
+
+def assert_within_accuracy(sketch, values):
+    exact = np.quantile(values, QUANTILES, method='lower')
+    approx = sketch.quantiles(QUANTILES)
+    np.testing.assert_allclose(approx, exact, rtol=RELATIVE_ACCURACY * 1.0001, atol=0)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_quantiles_within_relative_accuracy(seed):
+    values = sample(seed)
+    sketch = QuantileSketch().add(values)
+    assert_within_accuracy(sketch, values)
+    assert sketch.count == len(values) and sketch.zeros == np.count_nonzero(values == 0)
+    assert (sketch.min, sketch.max) == (values.min(), values.max())
+    assert sketch.mean == pytest.approx(values.mean())
+
+
+def test_missing_values_are_counted_not_sketched():
+    sketch = QuantileSketch().add([1.0, np.nan, np.inf, 2.0])
+    assert (sketch.count, sketch.missing) == (2, 2)
+
+
+def test_merge_is_associative_and_matches_one_sketch():
+    parts = [sample(seed, 5_000) for seed in range(3)]
+    a, b, c = (QuantileSketch().add(p) for p in parts)
+    left, right = (a + b) + c, a + (b + c)
+    whole = QuantileSketch().add(np.concatenate(parts))
+
+    for merged in (left, right):
+        np.testing.assert_array_equal(merged.quantiles(QUANTILES), whole.quantiles(QUANTILES))
+        assert (merged.count, merged.zeros, merged.min, merged.max) == (whole.count, whole.zeros, whole.min, whole.max)
+        assert merged.total == pytest.approx(whole.total)
+    assert_within_accuracy(left, np.concatenate(parts))
+
+
+def test_merge_sketches_by_column():
+    merged = merge_sketches([{'x': QuantileSketch().add([1, 2])}, {'x': QuantileSketch().add([3]), 'y': QuantileSketch()}])
+    assert merged['x'].count == 3 and merged['y'].count == 0
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01) + QuantileSketch(0.02)
+
+
+def test_bucket_count_is_bounded():
+    values = np.logspace(-10, 10, 10_000)
+    sketch = QuantileSketch(max_buckets=64).add(values)
+    assert sketch.nbytes <= 64 * 8
+    # Precision is given up at the low end only
+    assert sketch.quantile(0.99) == pytest.approx(np.quantile(values, 0.99, method='lower'), rel=RELATIVE_ACCURACY)
+
+
+def test_slider_bounds_of_empty_and_constant_columns():
+    assert slider_bounds(QuantileSketch()) == (1, 1)
+    assert slider_bounds(QuantileSketch().add([np.nan, np.nan]), integer=True) == (1, 1)
+    assert slider_bounds(QuantileSketch().add(np.zeros(10))) == (1, 1)
+
+    max_value, step = slider_bounds(QuantileSketch().add(np.full(10, 250.0)), integer=True)
+    assert max_value >= 250 and isinstance(step, int) and step >= 1
+    assert max_value % step == 0
+
+
+def test_sketch_columns_skips_missing_columns():
+    frame = pd.DataFrame({'卡片曝光uv': [1, 2, 3], 'other': [1, 2, 3]})
+    sketches = sketch_columns(frame)
+    assert list(sketches) == ['卡片曝光uv'] and sketches['卡片曝光uv'].count == 3
+    assert math.isnan(QuantileSketch().summary()['p50'])
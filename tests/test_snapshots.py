@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+
+from normalize import normalize_frame
+from snapshots import SnapshotCatalog
+
+
+def test_round_trip_keeps_values_and_compact_dtypes(tmp_path, raw_frame):
+    df = normalize_frame(raw_frame)
+    catalog = SnapshotCatalog(str(tmp_path))
+    entry = catalog.save(df, 'weekly', 'paste', 'paste:' + 'ab' * 32)
+
+    loaded = catalog.load(entry['id'])
+    pd.testing.assert_frame_equal(loaded, df)
+    assert isinstance(loaded['title'].dtype, pd.CategoricalDtype)
+    assert loaded['卡片曝光uv'].dtype == df['卡片曝光uv'].dtype and str(df['卡片曝光uv'].dtype).startswith('uint')
+    assert loaded['文章訪問率'].dtype == 'float32'
+    assert loaded.attrs['coercion'] == df.attrs['coercion']
+
+
+def test_catalog_metadata(tmp_path, raw_frame):
+    df = normalize_frame(raw_frame)
+    catalog = SnapshotCatalog(str(tmp_path))
+    entry = catalog.save(df, 'weekly', 'paste', 'paste:' + 'ab' * 32)
+
+    assert catalog.entries() == [entry]
+    assert entry['id'] == 'ab' * 8 and entry['name'] == 'weekly' and entry['source'] == 'paste'
+    assert entry['rows'] == len(df)
+    assert entry['schema'] == {col: str(dtype) for col, dtype in df.dtypes.items()}
+    assert (entry['dt_min'], entry['dt_max']) == ('2026-01-01T00:00:00', '2026-01-03T00:00:00')
+    assert entry['bytes'] == os.path.getsize(tmp_path / f"{entry['id']}.arrow")
+
+    # The same fingerprint replaces its snapshot; another one is listed first
+    catalog.save(df.head(2), 'weekly v2', 'paste', 'paste:' + 'ab' * 32)
+    newer = catalog.save(df, 'monthly', 'excel', 'excel:' + 'cd' * 32)
+    assert [e['name'] for e in catalog.entries()] == ['monthly', 'weekly v2']
+    assert len(catalog.load(entry['id'])) == 2
+    assert SnapshotCatalog(str(tmp_path)).entries()[0] == newer
+
+
+def test_delete_removes_file_and_entry(tmp_path, raw_frame):
+    catalog = SnapshotCatalog(str(tmp_path))
+    entry = catalog.save(normalize_frame(raw_frame), 'weekly', 'paste', 'paste:' + 'ab' * 32)
+
+    catalog.delete(entry['id'])
+    assert catalog.entries() == []
+    assert not os.path.exists(tmp_path / f"{entry['id']}.arrow")
+    catalog.delete(entry['id'])  # Already gone: no error